@@ -0,0 +1,7 @@
+'''
+	Performance benchmarks for startrak.
+
+	Run every scenario with `python -m benchmarks`, see `python -m benchmarks --help` for the available options.
+'''
+from benchmarks.synthetic import *
+from benchmarks.runner import *
@@ -0,0 +1,57 @@
+import argparse
+import sys
+import tempfile
+from typing import List
+
+from benchmarks.runner import BenchmarkResult, compare, format_table, load_results, measure, measure_import, save_results
+from benchmarks.scenarios import IMPORTS, SCALES, SCENARIOS, make_fixture
+
+def main(argv : List[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(prog= 'python -m benchmarks', description= 'Runs the startrak benchmark scenarios over synthetic star fields.')
+	parser.add_argument('-s', '--scales', default= 'small,medium', help= f'Comma separated scales ({", ".join(SCALES)}), default: small,medium')
+	parser.add_argument('-k', '--scenarios', default= ','.join(SCENARIOS), help= 'Comma separated scenarios, default: all')
+	parser.add_argument('-n', '--frames', type= int, default= 8, help= 'Frames generated per scale')
+	parser.add_argument('-i', '--imports', action= 'store_true', help= 'Also time the package import in a fresh interpreter')
+	parser.add_argument('-r', '--repeat', type= int, default= 5, help= 'Timed runs per scenario')
+	parser.add_argument('-d', '--workdir', default= None, help= 'Directory for the synthetic files, default: a temporary directory')
+	parser.add_argument('--save', default= None, help= 'Save the median times as a JSON baseline')
+	parser.add_argument('--compare', default= None, help= 'Compare against a JSON baseline, exits with 1 on regressions')
+	parser.add_argument('--tolerance', type= float, default= 0.15, help= 'Allowed slowdown fraction when comparing, default: 0.15')
+	args = parser.parse_args(argv)
+
+	scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+	scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+	for name in scales:
+		if name not in SCALES: parser.error(f'Unknown scale "{name}"')
+	for name in scenarios:
+		if name not in SCENARIOS: parser.error(f'Unknown scenario "{name}"')
+
+	results = list[BenchmarkResult]()
+	if args.imports:
+		for name, statement in IMPORTS.items():
+			print(f'  {name}', file= sys.stderr)
+			results.append(BenchmarkResult(name, 'cold', 1, 'imports', 0, measure_import(statement, args.repeat)))
+	with tempfile.TemporaryDirectory() as tmp:
+		workdir = args.workdir or tmp
+		for scale in scales:
+			print(f'Generating {args.frames} {scale} frames {SCALES[scale]}..', file= sys.stderr)
+			fixture = make_fixture(scale, workdir, args.frames)
+			for name in scenarios:
+				print(f'  {name}', file= sys.stderr)
+				scenario = SCENARIOS[name](fixture)
+				times = measure(scenario.func, repeat= args.repeat)
+				results.append(BenchmarkResult(name, scale, scenario.items, scenario.unit, scenario.pixels, times))
+
+	baseline = load_results(args.compare) if args.compare else None
+	print(format_table(results, baseline))
+	if args.save:
+		save_results(results, args.save)
+	if baseline is not None:
+		regressions = compare(results, baseline, args.tolerance)
+		if regressions:
+			print('\nRegressions: ' + ', '.join(regressions))
+			return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+__all__ = ['BenchmarkResult', 'measure', 'measure_import', 'format_table', 'save_results', 'load_results', 'compare']
+
+class BenchmarkResult(NamedTuple):
+	scenario : str
+	scale : str
+	items : int				# items processed per run
+	unit : str				# what an item is (frames, stars, files...)
+	pixels : int			# pixels processed per run, 0 if not meaningful
+	times : List[float]	# seconds per run
+
+	@property
+	def best(self) -> float:
+		return min(self.times)
+	@property
+	def median(self) -> float:
+		return statistics.median(self.times)
+	@property
+	def throughput(self) -> float:
+		''' Items per second, based on the median run '''
+		return self.items / self.median if self.median > 0 else float('inf')
+	@property
+	def mpix_rate(self) -> float:
+		''' Megapixels per second, based on the median run '''
+		return self.pixels / 1e6 / self.median if self.median > 0 else float('inf')
+
+def measure(func : Callable[[], object], repeat : int = 5, warmup : int = 1, quiet : bool = True) -> List[float]:
+	''' Runs func warmup + repeat times and returns the wall time of the timed runs, output to stdout is discarded if quiet'''
+	times = list[float]()
+	sink = io.StringIO()
+	for i in range(warmup + repeat):
+		with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+			start = time.perf_counter()
+			func()
+			elapsed = time.perf_counter() - start
+		sink.seek(0); sink.truncate()
+		if i >= warmup:
+			times.append(elapsed)
+	return times
+
+def measure_import(statement : str, repeat : int = 5) -> List[float]:
+	''' Times the given import statement in a fresh interpreter for each run, so nothing is cached in sys.modules'''
+	code = f'import time; _t = time.perf_counter(); {statement}; print(time.perf_counter() - _t)'
+	times = list[float]()
+	for _ in range(repeat):
+		out = subprocess.run([sys.executable, '-c', code], capture_output= True, text= True, check= True)
+		times.append(float(out.stdout.strip().splitlines()[-1]))
+	return times
+
+def format_table(results : Sequence[BenchmarkResult], baseline : Dict[str, float] | None = None) -> str:
+	''' Formats the results as a text table, if a baseline (see load_results) is given the speedup against it is included'''
+	header = ['scenario', 'scale', 'items', 'median ms', 'best ms', 'items/s', 'MPix/s']
+	if baseline is not None:
+		header.append('speedup')
+	rows = [header]
+	for r in results:
+		row = [r.scenario, r.scale, f'{r.items} {r.unit}', f'{r.median * 1000:.2f}', f'{r.best * 1000:.2f}',
+				f'{r.throughput:.1f}', f'{r.mpix_rate:.1f}' if r.pixels else '-']
+		if baseline is not None:
+			base = baseline.get(_key(r))
+			row.append(f'{base / r.median:.2f}x' if base else '-')
+		rows.append(row)
+	widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+	lines = ['  '.join(cell.ljust(w) if i < 3 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths))) for row in rows]
+	lines.insert(1, '-' * len(lines[0]))
+	return '\n'.join(lines)
+
+def _key(result : BenchmarkResult) -> str:
+	return f'{result.scenario}/{result.scale}'
+
+def save_results(results : Sequence[BenchmarkResult], path : str):
+	''' Saves the median time of each result as JSON, to be used as a baseline later '''
+	with open(path, 'w') as out:
+		json.dump({_key(r) : r.median for r in results}, out, indent= 2)
+
+def load_results(path : str) -> Dict[str, float]:
+	with open(path, 'r') as f:
+		return json.load(f)
+
+def compare(results : Sequence[BenchmarkResult], baseline : Dict[str, float], tolerance : float = 0.15) -> List[str]:
+	''' Returns the keys of the results that are slower than the baseline by more than the given fraction'''
+	regressions = list[str]()
+	for r in results:
+		base = baseline.get(_key(r))
+		if base and r.median > base * (1 + tolerance):
+			regressions.append(_key(r))
+	return regressions
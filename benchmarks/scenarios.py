@@ -0,0 +1,180 @@
+'''
+	Timed scenarios over synthetic data.
+
+	Each scenario receives a Fixture (a set of frames written to disk for one scale) and returns a `Scenario`:
+	the function to time, the number of items it processes and the number of pixels it touches.
+'''
+from __future__ import annotations
+import os
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from benchmarks.synthetic import FieldSpec, SyntheticFrame, generate_sequence, scaled
+
+SCALES : Dict[str, Tuple[int, int]] = {
+	'small' : (512, 512),
+	'medium' : (2048, 2048),
+	'large' : (4096, 4096),
+}
+
+class Fixture(NamedTuple):
+	scale : str
+	spec : FieldSpec
+	frames : List[SyntheticFrame]
+	directory : str
+
+	@property
+	def paths(self) -> List[str]:
+		return [f.path for f in self.frames]
+	@property
+	def pixels(self) -> int:
+		return self.spec.shape[0] * self.spec.shape[1]
+
+class Scenario(NamedTuple):
+	func : Callable[[], object]
+	items : int
+	unit : str
+	pixels : int = 0
+
+def make_fixture(scale : str, directory : str, n_frames : int = 8, base : FieldSpec = FieldSpec(n_stars= 40, fwhm= 6.0)) -> Fixture:
+	''' Writes (or reuses) the frames of a given scale, the star density of `base` is kept for every scale'''
+	spec = scaled(base, SCALES[scale])
+	folder = os.path.join(directory, scale)
+	frames = generate_sequence(folder, n_frames, spec, drift= (1.5, -1.0), rotation= 0.0)
+	return Fixture(scale, spec, frames, folder)
+
+def _reference_stars(fixture : Fixture, aperture : int = 6):
+	from startrak.native import Star, StarList
+	from startrak.types.phot import AperturePhot
+	from startrak.native import FileInfo
+
+	image = FileInfo.new(fixture.paths[0]).get_data()
+	phot = AperturePhot(4, 1, 0)
+	stars = StarList()
+	for i, (x, y) in enumerate(fixture.frames[0].positions):
+		star = Star(f'star_{i}', (float(x), float(y)), aperture)
+		star.photometry = phot.evaluate_star(image, star)
+		stars.append(star)
+	return stars
+
+# region Scenarios
+def fileinfo_new(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	paths = fixture.paths
+	return Scenario(lambda: [FileInfo.new(p) for p in paths], len(paths), 'files')
+
+def get_data(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.native import fits
+	files = [FileInfo.new(p) for p in fixture.paths]
+	def run():
+		fits._fitsdata_cache.clear()
+		for f in files:
+			f.get_data()
+	return Scenario(run, len(files), 'frames', fixture.pixels * len(files))
+
+def detect_stars(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.starutils import detect_stars
+	image = FileInfo.new(fixture.paths[0]).get_data()
+	return Scenario(lambda: detect_stars(image, photometry= None), 1, 'frames', fixture.pixels)
+
+def detect_local_maxima(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.starutils import detect_stars
+	image = FileInfo.new(fixture.paths[0]).get_data()
+	return Scenario(lambda: detect_stars(image, 'local_maxima', photometry= None), 1, 'frames', fixture.pixels)
+
+def detect_tiled(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.starutils import detect_stars
+	from startrak.types.detection import LocalMaxima, TiledDetector
+	image = FileInfo.new(fixture.paths[0]).get_data()
+	detector = TiledDetector(LocalMaxima(), tile_size= 1024)
+	return Scenario(lambda: detect_stars(image, detector, photometry= None), 1, 'frames', fixture.pixels)
+
+def aperture_phot(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.types.phot import AperturePhot
+	image = FileInfo.new(fixture.paths[0]).get_data()
+	positions = [(float(x), float(y)) for x, y in fixture.frames[0].positions]
+	phot = AperturePhot(4, 1, 0)
+	return Scenario(lambda: [phot.evaluate(image, p, 6) for p in positions], len(positions), 'stars')
+
+def photometry_tracker(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.types.trackers import PhotometryTracker
+	images = [FileInfo.new(p).get_data().copy() for p in fixture.paths]
+	tracker = PhotometryTracker(16, tracking_steps= 3)
+	tracker.setup_model(_reference_stars(fixture))
+	return Scenario(lambda: [tracker.track(img) for img in images], len(images), 'frames', fixture.pixels * len(images))
+
+def global_alignment(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.types.trackers import GlobalAlignmentTracker
+	images = [FileInfo.new(p).get_data().copy() for p in fixture.paths]
+	tracker = GlobalAlignmentTracker()
+	tracker.setup_model(_reference_stars(fixture))
+	return Scenario(lambda: [tracker.track(img) for img in images], len(images), 'frames', fixture.pixels * len(images))
+
+def global_alignment_pyramid(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.types.trackers import GlobalAlignmentTracker
+	images = [FileInfo.new(p).get_data().copy() for p in fixture.paths]
+	tracker = GlobalAlignmentTracker('local_maxima', pyramid_level= 1, fwhm= fixture.spec.fwhm / 2, min_dst= 4)
+	tracker.setup_model(_reference_stars(fixture))
+	return Scenario(lambda: [tracker.track(img) for img in images], len(images), 'frames', fixture.pixels * len(images))
+
+def phase_correlation(fixture : Fixture) -> Scenario:
+	from startrak.native import FileInfo
+	from startrak.types.trackers import PhaseCorrelationTracker
+	images = [FileInfo.new(p).get_data().copy() for p in fixture.paths]
+	tracker = PhaseCorrelationTracker(fwhm= fixture.spec.fwhm)
+	tracker.setup_model(_reference_stars(fixture), reference= images[0])
+	return Scenario(lambda: [tracker.track(img) for img in images], len(images), 'frames', fixture.pixels * len(images))
+
+def session_alignment(fixture : Fixture) -> Scenario:
+	from startrak import sessionutils
+	from startrak.native import FileInfo
+	from startrak.types.alignment import SessionAlignment
+	from startrak.types.trackers import GlobalAlignmentTracker
+	session = sessionutils.new_session('benchmark', 'inspect', fixture.directory, overwrite= False)
+	session.add_file( *[FileInfo.new(p) for p in fixture.paths])
+	session.add_star( *_reference_stars(fixture))
+	runner = SessionAlignment(GlobalAlignmentTracker('local_maxima', fwhm= fixture.spec.fwhm), keyframes= 2)
+	return Scenario(lambda: runner.run(session, force= True), len(fixture.paths), 'frames', fixture.pixels * len(fixture.paths))
+
+def session_save_load(fixture : Fixture) -> Scenario:
+	from startrak import sessionutils
+	from startrak.native import FileInfo
+	stars = _reference_stars(fixture)
+	output = os.path.join(fixture.directory, 'benchmark_session')
+	def run():
+		session = sessionutils.new_session('benchmark', 'inspect', fixture.directory, overwrite= True)
+		session.add_file( *[FileInfo.new(p) for p in fixture.paths])
+		session.add_star( *stars)
+		sessionutils.save_session(output)
+		sessionutils.load_session(output, overwrite= False)
+	return Scenario(run, len(fixture.paths), 'files')
+# endregion
+
+SCENARIOS : Dict[str, Callable[[Fixture], Scenario]] = {
+	'fileinfo_new' : fileinfo_new,
+	'get_data' : get_data,
+	'detect_stars' : detect_stars,
+	'detect_local_maxima' : detect_local_maxima,
+	'detect_tiled' : detect_tiled,
+	'aperture_phot' : aperture_phot,
+	'photometry_tracker' : photometry_tracker,
+	'global_alignment' : global_alignment,
+	'global_alignment_pyramid' : global_alignment_pyramid,
+	'phase_correlation' : phase_correlation,
+	'session_alignment' : session_alignment,
+	'session_save_load' : session_save_load,
+}
+
+# Import statements timed in a fresh interpreter, "eager" loads what `import startrak` used to load before the lazy imports
+IMPORTS : Dict[str, str] = {
+	'import_startrak' : 'import startrak',
+	'import_native' : 'import startrak.native',
+	'import_eager' : 'import startrak, startrak.starutils, startrak.sessionutils, startrak.io, cv2',
+}
@@ -0,0 +1,202 @@
+'''
+	Deterministic synthetic star fields written as FITS files.
+
+	Every random quantity is drawn from a numpy Generator seeded by the caller, so the same parameters always produce the same files.
+'''
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+import math
+import os
+from typing import Dict, List, Literal, NamedTuple, Tuple
+import numpy as np
+
+__all__ = ['FieldSpec', 'SyntheticFrame', 'render_field', 'write_fits', 'generate_frame', 'generate_sequence', 'scaled']
+
+_BLOCK = 2880
+_PSF = Literal['gaussian', 'moffat']
+
+@dataclass(frozen= True)
+class FieldSpec:
+	'''
+		Parameters of a synthetic star field.
+
+		* shape (rows, cols): Size of the image
+		* bitpix (8, 16, 32, -32, -64): FITS BITPIX of the written data
+		* bzero (int | None): FITS BZERO, by default 32768 for 16 bits and 0 otherwise
+		* n_stars (int): Number of stars in the field
+		* flux_range (min, max): Total flux (counts) range of the stars, drawn from a log-uniform distribution
+		* psf ("gaussian" | "moffat"): Point spread function profile
+		* fwhm (float): Full width at half maximum of the PSF in pixels
+		* beta (float): Moffat beta parameter
+		* background (float): Constant sky background level (counts)
+		* read_noise (float): Gaussian noise sigma (counts)
+		* poisson (bool): Whether to add photon noise
+		* margin (int): Stars are kept at least this many pixels away from the edges
+		* exptime (float): EXPTIME keyword of the written files
+		* seed (int): Seed of the random generator
+	'''
+	shape : Tuple[int, int] = (512, 512)
+	bitpix : int = 16
+	bzero : int | None = None
+	n_stars : int = 50
+	flux_range : Tuple[float, float] = (2e3, 2e5)
+	psf : _PSF = 'gaussian'
+	fwhm : float = 3.0
+	beta : float = 2.5
+	background : float = 1000.
+	read_noise : float = 10.
+	poisson : bool = True
+	margin : int = 16
+	exptime : float = 10.
+	seed : int = 0
+
+	@property
+	def zero(self) -> int:
+		if self.bzero is not None:
+			return self.bzero
+		return 32768 if self.bitpix == 16 else 0
+
+class SyntheticFrame(NamedTuple):
+	path : str
+	positions : np.ndarray		# (n_stars, 2) x, y
+	fluxes : np.ndarray
+	translation : Tuple[float, float]
+	rotation : float				# degrees, around the image center
+
+def _stars(spec : FieldSpec, rng : np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+	rows, cols = spec.shape
+	m = spec.margin
+	x = rng.uniform(m, cols - m, spec.n_stars)
+	y = rng.uniform(m, rows - m, spec.n_stars)
+	lo, hi = np.log10(spec.flux_range[0]), np.log10(spec.flux_range[1])
+	flux = 10 ** rng.uniform(lo, hi, spec.n_stars)
+	return np.column_stack((x, y)), flux
+
+def render_field(spec : FieldSpec, positions : np.ndarray, fluxes : np.ndarray, rng : np.random.Generator | None = None) -> np.ndarray:
+	''' Renders the stars at the given (x, y) positions over the sky background and adds noise, returns a float64 image '''
+	rows, cols = spec.shape
+	image = np.full(spec.shape, spec.background, dtype= np.float64)
+	radius = int(math.ceil(3 * spec.fwhm)) + 1
+	offsets = np.arange(-radius, radius + 1)
+
+	inside = ((positions[:, 0] > -radius) & (positions[:, 0] < cols + radius)
+				& (positions[:, 1] > -radius) & (positions[:, 1] < rows + radius))
+	positions, fluxes = positions[inside], fluxes[inside]
+	if len(positions) > 0:
+		cx = np.round(positions[:, 0]).astype(int)
+		cy = np.round(positions[:, 1]).astype(int)
+		# Pixel coordinates of every stamp (pixel centers lie on integer coordinates), shape (n, size, size)
+		px = (cx[:, None] + offsets[None, :])[:, None, :]
+		py = (cy[:, None] + offsets[None, :])[:, :, None]
+		sq = (px - positions[:, 0, None, None]) ** 2 + (py - positions[:, 1, None, None]) ** 2
+		if spec.psf == 'gaussian':
+			sigma = spec.fwhm / (2 * math.sqrt(2 * math.log(2)))
+			profile = np.exp(-sq / (2 * sigma ** 2))
+		elif spec.psf == 'moffat':
+			alpha = spec.fwhm / (2 * math.sqrt(2 ** (1 / spec.beta) - 1))
+			profile = (1 + sq / alpha ** 2) ** -spec.beta
+		else:
+			raise ValueError(f'Invalid PSF: "{spec.psf}", expected "gaussian" or "moffat".')
+		profile *= (fluxes / profile.sum(axis= (1, 2)))[:, None, None]
+
+		rr = np.broadcast_to(py, profile.shape)
+		cc = np.broadcast_to(px, profile.shape)
+		valid = (rr >= 0) & (rr < rows) & (cc >= 0) & (cc < cols)
+		np.add.at(image, (rr[valid], cc[valid]), profile[valid])
+
+	if rng is not None:
+		if spec.poisson:
+			image = rng.poisson(image).astype(np.float64)
+		if spec.read_noise > 0:
+			image += rng.normal(0, spec.read_noise, spec.shape)
+	return image
+
+def _card(key : str, value : bool | int | float | str) -> bytes:
+	if isinstance(value, bool):
+		text = f'{"T" if value else "F":>20}'
+	elif isinstance(value, (int, np.integer)):
+		text = f'{int(value):>20}'
+	elif isinstance(value, (float, np.floating)):
+		text = f'{float(value):>20.10G}'
+	else:
+		text = f"'{str(value):<8}'"
+	return f'{key:<8}= {text}'.ljust(80)[:80].encode('ascii')
+
+def write_fits(path : str, data : np.ndarray, bitpix : int = 16, bzero : int = 0,
+					header : Dict[str, bool | int | float | str] | None = None) -> str:
+	''' Writes a 2D image into a single HDU FITS file, integer data is rounded and clipped to the range allowed by bitpix/bzero '''
+	assert data.ndim == 2, 'Only 2D images are supported'
+	dtypes = {8 : '>u1', 16 : '>i2', 32 : '>i4', -32 : '>f4', -64 : '>f8'}
+	if bitpix not in dtypes:
+		raise ValueError(f'Invalid BITPIX: {bitpix}')
+	dtype = np.dtype(dtypes[bitpix])
+	if bitpix > 0:
+		info = np.iinfo(dtype)
+		stored = np.clip(np.round(data) - bzero, info.min, info.max).astype(dtype)
+	else:
+		stored = data.astype(dtype)
+
+	cards = [_card('SIMPLE', True), _card('BITPIX', bitpix), _card('NAXIS', 2),
+				_card('NAXIS1', data.shape[1]), _card('NAXIS2', data.shape[0])]
+	if bitpix > 0:
+		cards += [_card('BZERO', bzero), _card('BSCALE', 1)]
+	for key, value in (header or {}).items():
+		cards.append(_card(key, value))
+	cards.append(b'END'.ljust(80))
+	raw_header = b''.join(cards)
+	raw_data = stored.tobytes()
+
+	with open(path, 'wb') as out:
+		out.write(raw_header.ljust(-(-len(raw_header) // _BLOCK) * _BLOCK, b' '))
+		out.write(raw_data.ljust(-(-len(raw_data) // _BLOCK) * _BLOCK, b'\0'))
+	return path
+
+def _transform(positions : np.ndarray, center : Tuple[float, float], translation : Tuple[float, float], rotation : float) -> np.ndarray:
+	theta = math.radians(rotation)
+	rot = np.array([[math.cos(theta), -math.sin(theta)], [math.sin(theta), math.cos(theta)]])
+	c = np.asarray(center)
+	return (positions - c) @ rot.T + c + np.asarray(translation)
+
+def generate_frame(path : str, spec : FieldSpec = FieldSpec(), *,
+						translation : Tuple[float, float] = (0, 0), rotation : float = 0,
+						date_obs : datetime | None = None, noise_seed : int | None = None) -> SyntheticFrame:
+	''' Writes a single synthetic frame, the star field is defined by spec.seed and displaced by the given transform around the image center '''
+	positions, fluxes = _stars(spec, np.random.default_rng(spec.seed))
+	center = (spec.shape[1] / 2, spec.shape[0] / 2)
+	moved = _transform(positions, center, translation, rotation)
+	rng = np.random.default_rng(spec.seed if noise_seed is None else noise_seed)
+	image = render_field(spec, moved, fluxes, rng)
+
+	date = date_obs or datetime(2024, 1, 1)
+	header : Dict[str, bool | int | float | str] = {
+		'DATE-OBS' : date.isoformat(timespec= 'milliseconds'),
+		'EXPTIME' : spec.exptime,
+		'OBJECT' : 'SYNTHETIC',
+	}
+	write_fits(path, image, spec.bitpix, spec.zero, header)
+	return SyntheticFrame(path, moved, fluxes, translation, rotation)
+
+def generate_sequence(directory : str, n_frames : int, spec : FieldSpec = FieldSpec(), *,
+								drift : Tuple[float, float] = (0.5, 0.25), rotation : float = 0.,
+								cadence : float | None = None, prefix : str = 'synth_') -> List[SyntheticFrame]:
+	'''
+		Writes a sequence of frames of the same field into a directory.
+		Frame i is translated by i * drift pixels and rotated i * rotation degrees around the image center,
+		DATE-OBS starts at 2024-01-01T00:00:00 and increases by `cadence` seconds (default: spec.exptime).
+	'''
+	os.makedirs(directory, exist_ok= True)
+	step = timedelta(seconds= spec.exptime if cadence is None else cadence)
+	start = datetime(2024, 1, 1)
+	digits = len(str(max(n_frames - 1, 1)))
+	frames = list[SyntheticFrame]()
+	for i in range(n_frames):
+		path = os.path.join(directory, f'{prefix}{i:0{digits}d}.fits')
+		frames.append(generate_frame(path, spec, translation= (drift[0] * i, drift[1] * i), rotation= rotation * i,
+											date_obs= start + step * i, noise_seed= spec.seed + i + 1))
+	return frames
+
+def scaled(spec : FieldSpec, shape : Tuple[int, int]) -> FieldSpec:
+	''' Returns a copy of spec with the given shape and the same star density '''
+	density = spec.n_stars / (spec.shape[0] * spec.shape[1])
+	return replace(spec, shape= shape, n_stars= max(4, int(density * shape[0] * shape[1])))
@@ -1,8 +1,42 @@
 # type: ignore
+from typing import TYPE_CHECKING
 from .native import Star, Position, PositionArray, StarList
 from .native import APPNAME, VERSION
-from .native.ext import pprint
-from .starutils import detect_stars, visualize_stars
-from .sessionutils import *
-from .native.utils import geomutils
-from .io import *
+
+# Public names defined in submodules, loaded on first access (PEP 562)
+_LAZY = {
+	'pprint' : 'startrak.native.ext',
+	'geomutils' : 'startrak.native.utils.geomutils',
+	'transformutils' : 'startrak.native.utils.transformutils',
+	'detect_stars' : 'startrak.starutils',
+	'visualize_stars' : 'startrak.starutils',
+	**{name : 'startrak.sessionutils' for name in ('new_session', 'get_session', 'save_session', 'SessionType',
+							'add_file', 'remove_file', 'add_star', 'remove_star', 'get_file', 'get_star', 'get_files', 'get_stars', 'align_session', 'stack_session')},
+	**{name : 'startrak.io' for name in ('load_file', 'load_folder', 'get_data', 'clear_cache')},
+}
+__all__ = ['Star', 'Position', 'PositionArray', 'StarList', 'APPNAME', 'VERSION', *_LAZY]
+
+def __getattr__(name : str):
+	import importlib
+	module_name = _LAZY.get(name)
+	if module_name is None:
+		try:
+			return importlib.import_module(f'{__name__}.{name}')
+		except ModuleNotFoundError as e:
+			if e.name != f'{__name__}.{name}':
+				raise
+			raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+	module = importlib.import_module(module_name)
+	value = module if module_name.endswith('.' + name) else getattr(module, name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(_LAZY))
+
+if TYPE_CHECKING:
+	from .native.ext import pprint
+	from .native.utils import geomutils, transformutils
+	from .starutils import detect_stars, visualize_stars
+	from .sessionutils import *
+	from .io import *
@@ -0,0 +1,259 @@
+'''
+	Bias, dark and flat field calibration.
+
+	Master frames are combined from FileLists in strips of rows, so the memory used does not grow with the number of frames (see combine()),
+	and they are cached on disk under a key made of the paths, sizes and modification times of their inputs and the combine parameters.
+	Once installed, a Calibration is applied to the data of every file when it is read (FileInfo.get_data(), FrameContext.data),
+	so calibrated float32 pixels flow into detection, tracking and photometry without writing intermediate files.
+	The raw data is still available with FileInfo.get_data(raw= True).
+
+	Example:
+	```
+		calibration = Calibration(bias= load_folder('bias', False), dark= load_folder('darks', False), flat= load_folder('flats', False))
+		with calibration:
+			stars = detect_stars(file.get_data(), 'local_maxima')		# Calibrated data
+	```
+'''
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+from threading import Lock
+from typing import Callable, Dict, Literal, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from numpy.typing import NDArray as _NDArray
+from startrak import framecontext
+from startrak.imageutils import clear_stats, combine_stack, frame_stats
+from startrak.native import FileInfo
+from startrak.native.alias import NDArray
+from startrak.native.fits import get_data_hook, set_data_hook
+from startrak.timeaxis import exposure_time
+from startrak.types.alignment import file_signature
+
+__all__ = ['Calibration', 'Masters', 'CombineMethod', 'combine', 'exposure_time']
+
+CombineMethod = Literal['median', 'mean', 'sigma_clip']
+DEFAULT_CACHE = os.path.join(tempfile.gettempdir(), 'startrak_calibration')
+_Kind = Literal['bias', 'dark', 'flat']
+_DEPENDS : Dict[_Kind, Tuple[_Kind, ...]] = {'bias' : (), 'dark' : ('bias',), 'flat' : ('bias', 'dark')}
+_Float32Array = _NDArray[np.float32]
+
+def combine(files : Sequence[FileInfo], method : CombineMethod = 'median', sigma : float = 3.0, max_bytes : int = 64 << 20,
+				preprocess : Optional[Callable[[FileInfo, _Float32Array, int], NDArray]] = None) -> _Float32Array:
+	'''
+		Combines the frames pixel by pixel into a float32 frame.
+		The raw frames are read in strips of rows (FileInfo.get_data.rows), as many as fit in max_bytes when stacked, so only a strip of every frame is held in memory.
+
+		Parameters:
+		- files (sequence of FileInfo): Frames to combine, all of them with the same shape
+		- method (str, default: 'median'): 'median', 'mean' or 'sigma_clip' (mean of the values within sigma standard deviations of the median)
+		- sigma (float, default: 3): Clipping threshold of the sigma_clip method
+		- max_bytes (int, default: 64 MB): Memory budget of the stacked strips
+		- preprocess (callable, optional): preprocess(file, rows, start) is applied to the float32 strip of each frame before combining, start is the index of its first row
+	'''
+	assert len(files) > 0, 'At least one file is required'
+	assert method in ('median', 'mean', 'sigma_clip'), f'Unknown combine method "{method}"'
+	assert sigma > 0, 'sigma must be greater than zero'
+	shape = files[0].header.shape
+	assert all(file.header.shape == shape for file in files), 'All the frames must have the same shape'
+	rows, cols = shape
+	strip = int(min(rows, max(1, max_bytes // (len(files) * cols * 4))))
+	output = np.empty(shape, dtype= np.float32)
+	stack = np.empty((len(files), strip, cols), dtype= np.float32)
+	for start in range(0, rows, strip):
+		stop = min(start + strip, rows)
+		view = stack[:, :stop - start]
+		for i, file in enumerate(files):
+			view[i] = file.get_data.rows(start, stop, raw= True)
+			if preprocess is not None:
+				view[i] = preprocess(file, view[i], start)
+		output[start:stop] = combine_stack(view, method, sigma)
+	return output
+
+def _sampled_median(file : FileInfo, offset : Optional[NDArray], samples : int = 1 << 16) -> float:
+	# Median of a raw frame minus its offset over a grid of about `samples` pixels, only the sampled rows are read
+	rows, cols = file.header.shape
+	step = max(int(np.sqrt(rows * cols / samples)), 1)
+	first = step // 2
+	sample = np.empty((len(range(first, rows, step)), len(range(first, cols, step))), dtype= np.float32)
+	for i, row in enumerate(range(first, rows, step)):
+		sample[i] = file.get_data.rows(row, row + 1, raw= True)[0, first::step]
+		if offset is not None:
+			sample[i] -= offset[row, first::step]
+	return frame_stats(sample, cache= False).median
+
+class Masters(NamedTuple):
+	bias : Optional[NDArray]
+	dark : Optional[NDArray]
+	flat : Optional[NDArray]
+
+class Calibration:
+	'''
+		Builds the master frames from bias, dark and flat frames and calibrates the data of any frame with them:
+		`(data - bias - dark) / flat`, computed in float32.
+
+		If bias frames are given the master dark is stored as a dark current (counts per second) and scaled by the exposure time of each frame,
+		otherwise the master dark is subtracted as it is (it includes the bias, so it must match the exposure of the frames).
+		The master flat is normalized to a median of one, the flats are calibrated with the bias and dark masters first.
+
+		Parameters:
+		* bias, dark, flat (FileList or sequence of FileInfo): Frames of each master, any of them can be omitted.
+		* method (str): Combine method of the masters, see combine(). Default: 'median'.
+		* sigma (float): Clipping threshold of the sigma_clip method.
+		* cache_dir (str): Directory where the masters are cached, default: a folder in the temporary directory. None disables the cache.
+		* max_bytes (int): Memory budget of the combine, see combine().
+	'''
+	method : CombineMethod
+	sigma : float
+	cache_dir : Optional[str]
+	max_bytes : int
+
+	def __init__(self, bias : Sequence[FileInfo] = (), dark : Sequence[FileInfo] = (), flat : Sequence[FileInfo] = (), *,
+					method : CombineMethod = 'median', sigma : float = 3.0, cache_dir : Optional[str] = DEFAULT_CACHE, max_bytes : int = 64 << 20) -> None:
+		assert bias or dark or flat, 'At least one kind of calibration frames is required'
+		assert method in ('median', 'mean', 'sigma_clip'), f'Unknown combine method "{method}"'
+		self._files = {'bias' : list(bias), 'dark' : list(dark), 'flat' : list(flat)}
+		self.method = method
+		self.sigma = sigma
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self._masters : Optional[Masters] = None
+		self._offsets : Dict[float, NDArray] = {}
+		self._exposures : Dict[str, float] = {}
+		self._lock = Lock()
+
+	@property
+	def dark_current(self) -> bool:
+		''' Whether the master dark is a dark current scaled by the exposure time'''
+		return bool(self._files['bias'] and self._files['dark'])
+
+	def key(self, kind : _Kind) -> str:
+		''' Hash of the inputs of a master (and of the masters it depends on) and the combine parameters'''
+		inputs = [(file.path, file_signature(file)) for file in self._files[kind]]
+		depends = [self.key(k) for k in _DEPENDS[kind] if self._files[k]]
+		return hashlib.sha1(repr((kind, inputs, depends, self.method, self.sigma)).encode()).hexdigest()
+
+	@property
+	def masters(self) -> Masters:
+		''' The master frames, built (or loaded from the cache) on first access'''
+		if self._masters is None:
+			with self._lock:
+				if self._masters is None:
+					bias = self._master('bias', None)
+					dark = self._master('dark', self._dark_preprocess(bias))
+					flat = self._master('flat', self._flat_preprocess(bias, dark))
+					self._masters = Masters(bias, dark, flat)
+		return self._masters
+
+	def _dark_preprocess(self, bias : Optional[NDArray]) -> Optional[Callable[[FileInfo, _Float32Array, int], NDArray]]:
+		if bias is None:
+			return None
+		def preprocess(file : FileInfo, rows : _Float32Array, start : int) -> NDArray:
+			rows -= bias[start:start + len(rows)]
+			return rows / max(exposure_time(file), 1e-6)
+		return preprocess
+
+	def _flat_preprocess(self, bias : Optional[NDArray], dark : Optional[NDArray]) -> Callable[[FileInfo, _Float32Array, int], NDArray]:
+		# Flats are normalized by their median before combining, estimated from a sample of rows so the flats are not read twice
+		offsets = dict[str, Optional[NDArray]]()
+		norms = dict[str, float]()
+		def preprocess(file : FileInfo, rows : _Float32Array, start : int) -> NDArray:
+			if file.path not in norms:
+				offsets[file.path] = offset = self._offset(bias, dark, exposure_time(file))
+				norm = _sampled_median(file, offset)
+				norms[file.path] = norm if norm > 0 else 1
+			offset = offsets[file.path]
+			if offset is not None:
+				rows -= offset[start:start + len(rows)]
+			return rows / norms[file.path]
+		return preprocess
+
+	def _offset(self, bias : Optional[NDArray], dark : Optional[NDArray], exptime : float) -> Optional[NDArray]:
+		# Level subtracted from a frame of the given exposure
+		if dark is None:
+			return bias
+		if bias is None:
+			return dark
+		return bias + dark * np.float32(exptime) if self.dark_current else bias + dark
+
+	def _master(self, kind : _Kind, preprocess : Optional[Callable[[FileInfo, _Float32Array, int], NDArray]]) -> Optional[NDArray]:
+		files = self._files[kind]
+		if not files:
+			return None
+		path = os.path.join(self.cache_dir, f'{kind}_{self.key(kind)}.npy') if self.cache_dir else None
+		if path and os.path.isfile(path):
+			try:
+				return np.load(path)
+			except (OSError, ValueError) as e:
+				print(f'Unable to load the cached master {kind}: {e}')
+		master = combine(files, self.method, self.sigma, self.max_bytes, preprocess)
+		if kind == 'flat':
+			master /= np.median(master)
+			master[~(master > 0)] = 1
+		if path:
+			os.makedirs(os.path.dirname(path), exist_ok= True)
+			temp = f'{path}.{os.getpid()}.tmp'
+			with open(temp, 'wb') as f:
+				np.save(f, master)
+			os.replace(temp, path)
+		return master
+
+	def apply(self, data : NDArray, exptime : float = 0., start : int = 0) -> NDArray:
+		''' Returns the calibrated float32 copy of the data of a frame with the given exposure time, or of its rows from start on'''
+		masters = self.masters
+		reference = next(m for m in masters if m is not None)
+		stop = start + data.shape[0]
+		if data.shape[1:] != reference.shape[1:] or start < 0 or stop > reference.shape[0]:
+			raise ValueError(f'Frame shape {data.shape} does not match the master frames {reference.shape}')
+		if exptime not in self._offsets:
+			offset = self._offset(masters.bias, masters.dark, exptime)
+			self._offsets[exptime] = offset if offset is not None else np.zeros(reference.shape, dtype= np.float32)
+		output = np.array(data, dtype= np.float32)
+		output -= self._offsets[exptime][start:stop]
+		if masters.flat is not None:
+			output /= masters.flat[start:stop]
+		return output
+
+	def __call__(self, path : str, data : NDArray, start : int = 0) -> NDArray:
+		# Data hook, see install()
+		if path not in self._exposures:
+			self._exposures[path] = exposure_time(FileInfo.new(path))
+		try:
+			return self.apply(data, self._exposures[path], start)
+		except ValueError as e:
+			print(f'Calibration skipped for "{os.path.basename(path)}": {e}')
+			return data
+
+	def install(self):
+		''' Calibrates the data of every file read from now on, the cached frame data and statistics are cleared'''
+		self.masters
+		set_data_hook(self)
+		framecontext.clear_contexts()
+		clear_stats()
+
+	def uninstall(self):
+		''' Stops calibrating the data read, if this calibration is installed'''
+		if get_data_hook() is self:
+			set_data_hook(None)
+			framecontext.clear_contexts()
+			clear_stats()
+
+	def __getstate__(self) -> Dict:
+		# Sent to the worker processes of the stacking, see startrak.stacking
+		state = self.__dict__.copy()
+		del state['_lock']
+		state['_offsets'] = {}
+		return state
+	def __setstate__(self, state : Dict):
+		self.__dict__.update(state)
+		self._lock = Lock()
+
+	def __enter__(self) -> Calibration:
+		self.install()
+		return self
+	def __exit__(self, *args):
+		self.uninstall()
+
+	def __repr__(self) -> str:
+		counts = ', '.join(f'{kind}= {len(files)}' for kind, files in self._files.items() if files)
+		return f'{type(self).__name__} ({counts}, method= {self.method})'
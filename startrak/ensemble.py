@@ -0,0 +1,161 @@
+'''
+	Ensemble differential photometry.
+
+	The instrumental magnitudes of a set of comparison stars (ReferenceStar, with their catalog magnitude) are modeled as
+	`m[f, r] + Z[f] = M[r] + o[r]`: a zero point Z per frame (transparency, airmass, exposure) and a constant offset o per comparison
+	(catalog errors, color terms), with the weighted mean offset fixed to zero so the ensemble follows the catalog on average
+	(Honeycutt 1992). The model is solved by weighted least squares for all the frames at once, alternating between the zero points and the offsets,
+	the measurements beyond sigma times the scatter of their star are clipped (the worst of each frame at a time) and variable comparisons are rejected one at a time.
+	The zero points are then applied to every star, so the calibrated magnitudes of all the targets come out in one pass.
+
+	Example:
+	```
+		curves = LightCurves.from_results(pipeline.results, session.included_stars)
+		solution = ensemble_photometry(curves, session.included_stars)		# The ReferenceStars are the comparisons
+		print('Rejected comparisons:', solution.rejected)
+		target = solution.magnitude[:, curves.column('V1')]
+	```
+'''
+from __future__ import annotations
+import math
+from typing import Mapping, NamedTuple, Sequence, Tuple
+import numpy as np
+from startrak.native import ReferenceStar
+from startrak.native.alias import NDArray
+from startrak.types.lightcurves import LightCurves
+
+__all__ = ['EnsembleSolution', 'ensemble_photometry', 'instrumental_magnitudes']
+
+MAX_CLIP_PASSES = 10
+_MAG_SIGMA = 2.5 / math.log(10)
+
+class EnsembleSolution(NamedTuple):
+	magnitude : NDArray
+	''' Calibrated magnitude of every star in every frame, (n_frames, n_stars), NaN where the flux or the zero point is missing'''
+	error : NDArray
+	''' Uncertainty of the calibrated magnitudes, including the error of the zero point (the only term where the flux error is unknown)'''
+	zero_point : NDArray
+	''' Zero point of each frame, (n_frames,)'''
+	zero_point_error : NDArray
+	comparisons : Tuple[str, ...]
+	''' Comparison stars used in the solution'''
+	rejected : Tuple[str, ...]
+	''' Comparison stars rejected as variable'''
+	scatter : NDArray
+	''' Normalized scatter of the residuals of every comparison given (used or rejected), in their order'''
+	offset : NDArray
+	''' Offset between the instrumental and catalog magnitudes of every comparison given (NaN for the rejected)'''
+
+def instrumental_magnitudes(curves : LightCurves) -> Tuple[NDArray, NDArray]:
+	''' Instrumental magnitudes -2.5 log10(flux) and their uncertainties, NaN for missing or non positive fluxes'''
+	with np.errstate(divide= 'ignore', invalid= 'ignore'):
+		flux = np.where(curves.flux > 0, curves.flux, np.nan)
+		return -2.5 * np.log10(flux), _MAG_SIGMA * curves.error / flux
+
+def _catalog(curves : LightCurves, references : Sequence[ReferenceStar] | Mapping[str, float]) -> Tuple[Tuple[str, ...], NDArray]:
+	if isinstance(references, Mapping):
+		names, magnitudes = tuple(references.keys()), [references[name] for name in references]
+	else:
+		# isinstance() matches any STObject (see STObject.__subclasshook__), reference stars are told by their magnitude
+		stars = [star for star in references if hasattr(star, 'magnitude')]
+		names, magnitudes = tuple(star.name for star in stars), [star.magnitude for star in stars]
+	missing = [name for name in names if name not in curves.names]
+	assert not missing, f'The light curves have no measurements of the comparison stars {missing}'
+	return names, np.array(magnitudes, dtype= np.float64)
+
+def _solve(m : NDArray, catalog : NDArray, w : NDArray, iterations : int, tolerance : float) -> Tuple[NDArray, NDArray]:
+	# Alternating weighted least squares of the zero points and offsets, w is zero for the masked measurements
+	offset = np.zeros(len(catalog))
+	frame_weight = w.sum(axis= 1)
+	star_weight = w.sum(axis= 0)
+	with np.errstate(divide= 'ignore', invalid= 'ignore'):
+		for _ in range(iterations):
+			zero_point = np.where(frame_weight > 0, (w * (catalog + offset - m)).sum(axis= 1) / frame_weight, np.nan)
+			fitted = np.where(w > 0, m + zero_point[:, None] - catalog, 0)
+			update = np.where(star_weight > 0, (w * fitted).sum(axis= 0) / star_weight, 0)
+			update -= (update * star_weight).sum() / star_weight.sum()
+			converged = np.abs(update - offset).max() < tolerance
+			offset = update
+			if converged:
+				break
+		zero_point = np.where(frame_weight > 0, (w * (catalog + offset - m)).sum(axis= 1) / frame_weight, np.nan)
+	return zero_point, offset
+
+def ensemble_photometry(curves : LightCurves, references : Sequence[ReferenceStar] | Mapping[str, float], sigma : float = 3.0,
+								variability : float = 2.0, min_comparisons : int = 2, iterations : int = 50, tolerance : float = 1e-6) -> EnsembleSolution:
+	'''
+		Solves the zero point of every frame from the comparison stars and calibrates the magnitudes of all the stars, see the module documentation.
+
+		Parameters:
+		- curves (LightCurves): Light curves of the comparisons and the targets, the flux errors (when all of them are known) weight the measurements
+		- references (sequence of ReferenceStar or mapping): Comparison stars with their catalog magnitude, other kinds of stars are ignored.
+			With magnitudes of zero the result is the differential magnitude with respect to the ensemble
+		- sigma (float, default: 3): Measurements further than sigma times the scatter of their comparison are clipped
+		- variability (float, default: 2): Comparisons whose normalized scatter exceeds variability times the median are rejected, the worst first
+		- min_comparisons (int, default: 2): Comparisons are not rejected below this number
+		- iterations, tolerance: Convergence of the alternating least squares
+	'''
+	names, catalog = _catalog(curves, references)
+	assert len(names) >= 1, 'At least one comparison star is required'
+	columns = [curves.column(name) for name in names]
+	magnitude, error = instrumental_magnitudes(curves)
+	m = magnitude[:, columns]
+	sm = error[:, columns]
+	valid = np.isfinite(m)
+	known = bool(np.all(np.isfinite(sm[valid]) & (sm[valid] > 0)))
+	weights = np.where(valid, 1 / np.where(valid & known, sm, 1) ** 2, 0)
+	m = np.where(valid, m, 0)
+
+	active = np.ones(len(names), dtype= bool)
+	clipped = np.zeros(m.shape, dtype= bool)
+	while True:
+		# Clip the outlying measurements of the active comparisons until the solution stops changing
+		for _ in range(MAX_CLIP_PASSES):
+			w = np.where(active[None, :] & ~clipped, weights, 0)
+			zero_point, offset = _solve(m, catalog, w, iterations, tolerance)
+			residual = np.where(w > 0, m + zero_point[:, None] - catalog - offset, 0)
+			with np.errstate(divide= 'ignore', invalid= 'ignore'):
+				scatter = np.sqrt((w * residual ** 2).sum(axis= 0) / (w > 0).sum(axis= 0))
+				spread = np.sqrt((w * residual ** 2).sum(axis= 0) / w.sum(axis= 0))
+				# An outlier pulls the zero point of its frame, so the deviations are measured from the median of the frame
+				estimates = np.where(w > 0, catalog + offset - m, np.nan)
+				estimates[~(w > 0).any(axis= 1), 0] = 0
+				level = np.nanmedian(estimates, axis= 1)
+				deviation = np.where(w > 0, np.abs(m + level[:, None] - catalog - offset) / spread, 0)
+			# The worst measurement of each frame is clipped per pass, frames with two measurements can not tell which one is wrong
+			frames = np.flatnonzero(((w > 0).sum(axis= 1) > 2) & (deviation.max(axis= 1) > sigma))
+			if len(frames) == 0:
+				break
+			clipped[frames, deviation[frames].argmax(axis= 1)] = True
+		# Reject the most variable comparison, if it stands out
+		candidates = np.flatnonzero(active & np.isfinite(scatter))
+		if len(candidates) <= max(min_comparisons, 1):
+			break
+		worst = candidates[np.argmax(scatter[candidates])]
+		if not scatter[worst] > variability * np.median(scatter[candidates]):
+			break
+		active[worst] = False
+
+	# The scatter of the rejected comparisons is measured against the final zero points
+	free = ~clipped & valid & np.isfinite(zero_point)[:, None]
+	with np.errstate(divide= 'ignore', invalid= 'ignore'):
+		residual = m + zero_point[:, None] - catalog
+		own = np.where(free, weights * residual, 0).sum(axis= 0) / np.where(free, weights, 0).sum(axis= 0)
+		rejected_scatter = np.sqrt(np.where(free, weights * (residual - own) ** 2, 0).sum(axis= 0) / free.sum(axis= 0))
+		scatter = np.where(active, scatter, rejected_scatter)
+		w = np.where(active[None, :] & ~clipped, weights, 0)
+		used = (w > 0).sum(axis= 1)
+		if known:
+			zero_point_error = 1 / np.sqrt(w.sum(axis= 1))
+		else:
+			final = np.where(w > 0, m + zero_point[:, None] - catalog - offset, 0)
+			zero_point_error = np.sqrt((final ** 2).sum(axis= 1) / (used * (used - 1)))
+	zero_point_error[used == 0] = np.nan
+
+	calibrated = magnitude + zero_point[:, None]
+	# Unknown flux errors leave the zero point error, estimated from the scatter of the comparisons
+	measured = np.where(np.isfinite(error), error, 0)
+	calibrated_error = np.where(np.isfinite(calibrated), np.sqrt(measured ** 2 + zero_point_error[:, None] ** 2), np.nan)
+	return EnsembleSolution(calibrated, calibrated_error, zero_point, zero_point_error,
+								tuple(name for name, a in zip(names, active) if a), tuple(name for name, a in zip(names, active) if not a),
+								scatter, np.where(active, offset, np.nan))
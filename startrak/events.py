@@ -52,7 +52,7 @@ class NamedEvent(Event):
 			call_event('my_event', 2) # prints: 2
 		```
 	'''
-	_named_events : ClassVar[Dict[str, Self]]
+	_named_events : ClassVar[Dict[str, Self]] = {}
 
 	def __init__(self, name : str, *method_list : _TFunc):
 		if not name: raise NameError('Name cannot be empty')
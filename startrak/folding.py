@@ -0,0 +1,147 @@
+'''
+	Phase folding and phase dispersion minimization (PDM, Stellingwerf 1978).
+
+	The light curves are folded with a trial period and binned in phase, the PDM statistic theta is the pooled variance within the bins
+	over the total variance: close to 1 for periods unrelated to the variability, much smaller at the true period (and its multiples).
+	Phases are binned with bincount over a combined (period, bin, star) index, so a batch of trial periods is evaluated for every star
+	without sorting nor a loop per period, batches are sized to fit in max_bytes.
+
+	Example:
+	```
+		candidates = lomb_scargle(curves, min_period= 0.02).best_period
+		# Confirm each candidate (and its double, as PDM favors the full cycle of eclipsing binaries) with a fine local search
+		trials = np.concatenate((candidates[:, None] * np.linspace(0.99, 1.01, 201), 2 * candidates[:, None] * np.linspace(0.99, 1.01, 201)), axis= 1)
+		result = pdm(curves, trials)
+		folded = curves.fold(result.best_period, 20)
+	```
+'''
+from __future__ import annotations
+from typing import NamedTuple, Optional
+import numpy as np
+from startrak.native.alias import ArrayLike, NDArray
+from startrak.periodogram import frequency_grid
+from startrak.types.lightcurves import LightCurves
+
+__all__ = ['FoldedCurves', 'PDMResult', 'fold', 'pdm']
+
+class FoldedCurves(NamedTuple):
+	phase : NDArray
+	''' Phase at the center of each bin, (n_bins,)'''
+	mean : NDArray
+	''' Mean flux of each star in each bin, (n_bins, n_stars), NaN for empty bins'''
+	scatter : NDArray
+	''' Standard deviation of the fluxes in each bin, NaN for bins with less than two measurements'''
+	counts : NDArray
+	''' Number of measurements in each bin'''
+
+class PDMResult(NamedTuple):
+	period : NDArray
+	''' Trial periods, (n_periods,) or (n_stars, n_periods)'''
+	theta : Optional[NDArray]
+	''' PDM statistic of each star at each period (n_stars, n_periods), only if requested'''
+	best_period : NDArray
+	best_theta : NDArray
+
+def _phase_bins(time : NDArray, period : NDArray, n_bins : int, epoch : float) -> NDArray:
+	# Bin of every (period, frame, star), phases in [0, 1) from the epoch
+	cycles = np.where(np.isfinite(time), time - epoch, 0)[None, :, None] / period[:, None, :]
+	bins = ((cycles - np.floor(cycles)) * n_bins).astype(np.intp)
+	return np.minimum(bins, n_bins - 1)
+
+def _binned_sums(bins : NDArray, values : NDArray, valid : NDArray, n_bins : int):
+	# Count, sum and sum of squares of the values in every (period, bin, star), bins has shape (n_periods, n_frames, n_stars)
+	periods, _, stars = bins.shape
+	index = (np.arange(periods)[:, None, None] * n_bins + bins) * stars + np.arange(stars)
+	index = index[:, valid]
+	size = periods * n_bins * stars
+	shape = (periods, n_bins, stars)
+	weights = np.broadcast_to(values[valid], index.shape)
+	count = np.bincount(index.ravel(), minlength= size).reshape(shape)
+	total = np.bincount(index.ravel(), weights.ravel(), minlength= size).reshape(shape)
+	squares = np.bincount(index.ravel(), (weights ** 2).ravel(), minlength= size).reshape(shape)
+	return count, total, squares
+
+def _prepare(curves : LightCurves):
+	# Valid measurements, and the fluxes centered and scaled per star so that the sums of squares do not lose precision
+	valid = np.isfinite(curves.flux) & np.isfinite(curves.time)[:, None]
+	flux = np.where(valid, curves.flux, 0)
+	count = valid.sum(axis= 0)
+	mean = flux.sum(axis= 0) / np.maximum(count, 1)
+	scale = np.sqrt((np.where(valid, flux - mean, 0) ** 2).sum(axis= 0) / np.maximum(count - 1, 1))
+	scale[~(scale > 0)] = 1
+	return valid, np.where(valid, (flux - mean) / scale, 0), mean, scale, count
+
+def _epoch(curves : LightCurves, epoch : Optional[float]) -> float:
+	if epoch is not None:
+		return epoch
+	times = curves.time[np.isfinite(curves.time)]
+	return float(times.min()) if len(times) else 0.
+
+def fold(curves : LightCurves, period : float | ArrayLike, n_bins : int = 20, epoch : Optional[float] = None) -> FoldedCurves:
+	'''
+		Folds the light curves with a period and bins them in phase.
+
+		Parameters:
+		- curves (LightCurves): Light curves, NaN fluxes are ignored
+		- period (float or arraylike): Period, or the period of each star
+		- n_bins (int, default: 20): Number of phase bins
+		- epoch (float, optional): Time of phase zero, default: the first time
+	'''
+	assert n_bins > 0, 'n_bins must be greater than zero'
+	stars = curves.flux.shape[1]
+	period = np.broadcast_to(np.asarray(period, dtype= np.float64), (stars,))
+	assert (period > 0).all(), 'Periods must be greater than zero'
+	valid, values, mean, scale, _ = _prepare(curves)
+	bins = _phase_bins(curves.time, period[None], n_bins, _epoch(curves, epoch))
+	count, total, squares = (a[0] for a in _binned_sums(bins, values, valid, n_bins))
+	with np.errstate(divide= 'ignore', invalid= 'ignore'):
+		binned = total / count
+		variance = (squares - total * binned) / (count - 1)
+	binned = np.where(count > 0, binned * scale + mean, np.nan)
+	scatter = np.where(count > 1, np.sqrt(np.maximum(variance, 0)) * scale, np.nan)
+	return FoldedCurves((np.arange(n_bins) + 0.5) / n_bins, binned, scatter, count)
+
+def pdm(curves : LightCurves, periods : Optional[ArrayLike] = None, n_bins : int = 10, min_period : Optional[float] = None, max_period : Optional[float] = None,
+			samples_per_peak : float = 5, keep_theta : bool = False, max_bytes : int = 64 << 20) -> PDMResult:
+	'''
+		Phase dispersion minimization of every star of the light curves, see the module documentation.
+
+		Parameters:
+		- curves (LightCurves): Light curves, NaN fluxes are ignored
+		- periods (arraylike, optional): Trial periods, shared (n_periods,) or for each star (n_stars, n_periods).
+			Default: the periods of the frequency grid given by min_period, max_period and samples_per_peak, see periodogram.frequency_grid()
+		- n_bins (int, default: 10): Number of phase bins
+		- keep_theta (bool, default: False): Whether to return the statistic of every trial period
+		- max_bytes (int, default: 64 MB): Memory budget of a batch of trial periods
+	'''
+	assert n_bins > 1, 'At least two phase bins are required'
+	if periods is None:
+		f0, df, n = frequency_grid(curves.time[np.isfinite(curves.time)], min_period, max_period, samples_per_peak)
+		periods = 1 / (f0 + df * np.arange(n))[::-1]
+	periods = np.asarray(periods, dtype= np.float64)
+	frames, stars = curves.flux.shape
+	trials = np.broadcast_to(periods.T if periods.ndim == 2 else periods[:, None], (periods.shape[-1], stars))
+	assert (trials > 0).all(), 'Periods must be greater than zero'
+
+	valid, values, _, _, count = _prepare(curves)
+	epoch = _epoch(curves, None)
+	total_variance = (values ** 2).sum(axis= 0)
+	# Each (period, frame, star) takes a bin index, a combined index and a phase, each (period, bin, star) three sums
+	batch = int(max(1, max_bytes // (stars * (frames * 48 + n_bins * 24))))
+	theta = np.empty((stars, len(trials)))
+	for start in range(0, len(trials), batch):
+		trial = trials[start:start + batch]
+		n, sums, squares = _binned_sums(_phase_bins(curves.time, trial, n_bins, epoch), values, valid, n_bins)
+		with np.errstate(divide= 'ignore', invalid= 'ignore'):
+			within = (squares - np.where(n > 0, sums ** 2 / n, 0)).sum(axis= 1)
+			# Pooled variance of the bins over the total variance, the degrees of freedom lost are the non empty bins
+			theta[:, start:start + batch] = ((within / (count - np.count_nonzero(n > 0, axis= 1))) / (total_variance / (count - 1))).T
+	theta[~np.isfinite(theta)] = np.nan
+	few = count <= n_bins
+	theta[few] = np.nan
+	best = np.argmin(np.where(np.isnan(theta), np.inf, theta), axis= 1)
+	rows = np.arange(stars)
+	best_theta = theta[rows, best]
+	best_period = trials[best, rows].copy()
+	best_period[few] = np.nan
+	return PDMResult(periods, theta if keep_theta else None, best_period, best_theta)
@@ -0,0 +1,251 @@
+'''
+	Per-frame cache of derived products.
+
+	Every FileInfo has a FrameContext (`file.context`) which loads the frame data once and memoizes the products derived from it:
+	statistics, stretched images, smoothed images, pyramid levels, background meshes and detection results.
+	Detectors and trackers look up the context of the array they receive with find_context(), so when several stages process
+	`file.context.data` each product is computed only once per frame.
+
+	Contexts form a working set bounded by a number of frames and a memory budget (see configure()),
+	the least recently used frames are evicted with all their products. Evicted contexts are only dropped from the working set,
+	a stage still holding one keeps using its data and products until it releases it. Contexts are keyed by path and modification time,
+	so files rewritten in place get a new context. Frame data must not be modified in place.
+
+	Example:
+	```
+		context = file.context
+		stars = detect_stars(context.data, 'local_maxima')	# Reuses context.smoothed(...)
+		solution = tracker.track(context.data)				# Reuses the detection and pyramid levels if the parameters match
+	```
+'''
+from __future__ import annotations
+from collections import OrderedDict
+import os
+from threading import Lock, RLock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+import numpy as np
+from startrak.imageutils import BackgroundMesh, FrameStats, background_mesh, block_average, frame_stats, separable_filter, sigma_stretch
+from startrak.native import FileInfo, StarDetector, Star, StarList
+from startrak.native.alias import NDArray
+
+__all__ = ['FrameContext', 'get_context', 'find_context', 'release', 'configure', 'clear_contexts', 'working_set']
+
+_T = TypeVar('_T')
+
+def _sizeof(value : Any) -> int:
+	if isinstance(value, np.ndarray):
+		return value.nbytes
+	if isinstance(value, (tuple, list)):
+		return sum(_sizeof(v) for v in value)
+	if isinstance(value, BackgroundMesh):
+		return value.level.nbytes + value.rms.nbytes
+	return 0
+
+def _detector_key(detector : StarDetector) -> Hashable:
+	# Detectors with the same type and parameters share their results
+	params = list[Tuple[str, Hashable]]()
+	for key, value in sorted(vars(detector).items()):
+		if isinstance(value, (int, float, str, bool, tuple, type(None))):
+			params.append((key, value))
+		elif isinstance(value, StarDetector):
+			params.append((key, _detector_key(value)))
+	return type(detector).__qualname__, tuple(params)
+
+class FrameContext:
+	'''
+		Lazily computed products of a single frame, see the module documentation.
+		Products are stored under a hashable key, get(key, factory) computes a product the first time it is requested.
+	'''
+	file : FileInfo
+	signature : int
+
+	def __init__(self, file : FileInfo, signature : int = 0) -> None:
+		self.file = file
+		self.signature = signature
+		self._data : Optional[NDArray] = None
+		self._products : Dict[Hashable, Any] = {}
+		self._nbytes = 0
+		self._lock = RLock()
+		self._evicted = False
+
+	@property
+	def data(self) -> NDArray:
+		''' The frame data, read once. An evicted context that has to read its data joins the working set again '''
+		data = self._data
+		if data is None:
+			read = False
+			with self._lock:
+				data = self._data
+				if data is None:
+					data = self._data = self.file.get_data()
+					self._nbytes += data.nbytes
+					read = True
+			if read and self._evicted:
+				_attach(self)
+			_enforce(self)
+		return data
+	@property
+	def nbytes(self) -> int:
+		''' Memory held by the data and the products (only arrays are counted) '''
+		return self._nbytes
+	@property
+	def loaded(self) -> bool:
+		return self._data is not None
+	@property
+	def evicted(self) -> bool:
+		''' Whether the context left the working set, find_context() no longer returns it '''
+		return self._evicted
+
+	def __contains__(self, key : Hashable) -> bool:
+		return key in self._products
+
+	def get(self, key : Hashable, factory : Callable[[], _T]) -> _T:
+		''' Returns the product stored under key, computing it with factory() if needed '''
+		try:
+			return self._products[key]
+		except KeyError:
+			pass
+		with self._lock:
+			try:
+				value = self._products[key]
+			except KeyError:
+				value = self._products[key] = factory()
+				self._nbytes += _sizeof(value)
+		_enforce(self)
+		return value
+
+	def stats(self) -> FrameStats:
+		return self.get('stats', lambda: frame_stats(self.data))
+
+	def stretched(self, sigma : float = 1.0) -> NDArray:
+		''' The frame stretched into uint8, see imageutils.sigma_stretch '''
+		return self.get(('stretched', sigma), lambda: sigma_stretch(self.data, sigma, self.stats()))
+
+	def smoothed(self, kernel : NDArray, dtype : type = np.float32) -> NDArray:
+		''' The frame convolved with a symmetric 1D kernel along both axes, see imageutils.separable_filter '''
+		return self.get(('smoothed', np.asarray(kernel).tobytes(), np.dtype(dtype).str), lambda: separable_filter(self.data, kernel, dtype))
+
+	def level(self, level : int, factor : int = 2) -> NDArray:
+		''' A level of the block averaged pyramid of the frame, see imageutils.ImagePyramid '''
+		assert level >= 0, 'level must be a positive integer'
+		if level == 0:
+			return self.data
+		return self.get(('level', level, factor), lambda: block_average(self.level(level - 1, factor), factor))
+
+	def background(self, box : int = 64, sigma : float = 3.0) -> BackgroundMesh:
+		''' Sigma clipped background mesh of the frame, see imageutils.BackgroundMesh '''
+		return self.get(('background', box, sigma), lambda: background_mesh(self.data, box, sigma, cache= False))
+
+	def detect(self, detector : StarDetector, level : int = 0, factor : int = 2) -> StarList:
+		'''
+			Stars detected by the detector in a pyramid level (in coordinates of that level), a new StarList is returned every call.
+			Results are shared between detectors of the same type and parameters.
+		'''
+		stars : StarList = self.get(('detect', _detector_key(detector), level, factor), lambda: detector.detect(self.level(level, factor)))
+		return StarList( *[Star(star.name, star.position, star.aperture) for star in stars])
+
+	def clear(self):
+		''' Drops the data and every product '''
+		with self._lock:
+			self._data = None
+			self._products.clear()
+			self._nbytes = 0
+
+	def __array__(self, dtype= None) -> NDArray:
+		return np.asarray(self.data, dtype= dtype)
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} ({self.file.name}, {len(self._products)} products, {self._nbytes / 1048576:.1f} MB)'
+
+# Working set
+MAX_FRAMES = 8
+MAX_BYTES = 512 << 20
+_contexts = OrderedDict[str, FrameContext]()
+_lock = Lock()
+
+def configure(max_frames : Optional[int] = None, max_bytes : Optional[int] = None):
+	''' Sets the maximum number of frames and bytes held by the working set '''
+	global MAX_FRAMES, MAX_BYTES
+	if max_frames is not None:
+		assert max_frames >= 1, 'max_frames must be greater or equal than one'
+		MAX_FRAMES = max_frames
+	if max_bytes is not None:
+		assert max_bytes >= 0, 'max_bytes must be a positive number'
+		MAX_BYTES = max_bytes
+	_enforce(None)
+
+def _signature(file : FileInfo) -> int:
+	try:
+		return os.stat(file.path).st_mtime_ns
+	except OSError:
+		return 0
+
+def get_context(file : FileInfo) -> FrameContext:
+	''' Returns the context of a file, which becomes the most recently used frame of the working set '''
+	signature = _signature(file)
+	with _lock:
+		previous = _contexts.get(file.path)
+		if previous is not None and previous.signature == signature:
+			_contexts.move_to_end(file.path)
+			return previous
+		context = _contexts[file.path] = FrameContext(file, signature)
+		if previous is not None:
+			previous._evicted = True
+	_enforce(context)
+	return context
+
+def find_context(image : Any) -> Optional[FrameContext]:
+	''' Returns the context whose data is the given array (the same object), or None '''
+	if not isinstance(image, np.ndarray):
+		return image if isinstance(image, FrameContext) else None
+	with _lock:
+		for context in _contexts.values():
+			if context._data is image:
+				return context
+	return None
+
+def release(file : FileInfo):
+	''' Removes a file from the working set '''
+	with _lock:
+		context = _contexts.pop(file.path, None)
+		if context is not None:
+			context._evicted = True
+
+def clear_contexts():
+	''' Empties the working set '''
+	with _lock:
+		for context in _contexts.values():
+			context._evicted = True
+		_contexts.clear()
+
+def working_set() -> Tuple[int, int]:
+	''' Returns the number of frames and bytes held by the working set '''
+	with _lock:
+		return len(_contexts), sum(context.nbytes for context in _contexts.values())
+
+def _attach(context : FrameContext):
+	# Makes an evicted context the most recently used one of its file again, replacing the context that took its place if any
+	with _lock:
+		previous = _contexts.get(context.file.path)
+		if previous is not None and previous is not context:
+			previous._evicted = True
+		_contexts[context.file.path] = context
+		_contexts.move_to_end(context.file.path)
+		context._evicted = False
+
+def _enforce(current : Optional[FrameContext]):
+	# Evicts the least recently used frames, the frame being processed (or the most recently used one) is kept even if it exceeds the budget by itself.
+	# Evicted contexts are not cleared since other threads may still be using them, they are freed once nothing references them.
+	# Context locks are never acquired while holding the working set lock
+	with _lock:
+		total = sum(context.nbytes for context in _contexts.values())
+		paths = list(_contexts)
+		for path in paths:
+			if len(_contexts) <= MAX_FRAMES and total <= MAX_BYTES:
+				break
+			context = _contexts[path]
+			if context is current or path == paths[-1]:
+				continue
+			del _contexts[path]
+			total -= context.nbytes
+			context._evicted = True
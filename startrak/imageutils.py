@@ -1,22 +1,323 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Literal, NamedTuple, Optional, Tuple
+import warnings
+import weakref
 from startrak.native.alias import *
 import numpy as np
 
-__all__ = ['sigma_stretch']
+__all__ = ['FrameStats', 'frame_stats', 'clear_stats', 'BackgroundMesh', 'background_mesh', 'combine_stack', 'sigma_stretch', 'gaussian_kernel', 'separable_filter', 'block_average', 'ImagePyramid', 'refine_centroids', 'bilinear_sample', 'extract_windows']
 
-def sigma_stretch(image : ImageLike, sigma=1.0) -> NDArray:
+class FrameStats(NamedTuple):
+	median : float
+	mad : float
+	std : float
+	minimum : float
+	maximum : float
+
+	@property
+	def sigma(self) -> float:
+		''' Robust standard deviation estimated from the MAD, the standard deviation is used if the MAD is zero'''
+		return 1.4826 * self.mad if self.mad > 0 else self.std
+
+MAX_CACHED_STATS = 16
+_stats_cache = OrderedDict[Tuple[int, int], Tuple[weakref.ref, FrameStats]]()
+_stats_lock = Lock()
+
+def _histogram_median(values : NDArray, counts : NDArray) -> float:
+	# Same result as np.median over the expanded data, values must be sorted
+	cdf = np.cumsum(counts)
+	n = int(cdf[-1])
+	lower, upper = np.searchsorted(cdf, [(n - 1) // 2, n // 2], side= 'right')
+	return (float(values[lower]) + float(values[upper])) / 2
+
+def _histogram_stats(data : NDArray) -> FrameStats:
+	# Exact statistics of every pixel from its histogram, signed data is offset so the bins start at zero
+	unsigned = np.dtype(f'u{data.dtype.itemsize}')
+	offset = 0
+	if data.dtype.kind == 'i':
+		offset = 1 << (8 * data.dtype.itemsize - 1)
+		data = data.view(unsigned) ^ unsigned.type(offset)
+	counts = np.bincount(data.ravel(), minlength= 1 << (8 * data.dtype.itemsize))
+	nonzero = np.flatnonzero(counts)
+	counts = counts[nonzero[0]:nonzero[-1] + 1]
+	values = np.arange(nonzero[0], nonzero[-1] + 1, dtype= np.float64) - offset
+	median = _histogram_median(values, counts)
+	deviation = np.abs(values - median)
+	order = np.argsort(deviation, kind= 'stable')
+	mad = _histogram_median(deviation[order], counts[order])
+	n = counts.sum()
+	mean = float((counts * values).sum() / n)
+	std = float(np.sqrt((counts * (values - mean) ** 2).sum() / n))
+	return FrameStats(median, mad, std, float(values[0]), float(values[-1]))
+
+def _sample_stats(data : NDArray, samples : int) -> FrameStats:
+	step = max(int(np.sqrt(data.size / samples)), 1)
+	sample = data[::step, ::step] if data.ndim == 2 else data.ravel()[::step * step]
+	sample = sample[np.isfinite(sample)].astype(np.float64)
+	if sample.size == 0:
+		return FrameStats(np.nan, np.nan, np.nan, np.nan, np.nan)
+	median = float(np.median(sample))
+	mad = float(np.median(np.abs(sample - median)))
+	return FrameStats(median, mad, float(np.std(sample)), float(sample.min()), float(sample.max()))
+
+def frame_stats(image : ImageLike, samples : int = 1 << 18, cache : bool = True) -> FrameStats:
+	'''
+		Median, median absolute deviation, standard deviation and range of an image.
+
+		Integer images of 8 and 16 bits are computed exactly from the histogram of every pixel (no sorting is involved),
+		any other type is estimated from a strided subsample of about `samples` pixels, ignoring non finite values.
+		Results are cached per array object while it is alive, arrays modified in place must be evicted with clear_stats().
+
+		Parameters:
+		- image (arraylike) : The image
+		- samples (int, default: 262144): Approximate number of pixels sampled from non integer images
+		- cache (bool, default: True): Whether to look up and store the result in the cache
+	'''
+	data = np.asarray(image)
+	use_cache = cache and data is image
+	key = (id(data), samples)
+	if use_cache:
+		with _stats_lock:
+			entry = _stats_cache.get(key)
+			if entry is not None and entry[0]() is data:
+				_stats_cache.move_to_end(key)
+				return entry[1]
+	if data.dtype.kind in 'ui' and data.dtype.itemsize <= 2 and data.size > 0:
+		stats = _histogram_stats(data)
+	else:
+		stats = _sample_stats(data, samples)
+	if use_cache:
+		with _stats_lock:
+			_stats_cache[key] = (weakref.ref(data), stats)
+			while len(_stats_cache) > MAX_CACHED_STATS:
+				_stats_cache.popitem(last= False)
+	return stats
+
+def clear_stats():
+	''' Clears the statistics cached by frame_stats and background_mesh'''
+	with _stats_lock:
+		_stats_cache.clear()
+		_mesh_cache.clear()
+
+def _axis_weights(coords : RealNumber | ArrayLike, size : int, box : int) -> Tuple[NDArray, NDArray, NDArray]:
+	# Indices and weights of the two mesh cells around each coordinate, beyond the outer cell centers the values are extended
+	u = np.clip((np.asarray(coords, dtype= np.float64) + 0.5) / box - 0.5, 0, size - 1)
+	i0 = np.minimum(np.floor(u).astype(np.intp), max(size - 2, 0))
+	i1 = np.minimum(i0 + 1, size - 1)
+	return i0, i1, u - i0
+
+class BackgroundMesh:
+	'''
+		Low resolution map of the background level and noise of an image.
+
+		The image is divided into box x box cells, the values of each cell are sigma clipped around their median
+		and the clipped median and standard deviation become the mesh values. Cells left without pixels are filled with the median of the mesh
+		and the mesh is median filtered to remove the cells dominated by bright stars. The values at any position are interpolated bilinearly
+		between the cell centers, so a whole set of positions is evaluated with a single vectorized query.
+
+		Parameters:
+		- image (arraylike) : The image
+		- box (int, default: 64): Size of the cells in pixels, should be several times larger than the stars
+		- sigma (float, default: 3): Clipping threshold in standard deviations
+		- iterations (int, default: 3): Maximum number of clipping iterations
+		- filter_size (int, default: 3): Size of the median filter applied to the mesh, 1 to disable it
+	'''
+	box : int
+	sigma : float
+	shape : Tuple[int, int]
+	level : NDArray
+	rms : NDArray
+
+	def __init__(self, image : ImageLike, box : int = 64, sigma : float = 3.0, iterations : int = 3, filter_size : int = 3) -> None:
+		assert box >= 2, 'box must be greater or equal than two'
+		assert sigma > 0, 'sigma must be greater than zero'
+		assert iterations >= 0, 'iterations must be a positive integer'
+		assert filter_size >= 1 and filter_size % 2 == 1, 'filter_size must be a positive odd number'
+		data = np.asarray(image)
+		self.box = box
+		self.sigma = sigma
+		self.shape = data.shape[0], data.shape[1]
+		rows, cols = -(-data.shape[0] // box), -(-data.shape[1] // box)
+		# Cells are padded with NaN, which sort after every value, so each sorted cell starts with its valid pixels
+		padded = np.full((rows * box, cols * box), np.nan, dtype= np.float32)
+		padded[:data.shape[0], :data.shape[1]] = data
+		if data.dtype.kind == 'f':
+			padded[~np.isfinite(padded)] = np.nan
+		cells = np.sort(padded.reshape(rows, box, cols, box).swapaxes(1, 2).reshape(rows * cols, -1), axis= 1)
+		level, rms = self._clip(cells, sigma, iterations)
+		self.level = self._filter(level.reshape(rows, cols), filter_size)
+		self.rms = self._filter(rms.reshape(rows, cols), filter_size)
+		self._maps : Dict[str, NDArray] = {}
+
+	@staticmethod
+	def _clip(cells : NDArray, sigma : float, iterations : int) -> Tuple[NDArray, NDArray]:
+		# The values kept by the clipping are a contiguous slice [lo, hi) of each sorted cell,
+		# so the median is read at the middle of the slice and the moments come from cumulative sums
+		n = np.count_nonzero(~np.isnan(cells), axis= 1)
+		finite = np.nan_to_num(cells, nan= 0).astype(np.float64)
+		sums = np.zeros((len(cells), cells.shape[1] + 1))
+		squares = np.zeros_like(sums)
+		np.cumsum(finite, axis= 1, out= sums[:, 1:])
+		np.cumsum(finite ** 2, axis= 1, out= squares[:, 1:])
+		index = np.arange(len(cells))
+		lo, hi = np.zeros_like(n), n
+		with np.errstate(invalid= 'ignore', divide= 'ignore'):
+			for i in range(iterations + 1):
+				count = hi - lo
+				last = cells.shape[1] - 1
+				median = (cells[index, np.clip((lo + hi - 1) // 2, 0, last)] + cells[index, np.clip((lo + hi) // 2, 0, last)]) / 2
+				mean = (sums[index, hi] - sums[index, lo]) / count
+				std = np.sqrt(np.maximum((squares[index, hi] - squares[index, lo]) / count - mean ** 2, 0))
+				median[count == 0] = np.nan
+				if i == iterations:
+					break
+				new_lo = np.count_nonzero(cells < (median - sigma * std)[:, None], axis= 1)
+				new_hi = np.count_nonzero(cells <= (median + sigma * std)[:, None], axis= 1)
+				valid = new_hi > new_lo
+				new_lo, new_hi = np.where(valid, new_lo, lo), np.where(valid, new_hi, hi)
+				if np.array_equal(new_lo, lo) and np.array_equal(new_hi, hi):
+					break
+				lo, hi = new_lo, new_hi
+		std[count == 0] = np.nan
+		return median.astype(np.float32), std.astype(np.float32)
+
+	@staticmethod
+	def _filter(mesh : NDArray, size : int) -> NDArray:
+		if np.isnan(mesh).all():
+			return np.zeros_like(mesh)
+		mesh = np.where(np.isnan(mesh), np.nanmedian(mesh), mesh)
+		if size == 1 or mesh.size == 1:
+			return mesh
+		r = size // 2
+		padded = np.pad(mesh, r, mode= 'edge')
+		rows, cols = mesh.shape
+		stack = np.stack([padded[i:i + rows, j:j + cols] for i in range(size) for j in range(size)])
+		return np.median(stack, axis= 0).astype(np.float32)
+
+	def _sample(self, mesh : NDArray, x : RealNumber | ArrayLike, y : RealNumber | ArrayLike) -> NDArray:
+		x0, x1, fx = _axis_weights(x, mesh.shape[1], self.box)
+		y0, y1, fy = _axis_weights(y, mesh.shape[0], self.box)
+		top = mesh[y0, x0] * (1 - fx) + mesh[y0, x1] * fx
+		bottom = mesh[y1, x0] * (1 - fx) + mesh[y1, x1] * fx
+		return top * (1 - fy) + bottom * fy
+
+	def _map(self, mesh : NDArray) -> NDArray:
+		# Interpolated along the rows of the mesh first, then along the columns
+		x0, x1, fx = _axis_weights(np.arange(self.shape[1]), mesh.shape[1], self.box)
+		y0, y1, fy = _axis_weights(np.arange(self.shape[0]), mesh.shape[0], self.box)
+		rows = (mesh[:, x0] * (1 - fx) + mesh[:, x1] * fx).astype(np.float32)
+		return rows[y0] * (1 - fy[:, None]).astype(np.float32) + rows[y1] * fy[:, None].astype(np.float32)
+
+	def at(self, x : RealNumber | ArrayLike, y : RealNumber | ArrayLike) -> NDArray:
+		''' Background level at the (x, y) pixel coordinates, scalars or arrays of any shape (both must have the same)'''
+		return self._sample(self.level, x, y)
+
+	def rms_at(self, x : RealNumber | ArrayLike, y : RealNumber | ArrayLike) -> NDArray:
+		''' Background noise (standard deviation) at the (x, y) pixel coordinates'''
+		return self._sample(self.rms, x, y)
+
+	def max_at(self, x : RealNumber | ArrayLike, y : RealNumber | ArrayLike) -> NDArray:
+		''' Highest background level of the mesh cells interpolated at the (x, y) pixel coordinates'''
+		x0, x1, _ = _axis_weights(x, self.level.shape[1], self.box)
+		y0, y1, _ = _axis_weights(y, self.level.shape[0], self.box)
+		return np.maximum(np.maximum(self.level[y0, x0], self.level[y0, x1]), np.maximum(self.level[y1, x0], self.level[y1, x1]))
+
+	def map(self) -> NDArray:
+		''' Full resolution background image, computed on first access'''
+		if 'level' not in self._maps:
+			self._maps['level'] = self._map(self.level)
+		return self._maps['level']
+
+	def rms_map(self) -> NDArray:
+		''' Full resolution background noise image, computed on first access'''
+		if 'rms' not in self._maps:
+			self._maps['rms'] = self._map(self.rms)
+		return self._maps['rms']
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} (box= {self.box}, mesh= {self.level.shape}, level= {float(np.median(self.level)):.1f}, rms= {float(np.median(self.rms)):.2f})'
+
+_mesh_cache = OrderedDict[Tuple[int, int, float], Tuple[weakref.ref, BackgroundMesh]]()
+
+def background_mesh(image : ImageLike, box : int = 64, sigma : float = 3.0, cache : bool = True) -> BackgroundMesh:
+	'''
+		Returns the BackgroundMesh of an image, cached per array object like frame_stats so every stage processing
+		the same frame shares it.
+
+		Parameters:
+		- image (arraylike) : The image
+		- box (int, default: 64): Size of the mesh cells in pixels
+		- sigma (float, default: 3): Clipping threshold in standard deviations
+		- cache (bool, default: True): Whether to look up and store the result in the cache
+	'''
+	data = np.asarray(image)
+	use_cache = cache and data is image
+	key = (id(data), box, sigma)
+	if use_cache:
+		with _stats_lock:
+			entry = _mesh_cache.get(key)
+			if entry is not None and entry[0]() is data:
+				_mesh_cache.move_to_end(key)
+				return entry[1]
+	mesh = BackgroundMesh(data, box, sigma)
+	if use_cache:
+		with _stats_lock:
+			_mesh_cache[key] = (weakref.ref(data), mesh)
+			while len(_mesh_cache) > MAX_CACHED_STATS:
+				_mesh_cache.popitem(last= False)
+	return mesh
+
+def combine_stack(stack : NDArray, method : Literal['median', 'mean', 'sigma_clip'] = 'median', sigma : float = 3.0) -> NDArray:
+	'''
+		Combines a (n, rows, cols) stack of frames pixel by pixel along its first axis, NaN values are ignored (NaN where every value is NaN).
+
+		Parameters:
+		- stack (array): The stacked frames
+		- method (str, default: 'median'): 'median', 'mean' or 'sigma_clip' (mean of the values within sigma standard deviations of the median)
+		- sigma (float, default: 3): Clipping threshold of the sigma_clip method
+	'''
+	assert method in ('median', 'mean', 'sigma_clip'), f'Unknown combine method "{method}"'
+	# The NaN aware reductions are much slower, so they are only used when needed
+	masked = stack.dtype.kind == 'f' and bool(np.isnan(stack).any())
+	with np.errstate(invalid= 'ignore'), warnings.catch_warnings():
+		warnings.simplefilter('ignore', RuntimeWarning)
+		if method == 'mean':
+			return np.nanmean(stack, axis= 0) if masked else stack.mean(axis= 0)
+		median = np.nanmedian(stack, axis= 0) if masked else np.median(stack, axis= 0)
+		if method == 'median':
+			return median
+		std = np.nanstd(stack, axis= 0) if masked else stack.std(axis= 0)
+		keep = np.abs(stack - median) <= sigma * std
+		count = keep.sum(axis= 0)
+		total = np.where(keep, stack, 0).sum(axis= 0)
+		return np.where(count > 0, total / np.maximum(count, 1), median)
+
+def sigma_stretch(image : ImageLike, sigma=1.0, stats : Optional[FrameStats] = None) -> NDArray:
 	'''
 		Sigma clipping linear stretch algorithm
 
 		Parameters:
 		- image (arraylike) : The image to stretch
 		- sigma (float, default: 1): Sigma factor to consider black and white values from the median of the input image, described by the formula: clip = median +- sigma * std
+		- stats (FrameStats, optional): Statistics of the image, by default they are taken from frame_stats(image)
+
+		8 and 16 bit integer images are mapped through a lookup table of every possible value.
 	'''
-	median = np.median(image)
-	std = np.std(image)
-	smin = median - sigma * std
-	smax = median + sigma * std
-	image = np.clip((image - smin) * (255 / (smax - smin)), 0, 255)
-	return image.astype(np.uint8)
+	data = np.asarray(image)
+	if stats is None:
+		stats = frame_stats(image)
+	smin = stats.median - sigma * stats.std
+	smax = stats.median + sigma * stats.std
+	if data.dtype.kind in 'ui' and data.dtype.itemsize <= 2:
+		unsigned = np.dtype(f'u{data.dtype.itemsize}')
+		values = np.arange(1 << (8 * data.dtype.itemsize), dtype= np.float64)
+		if data.dtype.kind == 'i':
+			offset = 1 << (8 * data.dtype.itemsize - 1)
+			values -= offset
+			data = data.view(unsigned) ^ unsigned.type(offset)
+		return linear_stretch(values, smin, smax)[data]
+	return linear_stretch(data, smin, smax)
 
 def linear_stretch(image : ImageLike, smin : RealDType, smax: RealDType) -> NDArray:
 	'''
@@ -26,5 +327,196 @@ def linear_stretch(image : ImageLike, smin : RealDType, smax: RealDType) -> NDAr
 		- image (arraylike) : The image to stretch
 		- smin/smax (scalar): Minimum and maximum values to stretch the input image into the 0..255 range
 	'''
-	image = np.clip((image - smin) * (255 / (smax - smin)), 0, 255)
-	return image.astype(np.uint8)
\ No newline at end of file
+	scale = 255 / (smax - smin) if smax > smin else 0.
+	image = np.clip((image - smin) * scale, 0, 255)
+	return image.astype(np.uint8)
+
+def gaussian_kernel(sigma : float, truncate : float = 3.0) -> NDArray:
+	'''
+		Normalized 1D gaussian kernel
+
+		Parameters:
+		- sigma (float): Standard deviation of the gaussian in pixels
+		- truncate (float, default: 3): The kernel extends up to truncate * sigma pixels from its center
+	'''
+	assert sigma > 0, 'sigma must be greater than zero'
+	radius = max(int(np.ceil(truncate * sigma)), 1)
+	x = np.arange(-radius, radius + 1, dtype= np.float64)
+	kernel = np.exp(-0.5 * (x / sigma) ** 2)
+	return kernel / kernel.sum()
+
+def separable_filter(image : ImageLike, kernel : NDArray, dtype : type = np.float32) -> NDArray:
+	'''
+		Convolves the image with a symmetric 1D kernel along both axes, edges are extended by repeating the border pixels.
+		The sum is accumulated over shifted views of the padded image, so the cost is linear on the kernel size.
+		Both passes run over blocks of rows small enough to stay in the CPU cache.
+
+		Parameters:
+		- image (arraylike) : The image to filter
+		- kernel (array): Odd sized 1D kernel
+		- dtype (type, default: float32): Data type of the output
+	'''
+	assert len(kernel) % 2 == 1, 'kernel size must be an odd number'
+	radius = len(kernel) // 2
+	rows, cols = image.shape
+	padded : NDArray = np.pad(np.asarray(image, dtype= dtype), radius, mode= 'edge')
+	taps = [dtype(k) for k in kernel]
+	output : NDArray = np.empty((rows, cols), dtype= dtype)
+	block = max(8, (1 << 18) // (cols * np.dtype(dtype).itemsize))
+	horizontal : NDArray = np.empty((block + 2 * radius, cols), dtype= dtype)
+	buffer : NDArray = np.empty_like(horizontal)
+
+	def accumulate(view : Callable[[int], NDArray], out : NDArray, buffer : NDArray):
+		np.multiply(view(radius), taps[radius], out= out)
+		# The kernel is symmetric, so opposite taps are added before scaling
+		for i in range(radius):
+			np.add(view(i), view(2 * radius - i), out= buffer)
+			np.multiply(buffer, taps[i], out= buffer)
+			np.add(out, buffer, out= out)
+
+	for start in range(0, rows, block):
+		size = min(block, rows - start)
+		source = padded[start:start + size + 2 * radius]
+		strip = horizontal[:size + 2 * radius]
+		accumulate(lambda i: source[:, i:i + cols], strip, buffer[:size + 2 * radius])
+		accumulate(lambda i: strip[i:i + size], output[start:start + size], buffer[:size])
+	return output
+
+def block_average(image : ImageLike, factor : int) -> NDArray:
+	'''
+		Downsamples the image by averaging blocks of factor x factor pixels, the last rows and columns that do not fill a block are dropped.
+
+		Parameters:
+		- image (arraylike) : The image to downsample
+		- factor (int): Size of the blocks
+	'''
+	assert factor >= 1, 'factor must be greater or equal than one'
+	rows, cols = image.shape[0] // factor, image.shape[1] // factor
+	# Summing strided views is faster than reducing over a reshaped array
+	output = np.zeros((rows, cols), dtype= np.float32)
+	for i in range(factor):
+		for j in range(factor):
+			output += image[i:rows * factor:factor, j:cols * factor:factor]
+	output *= 1 / factor ** 2
+	return output
+
+class ImagePyramid:
+	'''
+		Block averaged image pyramid, level 0 is the original image and each level is `factor` times smaller than the previous one.
+		Levels are computed on first access and cached.
+
+		Parameters:
+		- image (arraylike) : The full resolution image
+		- levels (int): Number of levels below the original image
+		- factor (int, default: 2): Downsampling factor between consecutive levels
+	'''
+	factor : int
+	levels : int
+
+	def __init__(self, image : ImageLike, levels : int, factor : int = 2) -> None:
+		assert levels >= 0, 'levels must be a positive integer'
+		assert factor >= 2, 'factor must be greater or equal than two'
+		self.factor = factor
+		self.levels = levels
+		self._levels : List[ImageLike] = [image]
+
+	def __len__(self) -> int:
+		return self.levels + 1
+
+	def __getitem__(self, level : int) -> ImageLike:
+		if not 0 <= level <= self.levels:
+			raise IndexError(f'Level {level} out of range (0..{self.levels})')
+		while len(self._levels) <= level:
+			self._levels.append(block_average(self._levels[-1], self.factor))
+		return self._levels[level]
+
+	def scale(self, level : int) -> int:
+		''' Size of a pixel of the given level in full resolution pixels '''
+		return self.factor ** level
+
+	def to_full(self, positions : ArrayLike, level : int) -> NDArray:
+		''' Converts (x, y) pixel coordinates of a level into full resolution coordinates, pixel centers lie on integer coordinates'''
+		s = self.scale(level)
+		return np.asarray(positions, dtype= float) * s + (s - 1) / 2
+
+def refine_centroids(image : ImageLike, positions : ArrayLike, radius : int, iterations : int = 2) -> NDArray:
+	'''
+		Refines approximate (x, y) star positions with the background subtracted intensity weighted centroid of a square window around each of them.
+		The window is centered again on the result after each iteration, positions without signal are returned unchanged.
+
+		Parameters:
+		- image (arraylike) : The image
+		- positions (arraylike): Array of (x, y) positions with shape (n, 2)
+		- radius (int): Half size of the windows
+		- iterations (int, default: 2): Number of refinement steps
+	'''
+	result = np.array(positions, dtype= float).reshape(-1, 2)
+	if len(result) == 0:
+		return result
+	offsets = np.arange(-radius, radius + 1)
+	for _ in range(iterations):
+		cx = np.round(result[:, 0]).astype(int)
+		cy = np.round(result[:, 1]).astype(int)
+		rows = np.clip(cy[:, None, None] + offsets[None, :, None], 0, image.shape[0] - 1)
+		cols = np.clip(cx[:, None, None] + offsets[None, None, :], 0, image.shape[1] - 1)
+		windows = np.asarray(image[rows, cols], dtype= np.float64)
+		windows = np.clip(windows - np.nanmedian(windows, axis= (1, 2))[:, None, None], 0, None)
+		windows[np.isnan(windows)] = 0
+		total = windows.sum(axis= (1, 2))
+		valid = total > 0
+		total[~valid] = 1
+		dx = (windows * offsets[None, None, :]).sum(axis= (1, 2)) / total
+		dy = (windows * offsets[None, :, None]).sum(axis= (1, 2)) / total
+		result[valid] = np.column_stack((cx + dx, cy + dy))[valid]
+	return result
+
+def bilinear_sample(image : ImageLike, x : ArrayLike, y : ArrayLike, fill : float = np.nan) -> NDArray:
+	'''
+		Samples the image at fractional (x, y) pixel coordinates using bilinear interpolation, pixel centers lie on integer coordinates.
+
+		Parameters:
+		- image (arraylike) : The image to sample
+		- x, y (arraylike): Coordinates of the samples, any shape (both must have the same)
+		- fill (float, default: nan): Value of the samples outside the image
+	'''
+	x = np.asarray(x, dtype= np.float64)
+	y = np.asarray(y, dtype= np.float64)
+	rows, cols = image.shape
+	x0 = np.floor(x).astype(np.intp)
+	y0 = np.floor(y).astype(np.intp)
+	inside = (x0 >= 0) & (x0 < cols - 1) & (y0 >= 0) & (y0 < rows - 1)
+	# samples lying exactly on the last row or column are still valid
+	inside |= ((x == cols - 1) | (y == rows - 1)) & (x >= 0) & (x <= cols - 1) & (y >= 0) & (y <= rows - 1)
+	x0 = np.clip(x0, 0, cols - 2)
+	y0 = np.clip(y0, 0, rows - 2)
+	fx = x - x0
+	fy = y - y0
+
+	data = np.asarray(image)
+	top = data[y0, x0] * (1 - fx) + data[y0, x0 + 1] * fx
+	bottom = data[y0 + 1, x0] * (1 - fx) + data[y0 + 1, x0 + 1] * fx
+	result = top * (1 - fy) + bottom * fy
+	return np.where(inside, result, fill)
+
+def extract_windows(image : ImageLike, rows : ArrayLike, cols : ArrayLike, size : int, fill : float = np.nan) -> NDArray:
+	'''
+		Stacks the size x size windows whose top left corners are at (rows, cols) into a single (n, size, size) array.
+		Windows are gathered from a strided view of the image, pixels outside the image are set to `fill`.
+
+		Parameters:
+		- image (arraylike) : The image
+		- rows, cols (arraylike): Integer coordinates of the top left corner of each window
+		- size (int): Size of the windows
+		- fill (float, default: nan): Value of the pixels outside the image
+	'''
+	rows = np.asarray(rows, dtype= np.intp)
+	cols = np.asarray(cols, dtype= np.intp)
+	data = np.asarray(image)
+	inside = (rows >= 0) & (cols >= 0) & (rows + size <= data.shape[0]) & (cols + size <= data.shape[1])
+	if not inside.all():
+		# Only pad when a window falls outside the image
+		data = np.pad(data.astype(np.float64), size, mode= 'constant', constant_values= fill)
+		rows, cols = rows + size, cols + size
+		rows = np.clip(rows, 0, data.shape[0] - size)
+		cols = np.clip(cols, 0, data.shape[1] - size)
+	return np.lib.stride_tricks.sliding_window_view(data, (size, size))[rows, cols]
@@ -0,0 +1,98 @@
+'''
+	Minimal ctypes binding to the Linux inotify API, used by the directory watchers.
+
+	On platforms without inotify (or when libc cannot be loaded) `available()` returns False and callers are expected to fall back to polling.
+'''
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from typing import Final, Iterator, NamedTuple
+
+IN_MODIFY : Final[int] = 0x00000002
+IN_CLOSE_WRITE : Final[int] = 0x00000008
+IN_MOVED_FROM : Final[int] = 0x00000040
+IN_MOVED_TO : Final[int] = 0x00000080
+IN_CREATE : Final[int] = 0x00000100
+IN_DELETE : Final[int] = 0x00000200
+IN_DELETE_SELF : Final[int] = 0x00000400
+IN_MOVE_SELF : Final[int] = 0x00000800
+IN_Q_OVERFLOW : Final[int] = 0x00004000
+IN_IGNORED : Final[int] = 0x00008000
+IN_ISDIR : Final[int] = 0x40000000
+
+_IN_NONBLOCK : Final[int] = 0o4000
+_IN_CLOEXEC : Final[int] = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+_BUFFER_SIZE : Final[int] = 64 * (_EVENT_HEADER.size + 256)
+
+_libc : ctypes.CDLL | None = None
+
+def _load() -> ctypes.CDLL | None:
+	global _libc
+	if _libc is not None or not sys.platform.startswith('linux'):
+		return _libc
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno= True)
+		libc.inotify_init1.argtypes = [ctypes.c_int]
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+	except (OSError, AttributeError):
+		return None
+	_libc = libc
+	return _libc
+
+def available() -> bool:
+	''' Returns True if the inotify API can be used in this platform '''
+	return _load() is not None
+
+class InotifyEvent(NamedTuple):
+	mask : int
+	name : str
+
+class Inotify:
+	'''
+		Non-blocking inotify instance watching a single directory.
+		Use fileno() with select/poll to wait for events and read() to consume them.
+	'''
+	def __init__(self, path : str, mask : int):
+		libc = _load()
+		if libc is None:
+			raise OSError('inotify is not available in this platform')
+		fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+		if fd < 0:
+			err = ctypes.get_errno()
+			raise OSError(err, os.strerror(err))
+		if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+			err = ctypes.get_errno()
+			os.close(fd)
+			raise OSError(err, os.strerror(err), path)
+		self._fd = fd
+
+	def fileno(self) -> int:
+		return self._fd
+
+	def read(self) -> Iterator[InotifyEvent]:
+		''' Yields all the events currently queued, returns immediately if there are none '''
+		while True:
+			try:
+				buffer = os.read(self._fd, _BUFFER_SIZE)
+			except BlockingIOError:
+				return
+			offset = 0
+			while offset < len(buffer):
+				_, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+				offset += _EVENT_HEADER.size
+				name = buffer[offset: offset + length].rstrip(b'\0')
+				offset += length
+				yield InotifyEvent(mask, os.fsdecode(name))
+
+	def close(self):
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+	def __enter__(self):
+		return self
+	def __exit__(self, *args):
+		self.close()
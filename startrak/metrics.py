@@ -0,0 +1,147 @@
+'''
+	Latency metrics of live sessions.
+
+	A ScanSession created with track_latency= True timestamps every new file at each of the STAGES, from its last write on disk
+	to the end of its photometry in the LivePipeline. The time between consecutive stages is kept over a rolling window,
+	so the percentiles of each stage (LatencyStats) show where the frames spend their time while the session is running.
+
+	Example:
+	```
+		session = new_session('live', 'scan', './frames', track_latency= True)
+		session.attach_pipeline(LivePipeline(PhotometryTracker(20), metrics= session.metrics))
+		...
+		print(session.metrics.summary()['total'])		# End-to-end latency
+		print(session.metrics.bottleneck())
+	```
+'''
+from __future__ import annotations
+from collections import deque
+import json
+from threading import Lock
+import time
+from typing import Deque, Dict, Final, List, NamedTuple, Optional, Tuple
+import numpy as np
+from startrak.events import call_event
+
+__all__ = ['LatencyMetrics', 'LatencyStats', 'STAGES']
+
+# Stages a file goes through during a live session, in order:
+# written: last modification of the file on disk, detected: the watcher noticed the file, parsed: the file settled and its FileInfo was created,
+# started: a pipeline worker took the file from the queue, loaded: the image data was read,
+# tracked: the tracking solution was computed, photometered: the photometry of all the stars was measured
+STAGES : Final[Tuple[str, ...]] = ('written', 'detected', 'parsed', 'started', 'loaded', 'tracked', 'photometered')
+
+class LatencyStats(NamedTuple):
+	samples : int
+	mean : float
+	p50 : float
+	p95 : float
+	p99 : float
+	max : float
+
+	@classmethod
+	def empty(cls):
+		return cls(0, np.nan, np.nan, np.nan, np.nan, np.nan)
+
+	def __repr__(self) -> str:
+		return (f'{type(self).__name__} (n= {self.samples}) p50= {self.p50 * 1000:.1f} ms, p95= {self.p95 * 1000:.1f} ms, '
+					f'p99= {self.p99 * 1000:.1f} ms, max= {self.max * 1000:.1f} ms')
+
+class LatencyMetrics:
+	'''
+		Rolling latency statistics of a live session.
+
+		Each file is timestamped with `mark(file, stage)` at every stage in STAGES, once the file leaves the pipeline `complete(file)`
+		converts the timestamps into the time spent between consecutive stages (keyed by the later stage) plus the end-to-end latency ("total").
+		Only the last `window` files are used to compute the percentiles.
+
+		Completed records are published through the named event `event_name` as a dictionary and, if `dump_path` is given,
+		appended to that file as JSON lines.
+	'''
+	window : int
+	dump_path : Optional[str]
+	event_name : str
+
+	def __init__(self, window : int = 1000, dump_path : Optional[str] = None, event_name : str = 'latency_metrics') -> None:
+		assert window > 0, 'Window size must be a positive integer'
+		self.window = window
+		self.dump_path = dump_path
+		self.event_name = event_name
+		self._open = dict[str, Dict[str, float]]()
+		self._durations : Dict[str, Deque[float]] = {stage : deque(maxlen= window) for stage in STAGES[1:] + ('total',)}
+		self._lock = Lock()
+
+	@property
+	def in_flight(self) -> int:
+		''' Number of files marked but not completed yet '''
+		return len(self._open)
+
+	def mark(self, file : str, stage : str, timestamp : Optional[float] = None):
+		''' Records the wall-clock time (time.time) at which a file reached the given stage '''
+		if stage not in STAGES:
+			raise ValueError(f'Invalid stage: "{stage}", expected one of {", ".join(STAGES)}')
+		with self._lock:
+			self._open.setdefault(file, {})[stage] = time.time() if timestamp is None else timestamp
+
+	def discard(self, file : str):
+		with self._lock:
+			self._open.pop(file, None)
+
+	def complete(self, file : str) -> Dict[str, float]:
+		''' Closes the record of a file and returns the elapsed seconds per stage '''
+		with self._lock:
+			marks = self._open.pop(file, None)
+			if not marks:
+				return {}
+			stages = [stage for stage in STAGES if stage in marks]
+			record = {stage : marks[stage] - marks[previous] for previous, stage in zip(stages, stages[1:])}
+			record['total'] = marks[stages[-1]] - marks[stages[0]]
+			for stage, value in record.items():
+				self._durations[stage].append(value)
+
+		if self.dump_path:
+			with open(self.dump_path, 'a') as out:
+				out.write(json.dumps({'file' : file, 'timestamp' : marks[stages[-1]], **record}) + '\n')
+		call_event(self.event_name, file, record)
+		return record
+
+	def percentiles(self, stage : str) -> LatencyStats:
+		''' Returns the rolling statistics of the time spent reaching a stage, use "total" for the end-to-end latency'''
+		if stage not in self._durations:
+			raise ValueError(f'Invalid stage: "{stage}"')
+		with self._lock:
+			values = np.array(self._durations[stage])
+		if len(values) == 0:
+			return LatencyStats.empty()
+		p50, p95, p99 = np.percentile(values, (50, 95, 99))
+		return LatencyStats(len(values), float(values.mean()), float(p50), float(p95), float(p99), float(values.max()))
+
+	def summary(self) -> Dict[str, LatencyStats]:
+		''' Returns the statistics of every stage with at least one record '''
+		return {stage : self.percentiles(stage) for stage, values in self._durations.items() if len(values) > 0}
+
+	def bottleneck(self) -> Optional[str]:
+		''' Returns the stage with the highest median duration '''
+		stages = {stage : stats.p50 for stage, stats in self.summary().items() if stage != 'total'}
+		if not stages:
+			return None
+		return max(stages, key= lambda s: stages[s])
+
+	def reset(self):
+		with self._lock:
+			self._open.clear()
+			for values in self._durations.values():
+				values.clear()
+
+	def __pprint__(self, indent : int, fold : int) -> str:
+		if fold == 0:
+			return type(self).__name__ + f' ({self.in_flight} in flight)'
+		string : List[str] = [type(self).__name__ + ':']
+		for stage, stats in self.summary().items():
+			string.append(f'  {stage:<13}{stats.p50 * 1000:>9.1f} ms (p50) {stats.p95 * 1000:>9.1f} ms (p95) {stats.p99 * 1000:>9.1f} ms (p99)')
+		return '\n'.join(string)
+
+	def __str__(self) -> str:
+		return self.__pprint__(0, 1)
+	def __repr__(self) -> str:
+		return self.__pprint__(0, 0)
@@ -41,6 +41,7 @@ FileList = filelist.FileList
 Session = abstract.Session
 PhotometryBase = abstract.PhotometryBase
 Tracker = abstract.Tracker
+MotionModel = abstract.MotionModel
 StarDetector = abstract.StarDetector
 
 
@@ -1,7 +1,7 @@
 # compiled module
 from __future__ import annotations
 import os
-from typing import Callable, List, Optional, Self, Sequence, Tuple, final
+from typing import Any, Callable, List, Optional, Self, Sequence, Tuple, final
 from abc import ABC, ABCMeta, abstractmethod
 from startrak.native import VERSION
 from startrak.native.alias import ImageLike, ValueType
@@ -32,6 +32,23 @@ class Tracker(ABC):
 	def track(self, image : ImageLike) -> TrackingSolution:
 		pass
 
+@mypyc_attr(allow_interpreted_subclasses=True)
+class MotionModel(ABC):
+	'''
+		Predicts the tracking solution of the next frame from the solutions of the previous ones.
+		Times are in seconds, if not given the frame number is used instead.
+	'''
+	@abstractmethod
+	def update(self, solution : TrackingSolution, time : Optional[float] = None):
+		pass
+	@abstractmethod
+	def predict(self, time : Optional[float] = None) -> Optional[TrackingSolution]:
+		''' Returns the predicted solution (its error is the expected uncertainty in pixels) or None if there is not enough data'''
+		pass
+	@abstractmethod
+	def reset(self):
+		pass
+
 @mypyc_attr(allow_interpreted_subclasses=True)
 class StarDetector(ABC):
 	star_name : str = 'star_'
@@ -56,6 +73,7 @@ class Session(STObject, metaclass= ABCMeta):
 	archetype : Optional[HeaderArchetype]
 	included_files : FileList
 	included_stars : StarList
+	alignment : Optional[Any]
 	force_validation : bool
 	on_validationFailed : Callable[[str, ValueType, ValueType], None] | None
 	
@@ -69,6 +87,7 @@ class Session(STObject, metaclass= ABCMeta):
 		self._session_path = SessionLocationBlock(working_dir.replace('\\', '/'), use_relativePaths)
 		self.included_files = FileList()
 		self.included_stars = StarList()
+		self.alignment = None	# Solutions of every included file, see startrak.types.alignment
 
 	@property
 	def working_dir(self) -> str:
@@ -149,6 +168,7 @@ class Session(STObject, metaclass= ABCMeta):
 		session.archetype = attributes['archetype']
 		session.included_files = attributes['included_files']
 		session.included_stars = attributes['included_stars']
+		session.alignment = attributes.get('alignment')
 		RelativeContext.reset()
 		return session
 	
@@ -160,6 +180,7 @@ class Session(STObject, metaclass= ABCMeta):
 			'archetype' : self.archetype,
 			'included_files': self.included_files, 
 			'included_stars': self.included_stars, 
+			'alignment' : self.alignment,
 			'force_validation' : self.force_validation,
 			'app_version' : VERSION
 			}
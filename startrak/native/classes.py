@@ -1,6 +1,7 @@
 # compiled module
 from __future__ import annotations
 from mypy_extensions import mypyc_attr
+import importlib
 import math
 from typing import Any, Callable, ClassVar, Dict, Final, List, NamedTuple, Optional, Self, Tuple, Type, TypeVar, Union, cast, overload
 import numpy as np
@@ -9,11 +10,13 @@ from startrak.native.alias import RealDType, ValueType, ArrayLike
 from startrak.native.collections.native_array import Array
 from startrak.native.collections.position import Position, PositionArray, PositionLike
 
-from startrak.native.fits import _bound_reader, _get_header
+from startrak.native.fits import _bound_reader, _read_header
 from startrak.native.ext import AttrDict, STObject, _register_class, spaces
 from startrak.native.matrices import Matrix2x2, Matrix3x3
 from startrak.native.numeric import average
-from startrak.native.utils.svdutils import SVD, outer
+from startrak.native.utils.svdutils import outer
+from startrak.native.utils.robustutils import rigid_inliers
+from startrak.native.utils.transformutils import transform_points
 
 _min_required : Final[Dict[str, Tuple[type, ...]]] = \
 		{'SIMPLE' : (bool,), 'BITPIX' : (int,), 'NAXIS' : (int,)}
@@ -139,10 +142,11 @@ class FileInfo(NamedTuple, STObject):	#type: ignore[misc]
 			abs_path = os.path.abspath(file_path)
 
 		norm_path = abs_path.replace('\\', '/')
-		_h_dict = {key.rstrip() : value for key, value in _get_header(abs_path)}
+		cards, data_offset = _read_header(abs_path)
+		_h_dict = {key.rstrip() : value for key, value in cards}
 		header_obj = Header(norm_path, _h_dict)
 		bound_reader = _bound_reader(abs_path, header_obj.shape, 
-											(header_obj['BSCALE', int, 0], header_obj['BZERO', int, 0]), header_obj['BITPIX', int]) 
+											(header_obj['BSCALE', int, 0], header_obj['BZERO', int, 0]), header_obj['BITPIX', int], data_offset) 
 		
 		return cls(norm_path, is_rel, header_obj, bound_reader)
 	
@@ -153,6 +157,12 @@ class FileInfo(NamedTuple, STObject):	#type: ignore[misc]
 	@property
 	def bytes(self) -> int:
 		return os.path.getsize(self.path)
+
+	@property
+	def context(self) -> Any:
+		''' Per-frame cache of the data and its derived products, see startrak.framecontext '''
+		# Imported at runtime, the context module is not compiled
+		return importlib.import_module('startrak.framecontext').get_context(self)
 	
 	@property
 	def size(self) -> str:
@@ -359,10 +369,23 @@ class TrackingSolution(NamedTuple, STObject):	#type: ignore[misc]
 						weights : Optional[ArrayLike] = None,
 						lost_indices : List[int] = [],
 						rejection_iter : int = 1,
-						rejection_sigma : float = 3) -> Self:
-
+						rejection_sigma : float = 3,
+						estimator : str = 'sigma_clip',
+						threshold : float = 2.0,
+						verbose : bool = False) -> Self:
+		'''
+			Computes the rigid transform (rotation + translation) that maps start_pos into new_pos.
+
+			Outliers are rejected according to the estimator:
+			* "sigma_clip" removes the displacements farther than rejection_sigma times the variance from the mean displacement, rejection_iter times
+			* "ransac" and "lmeds" keep the correspondences consistent with the best hypothesis of a batched sampling of 2-point rigid transforms
+				(see startrak.native.utils.robustutils), threshold is the inlier distance in pixels for "ransac".
+				The number of rejected correspondences is printed if verbose is True
+			The transform is then refined with a weighted SVD fit of the remaining correspondences.
+		'''
 		start_arr = PositionArray( *start_pos)
 		new_arr = PositionArray( *new_pos)
+		lost_indices = list(lost_indices)
 
 		if weights:
 			weights_arr = Array( *weights)
@@ -373,6 +396,20 @@ class TrackingSolution(NamedTuple, STObject):	#type: ignore[misc]
 		displacements = new_arr - start_arr
 		residuals = displacements - average(displacements)
 
+		if estimator == 'ransac' or estimator == 'lmeds':
+			mask = rigid_inliers(np.array(start_arr), np.array(new_arr), estimator, threshold)
+			inliers = set(mask)
+			outliers = [j for j in range(len(start_arr)) if j not in inliers]
+			lost_indices.extend(outliers)
+			if verbose and len(outliers) > 0:
+				print(f'{len(outliers)} of {len(start_arr)} correspondences rejected by {estimator}')
+			rejection_iter = 0
+		elif estimator != 'sigma_clip':
+			raise ValueError(f'Invalid estimator: "{estimator}", expected "sigma_clip", "ransac" or "lmeds".')
+		if len(mask) == 0:
+			print('Solution did not converge')
+			return TrackingSolution.identity(method)
+
 		r_count, r_error = 0, 0.
 		for i in range(rejection_iter):
 			if len(mask) == 0:
@@ -400,8 +437,9 @@ class TrackingSolution(NamedTuple, STObject):	#type: ignore[misc]
 		centroid_new =   average(new_masked, weights_masked)
 
 		H_matrix = outer(start_masked - centroid_start, new_masked - centroid_new)
-		_, U_matrix, V_matrix = SVD(H_matrix)
-		R_matrix = V_matrix.transpose * U_matrix
+		# Closed form of the rotation that maximizes the alignment of the centered points (2D Kabsch)
+		angle = math.atan2(H_matrix.b - H_matrix.c, H_matrix.a + H_matrix.d)
+		R_matrix = Matrix2x2(math.cos(angle), -math.sin(angle), math.sin(angle), math.cos(angle))
 		delta_pos = centroid_new - R_matrix * centroid_start
 
 		transformed_points = PositionArray( *[ (R_matrix * pos) + delta_pos for pos in start_masked] )
@@ -419,6 +457,22 @@ class TrackingSolution(NamedTuple, STObject):	#type: ignore[misc]
 	@classmethod
 	def identity(cls, method : str = 'None'):
 		return cls(method, Position(0, 0), Matrix2x2.identity(), 0, None)
+
+	@classmethod
+	def from_matrix(cls, method : str, matrix : Matrix3x3 | ArrayLike,
+						error : float = 0, lost_indices : Optional[List[int]] = None) -> Self:
+		''' Creates a solution from a homogeneous (3, 3) matrix, such as the rows of the arrays returned by stack() '''
+		m = np.asarray(matrix, dtype= np.float64)
+		return cls(method, Position(float(m[0, 2]), float(m[1, 2])),
+					Matrix2x2(float(m[0, 0]), float(m[0, 1]), float(m[1, 0]), float(m[1, 1])), error, lost_indices)
+
+	@staticmethod
+	def stack(solutions : List[TrackingSolution]) -> np.ndarray:
+		''' Returns the homogeneous matrices of a sequence of solutions as a (F, 3, 3) array '''
+		out = np.zeros((len(solutions), 3, 3))
+		for k, solution in enumerate(solutions):
+			out[k] = np.asarray(solution.matrix)
+		return out
 	
 	@property
 	def matrix(self) -> Matrix3x3:
@@ -431,10 +485,14 @@ class TrackingSolution(NamedTuple, STObject):	#type: ignore[misc]
 	
 	@property	
 	def rotation(self) -> float:
-		return math.degrees(math.acos(self.rotation_matrix.a))
+		return math.degrees(math.atan2(self.rotation_matrix.c, self.rotation_matrix.a))
 	
 	def transform(self, pos : Position) -> Position:
 		return (self.rotation_matrix * pos) + self.translation
+
+	def transform_array(self, points : ArrayLike | PositionArray) -> np.ndarray:
+		''' Transforms a (N, 2) array of positions at once, see startrak.native.utils.transformutils for sequences of solutions '''
+		return transform_points(self.matrix, np.array(points, dtype= np.float64).reshape(-1, 2))
 	
 	def __export__(self) -> AttrDict:
 		return {
@@ -1,24 +1,41 @@
 from __future__ import annotations
 from collections import deque
 from mmap import ACCESS_READ, ALLOCATIONGRANULARITY, mmap
+import os
 from re import I
 import sys
-from typing import Any, Final, Iterator, List, NamedTuple, TypeVar, Tuple, overload
+from typing import Any, Callable, Final, Iterator, List, NamedTuple, Optional, TypeVar, Tuple, overload
 from startrak.native.alias import NDArray, ValueType, RealDType
 import numpy as np
 
 
 _BitDepth =  TypeVar('_BitDepth', bound= np.dtype)
 BLANK_LINE : Final[bytes] = b' '* 80
+BLOCK_SIZE : Final[int] = 2880
 BYTE_OFFSET : Final[int] = 2880 << 1
 
 # DYNAMIC OBJECTS
 MAX_CACHED = 5
 MAX_ARRAYSIZE = 1e7
-_fitsdata_lru = [0] * MAX_CACHED
-_fitsdata_cache = dict[int, NDArray]()
+_fitsdata_lru = [''] * MAX_CACHED
+_fitsdata_cache = dict[str, NDArray]()
+# Applied to the data of every file read (unless raw data is requested), e.g. calibration
+_data_hook : Optional[Callable[[str, NDArray, int], NDArray]] = None
+_hook_version = 0
 
-def _enqueue_data(id : int, data : NDArray):
+def set_data_hook(hook : Optional[Callable[[str, NDArray, int], NDArray]]):
+	'''
+		Sets the function applied to the data of every file when it is read, None to remove it.
+		hook(path, data, start) returns the new data, start is the index of the first row of data (when read by strips, see _bound_reader.rows)
+	'''
+	global _data_hook, _hook_version
+	_data_hook = hook
+	_hook_version += 1
+
+def get_data_hook() -> Optional[Callable[[str, NDArray, int], NDArray]]:
+	return _data_hook
+
+def _enqueue_data(id : str, data : NDArray):
 	if id in _fitsdata_cache:
 		return
 	if sys.getsizeof(data) > MAX_ARRAYSIZE:
@@ -30,9 +47,11 @@ def _enqueue_data(id : int, data : NDArray):
 	_fitsdata_cache[id] = data
 	_fitsdata_lru.append(id)
 
-def _get_header(path : str) -> Iterator[Tuple[str, ValueType]]:
+def _read_header(path : str) -> Tuple[List[Tuple[str, ValueType]], int]:
+	''' Returns the header cards of the primary HDU and the byte offset where its data block starts'''
+	cards = list[Tuple[str, ValueType]]()
 	_bio = open(path, 'rb')
-	_mmap = mmap(_bio.fileno(), BYTE_OFFSET, access=ACCESS_READ)
+	_mmap = mmap(_bio.fileno(), 0, access=ACCESS_READ)
 	while True:
 		line = _mmap.read(80)
 		if not line: break
@@ -42,42 +61,73 @@ def _get_header(path : str) -> Iterator[Tuple[str, ValueType]]:
 		if not _validate_byteline(line): continue
 		_keyword = line[:8].decode()
 		_value = _parse_bytevalue(line)
-		yield _keyword, _value
+		cards.append((_keyword, _value))
+	# The header is padded to a multiple of the block size
+	end = _mmap.tell()
 	_mmap.close()
 	_bio.close()
+	return cards, -(-end // BLOCK_SIZE) * BLOCK_SIZE
+
+def _get_header(path : str) -> Iterator[Tuple[str, ValueType]]:
+	cards, _ = _read_header(path)
+	for card in cards:
+		yield card
 	
 class _bound_reader(NamedTuple):
 	path : str
 	shape : Tuple[int, int]
 	transf : Tuple[int, int]
 	dtype : int
+	offset : int = BYTE_OFFSET
 
-	def __call__(self) -> NDArray:
-		if (sid := id(self)) in _fitsdata_cache:
+	def __call__(self, raw : bool = False) -> NDArray:
+		''' Reads the data of the file, the data hook (see set_data_hook) is applied unless raw is True'''
+		hook = None if raw else _data_hook
+		# Files rewritten in place must not hit the cache, neither the data read with a previous hook
+		sid = f'{self.path}:{os.stat(self.path).st_mtime_ns}'
+		if hook is not None:
+			sid += f':{_hook_version}'
+		if sid in _fitsdata_cache:
 			return _fitsdata_cache[sid]
 
 		file = open(self.path, 'rb')
-		offset = (BYTE_OFFSET // ALLOCATIONGRANULARITY) * ALLOCATIONGRANULARITY
+		offset = (self.offset // ALLOCATIONGRANULARITY) * ALLOCATIONGRANULARITY
 		_mmap = mmap(file.fileno(), 0, offset=offset, access=ACCESS_READ)
 		
 		_dtype = get_bitsize(self.dtype)
-		if offset == 0:
-			_mmap.seek(BYTE_OFFSET)
-		else:
-			_mmap.seek(BYTE_OFFSET - offset)	
-		raw =  np.frombuffer( _mmap.read(), count= self.shape[0] * self.shape[1] ,dtype= _dtype.newbyteorder('>'))
+		_mmap.seek(self.offset - offset)
+		buffer =  np.frombuffer( _mmap.read(), count= self.shape[0] * self.shape[1] ,dtype= _dtype.newbyteorder('>'))
 		_mmap.close()
 		file.close()
 
-		if self.transf[0] > 0:
-			_scale, _zero = np.uint(self.transf[0]), np.uint(self.transf[1])
-			if _scale != 1 or _zero != 0:
-				raw = _zero + _scale * raw
-		data = raw.reshape(self.shape).astype(_dtype)
-
+		data = self._decode(buffer, self.shape)
+		if hook is not None:
+			data = hook(self.path, data, 0)
 		if MAX_CACHED > 0:
 			_enqueue_data(sid, data)
 		return data
+
+	def rows(self, start : int, stop : int, raw : bool = False) -> NDArray:
+		''' Reads the rows [start, stop) of the data without loading the whole array, the result is not cached'''
+		start, stop = max(start, 0), min(stop, self.shape[0])
+		_dtype = get_bitsize(self.dtype)
+		width = self.shape[1] * _dtype.itemsize
+		with open(self.path, 'rb') as file:
+			file.seek(self.offset + start * width)
+			buffer = np.frombuffer(file.read(max(stop - start, 0) * width), dtype= _dtype.newbyteorder('>'))
+		data = self._decode(buffer, (max(stop - start, 0), self.shape[1]))
+		hook = None if raw else _data_hook
+		if hook is not None:
+			data = hook(self.path, data, start)
+		return data
+
+	def _decode(self, buffer : NDArray, shape : Tuple[int, int]) -> NDArray:
+		_dtype = get_bitsize(self.dtype)
+		if self.transf[0] > 0:
+			_scale, _zero = np.uint(self.transf[0]), np.uint(self.transf[1])
+			if _scale != 1 or _zero != 0:
+				buffer = _zero + _scale * buffer
+		return buffer.reshape(shape).astype(_dtype)
 	def __repr__(self) -> str:
 		return object.__repr__(self)
 
@@ -11,8 +11,8 @@ class Matrix2x2(NamedTuple):
 	c: float
 	d: float
 
-	def __array__(self) -> np.ndarray[Any, Any]:  # Implementing the array protocol for compatibility
-		return np.array([[self.a, self.b], [self.c, self.d]])
+	def __array__(self, dtype=None) -> np.ndarray[Any, Any]:  # Implementing the array protocol for compatibility
+		return np.array([[self.a, self.b], [self.c, self.d]], dtype= dtype)
 
 	@overload 	#type: ignore[override]
 	def __mul__(self, other:  Position) -> Position: ...
@@ -33,8 +33,8 @@ class Matrix2x2(NamedTuple):
 				self.c * other.b + self.d * other.d )
 		elif type(other) is Position:
 			vx, vy = other[0], other[1]
-			x = self.a * vx + -self.b * vy + self.c
-			y = self.b * vx + self.a * vy + self.d
+			x = self.a * vx + self.b * vy
+			y = self.c * vx + self.d * vy
 			return Position(x, y)
 		else:
 			raise TypeError(type(other))
@@ -117,8 +117,8 @@ class Matrix3x3(NamedTuple):
 	h: float
 	i: float
 
-	def __array__(self) -> np.ndarray[Any, Any]:
-		return np.array([[self.a, self.b, self.c], [self.d, self.e, self.f], [self.g, self.h, self.i]])
+	def __array__(self, dtype=None) -> np.ndarray[Any, Any]:
+		return np.array([[self.a, self.b, self.c], [self.d, self.e, self.f], [self.g, self.h, self.i]], dtype= dtype)
 
 	@overload 	#type: ignore[override]
 	def __mul__(self, other: Position) -> Position: ...
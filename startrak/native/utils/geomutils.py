@@ -2,6 +2,7 @@
 
 import math
 from typing import Callable, List
+import numpy as np
 from startrak.native.collections.position import Position, PositionArray
 
 def distance(p1 : Position, p2 : Position) -> float:
@@ -67,9 +68,12 @@ def k_neighbors(positions: PositionArray, k : int) -> List[List[int]]:
 	# num_points = len(positions)
 	# neighbors_list = list[list[int]]()
 
-	dst_rows = [[(j, distance(left, right)) for j, right in enumerate(positions)] for left in positions]
-	indices = [ [i for i, _ in sorted(row, key= lambda t: t[1])] for row in dst_rows]
-	return [ row[0: k + 1] for row in indices]
+	if len(positions) == 0:
+		return []
+	coords = np.array([(p.x, p.y) for p in positions], dtype= float)
+	sq_dst = ((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis= -1)
+	indices : List[List[int]] = np.argsort(sq_dst, axis= 1, kind= 'stable')[:, :k + 1].tolist()
+	return indices
 	# for i in range(num_points):
 	# 	distances = [(j, distance(positions[i], positions[j])) for j in range(num_points) if i != j]
 
@@ -0,0 +1,79 @@
+# compiled module
+from __future__ import annotations
+import math
+from typing import Any, List, Tuple
+import numpy as np
+
+def _hypotheses(src : Any, dst : Any, pairs : Any) -> Tuple[Any, Any, Any]:
+	# Rigid transforms (rotation angle, translation) defined by two correspondences each
+	i, j = pairs[:, 0], pairs[:, 1]
+	v_src = src[j] - src[i]
+	v_dst = dst[j] - dst[i]
+	angle = np.arctan2(v_dst[:, 1], v_dst[:, 0]) - np.arctan2(v_src[:, 1], v_src[:, 0])
+	cos, sin = np.cos(angle), np.sin(angle)
+	tx = dst[i, 0] - (cos * src[i, 0] - sin * src[i, 1])
+	ty = dst[i, 1] - (sin * src[i, 0] + cos * src[i, 1])
+	return cos, sin, np.column_stack((tx, ty))
+
+def _residuals(src : Any, dst : Any, cos : Any, sin : Any, t : Any) -> Any:
+	# Squared residuals of every point (columns) for every hypothesis (rows)
+	x = cos[:, None] * src[None, :, 0] - sin[:, None] * src[None, :, 1] + t[:, 0, None]
+	y = sin[:, None] * src[None, :, 0] + cos[:, None] * src[None, :, 1] + t[:, 1, None]
+	return (x - dst[None, :, 0]) ** 2 + (y - dst[None, :, 1]) ** 2
+
+def rigid_inliers(start : Any, new : Any, method : str = 'ransac', threshold : float = 2.0,
+						max_hypotheses : int = 1024, batch_size : int = 128, confidence : float = 0.999, seed : int = 0) -> List[int]:
+	'''
+		Returns the indices of the correspondences consistent with the best rigid transform (rotation + translation) between two sets of points.
+
+		Hypotheses are built from random pairs of correspondences (the minimal sample of a rigid transform) and scored in batches:
+		* "ransac" keeps the hypothesis with the most points closer than `threshold` pixels
+		* "lmeds" keeps the hypothesis with the least median of squared residuals, the inlier threshold is derived from that median
+		The number of hypotheses never exceeds max_hypotheses, for RANSAC sampling also stops once the best hypothesis
+		is found with the given confidence.
+	'''
+	if method not in ('ransac', 'lmeds'):
+		raise ValueError(f'Invalid robust method: "{method}", expected "ransac" or "lmeds".')
+	src = np.asarray(start, dtype= np.float64).reshape(-1, 2)
+	dst = np.asarray(new, dtype= np.float64).reshape(-1, 2)
+	n = len(src)
+	if n < 3:
+		return list(range(n))
+	rng = np.random.default_rng(seed)
+	sq_threshold = threshold * threshold
+
+	best_score = math.inf
+	best = (0., 0., np.zeros(2))
+	needed = max_hypotheses
+	tried = 0
+	while tried < min(needed, max_hypotheses):
+		size = min(batch_size, max_hypotheses - tried)
+		first = rng.integers(0, n, size)
+		second = (first + rng.integers(1, n, size)) % n
+		pairs = np.column_stack((first, second))
+		cos, sin, t = _hypotheses(src, dst, pairs)
+		residuals = _residuals(src, dst, cos, sin, t)
+		if method == 'ransac':
+			scores = -(residuals < sq_threshold).sum(axis= 1).astype(np.float64)
+		else:
+			scores = np.median(residuals, axis= 1)
+		k = int(np.argmin(scores))
+		if scores[k] < best_score:
+			best_score = float(scores[k])
+			best = (float(cos[k]), float(sin[k]), t[k])
+			if method == 'ransac':
+				ratio = min(-best_score / n, 1.)
+				if ratio >= 1.:
+					needed = 0
+				elif ratio > 0:
+					needed = int(math.ceil(math.log(1 - confidence) / math.log(1 - ratio * ratio)))
+		tried += size
+
+	cos_b, sin_b, t_b = best
+	residuals = _residuals(src, dst, np.array([cos_b]), np.array([sin_b]), t_b[None, :])[0]
+	if method == 'lmeds':
+		# Robust standard deviation from the median (Rousseeuw & Leroy, 1987)
+		sigma = 1.4826 * (1 + 5 / (n - 2)) * math.sqrt(float(np.median(residuals)))
+		sq_threshold = max((2.5 * sigma) ** 2, 1e-12)
+	inliers : List[int] = np.flatnonzero(residuals <= sq_threshold).tolist()
+	return inliers
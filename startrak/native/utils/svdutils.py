@@ -1,6 +1,5 @@
 # compiled module
 from __future__ import annotations
-import math
 from startrak.native.collections.position import PositionArray
 from startrak.native.matrices import Matrix2x2
 from startrak.native.numeric import average
@@ -19,18 +18,3 @@ def covariance(a : PositionArray):
 	cov_yy = average( [(pos.y - mean_y) * (pos.y - mean_y) for pos in a] )
 	cov_xy = average( [(pos.x - mean_x) * (pos.y - mean_y) for pos in a] )
 	return Matrix2x2(cov_xx, cov_xy, cov_xy, cov_yy)
-
-
-
-def SVD(A: Matrix2x2) :
-	ata = A.transpose * A
-	aat = A * A.transpose
-
-	v_matrix = ata.eigenvectors
-	u_matrix = aat.eigenvectors
-
-	# Singular values are square roots of eigenvalues
-	singular_values = tuple(math.sqrt(lambda_i) for lambda_i in ata.eigenvalues)
-
-	return singular_values, u_matrix, v_matrix
-
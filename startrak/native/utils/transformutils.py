@@ -0,0 +1,83 @@
+# compiled module
+'''
+	Array versions of the TrackingSolution operations.
+
+	Transforms are handled as homogeneous (3, 3) matrices (see TrackingSolution.matrix) and sequences of them as (F, 3, 3) arrays,
+	points are (N, 2) arrays of x, y coordinates or (F, N, 2) arrays with one set of points per frame.
+	Every function broadcasts over the leading dimensions, so a catalog can be projected through a whole sequence in a single call.
+'''
+from __future__ import annotations
+from typing import Any
+import numpy as np
+
+__all__ = ['transform_points', 'compose', 'accumulate', 'invert', 'project', 'relative_positions']
+
+def _matrices(matrices : Any) -> Any:
+	array = np.asarray(matrices, dtype= np.float64)
+	assert array.shape[-2:] == (3, 3), f'Expected (3, 3) or (F, 3, 3) matrices, got {array.shape}'
+	return array
+
+def _points(points : Any) -> Any:
+	array = np.asarray(points, dtype= np.float64)
+	assert array.ndim >= 1 and array.shape[-1] == 2, f'Expected (N, 2) or (F, N, 2) points, got {array.shape}'
+	return array
+
+def transform_points(matrices : Any, points : Any) -> Any:
+	'''
+		Applies the transforms to the points.
+		A (3, 3) matrix maps (N, 2) points into (N, 2), a (F, 3, 3) sequence maps them into (F, N, 2) and (F, N, 2) points are mapped frame by frame.
+	'''
+	m = _matrices(matrices)
+	p = _points(points)
+	return p @ np.swapaxes(m[..., :2, :2], -1, -2) + m[..., None, :2, 2]
+
+def compose(first : Any, second : Any) -> Any:
+	''' Returns the transforms equivalent to applying `first` and then `second` (second @ first) '''
+	return np.matmul(_matrices(second), _matrices(first))
+
+def accumulate(steps : Any) -> Any:
+	'''
+		Chains a (F, 3, 3) sequence of frame to frame transforms into transforms relative to the first frame:
+		out[k] = steps[k] @ ... @ steps[1] @ steps[0]
+
+		The chain is computed as a prefix scan, using log2(F) batched products instead of F sequential ones.
+	'''
+	out = _matrices(steps).copy()
+	assert out.ndim == 3, 'Expected a (F, 3, 3) sequence of matrices'
+	shift = 1
+	while shift < len(out):
+		out[shift:] = out[shift:] @ out[:-shift]
+		shift *= 2
+	return out
+
+def invert(matrices : Any) -> Any:
+	''' Returns the inverse of each transform, the linear part is inverted in closed form '''
+	m = _matrices(matrices)
+	a, b, c, d = m[..., 0, 0], m[..., 0, 1], m[..., 1, 0], m[..., 1, 1]
+	tx, ty = m[..., 0, 2], m[..., 1, 2]
+	det = a * d - b * c
+	if np.any(det == 0):
+		raise ValueError('Matrix is not invertible.')
+	out = np.zeros_like(m)
+	out[..., 0, 0] = d / det
+	out[..., 0, 1] = -b / det
+	out[..., 1, 0] = -c / det
+	out[..., 1, 1] = a / det
+	out[..., 0, 2] = -(out[..., 0, 0] * tx + out[..., 0, 1] * ty)
+	out[..., 1, 2] = -(out[..., 1, 0] * tx + out[..., 1, 1] * ty)
+	out[..., 2, 2] = 1.
+	return out
+
+def project(matrices : Any, reference : Any) -> Any:
+	''' Returns the (F, N, 2) positions of the (N, 2) reference points in every frame '''
+	return transform_points(_matrices(matrices).reshape(-1, 3, 3), reference)
+
+def relative_positions(matrices : Any, positions : Any) -> Any:
+	'''
+		Maps the (F, N, 2) positions measured in each frame back into the reference frame,
+		where matrices[k] is the transform from the reference into frame k. Lost stars can be given as NaN.
+	'''
+	p = _points(positions)
+	m = _matrices(matrices).reshape(-1, 3, 3)
+	assert p.ndim == 3 and len(p) == len(m), 'Expected one set of positions per transform'
+	return transform_points(invert(m), p)
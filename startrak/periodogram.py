@@ -0,0 +1,229 @@
+'''
+	Fast Lomb-Scargle periodograms of many light curves.
+
+	The periodogram is the floating mean (generalized) Lomb-Scargle with the standard normalization: the fraction of the weighted variance
+	explained by a sinusoid plus an offset, between 0 and 1. The trigonometric sums over the frames are computed with the method of
+	Press & Rybicki (1989): the data is extirpolated (Lagrange, order 6) onto a regular grid and the sums of every frequency are obtained with one FFT,
+	in O(N log N) instead of the O(N x n_frequencies) of the direct evaluation.
+	All the stars share the times of the frames, so the extirpolation is computed once and applied to the columns of every star together.
+	The frequency grid is processed in chunks (which bounds the size of the FFTs) and the stars in blocks that are distributed over a pool of processes.
+
+	Example:
+	```
+		curves = LightCurves.from_results(pipeline.results, session.included_stars, times)
+		result = lomb_scargle(curves, min_period= 0.02, max_period= 0.5)
+		for name, period, fap in zip(curves.names, result.best_period, result.false_alarm):
+			print(name, period, fap)
+	```
+'''
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+from numpy.typing import NDArray as _NDArray
+from startrak.native.alias import ArrayLike, NDArray
+from startrak.types.lightcurves import LightCurves
+
+__all__ = ['Periodogram', 'frequency_grid', 'lomb_scargle', 'false_alarm']
+
+EXTIRPOLATION_ORDER = 6
+FFT_OVERSAMPLING = 4
+
+class Periodogram(NamedTuple):
+	frequency : NDArray
+	''' Frequencies evaluated, in cycles per unit of time'''
+	power : Optional[NDArray]
+	''' Power of each star at each frequency (n_stars, n_frequencies), only if requested'''
+	best_frequency : NDArray
+	best_power : NDArray
+	false_alarm : NDArray
+	''' False alarm probability of the best peak of each star, see false_alarm()'''
+
+	@property
+	def best_period(self) -> NDArray:
+		with np.errstate(divide= 'ignore'):
+			return 1 / self.best_frequency
+
+def frequency_grid(time : ArrayLike, min_period : Optional[float] = None, max_period : Optional[float] = None, samples_per_peak : float = 5) -> Tuple[float, float, int]:
+	'''
+		Regular frequency grid for a time series, as (first frequency, step, number of frequencies).
+		The step resolves the peaks (of width 1 / baseline) with samples_per_peak frequencies.
+		Default max_period: the baseline, default min_period: twice the median spacing of the times (the pseudo Nyquist limit).
+	'''
+	t = np.sort(np.asarray(time, dtype= np.float64))
+	assert len(t) > 1 and t[-1] > t[0], 'At least two different times are required'
+	baseline = t[-1] - t[0]
+	df = 1 / (samples_per_peak * baseline)
+	fmin = 1 / max_period if max_period else df
+	if min_period:
+		fmax = 1 / min_period
+	else:
+		steps = np.diff(t)
+		fmax = 0.5 / float(np.median(steps[steps > 0]))
+	assert fmax > fmin > 0, 'min_period must be smaller than max_period'
+	return fmin, df, int(math.ceil((fmax - fmin) / df)) + 1
+
+class _Extirpolation(NamedTuple):
+	# Frames sorted by grid node and where each node starts, with the Lagrange coefficients of every (frame, node) pair in that order
+	order : NDArray
+	nodes : NDArray
+	starts : _NDArray[np.intp]
+	coefficients : NDArray
+
+def _extirpolation(x : NDArray, size : int) -> _Extirpolation:
+	# Coefficients that spread each value at the fractional position x over the nearest nodes of a periodic grid,
+	# such that the sum of a smooth periodic function over the values equals its sum over the grid
+	m = EXTIRPOLATION_ORDER
+	low = np.floor(x).astype(np.intp) - (m // 2 - 1)
+	offsets = x[:, None] - (low[:, None] + np.arange(m))
+	coefficients = np.ones((len(x), m))
+	for i in range(m):
+		for j in range(m):
+			if i != j:
+				coefficients[:, i] *= offsets[:, j] / (i - j)
+	nodes = ((low[:, None] + np.arange(m)) % size).ravel()
+	order = np.argsort(nodes, kind= 'stable')
+	nodes = nodes[order]
+	starts = np.flatnonzero(np.r_[True, nodes[1:] != nodes[:-1]])
+	return _Extirpolation(order, nodes[starts], starts, coefficients.ravel()[order])
+
+def _fft_size(chunk : int) -> int:
+	# The sums at twice the frequencies of the chunk also need FFT_OVERSAMPLING nodes per cycle
+	return 1 << int(math.ceil(math.log2(max(2 * chunk * FFT_OVERSAMPLING, 16))))
+
+def _trig_sums(plan : _Extirpolation, values : NDArray, size : int, count : int) -> _NDArray[np.complex128]:
+	# sum_t values[t] * exp(2j pi k x[t] / size) for k < count, for every column of values
+	spread = values[plan.order // EXTIRPOLATION_ORDER] * plan.coefficients[:, None]
+	grid = np.zeros((size, values.shape[1]), dtype= np.complex128)
+	grid[plan.nodes] = np.add.reduceat(spread, plan.starts, axis= 0)
+	return np.fft.ifft(grid, axis= 0)[:count] * size
+
+def _best_peaks(time : NDArray, flux : NDArray, error : NDArray, f0 : float, df : float, n : int, chunk : int, keep_power : bool) -> Tuple[NDArray, NDArray, Optional[NDArray]]:
+	# Periodogram of a block of stars, returns the index and power of the highest peak of each star, and the power if requested
+	valid = np.isfinite(flux) & np.isfinite(time)[:, None]
+	t = np.where(np.isfinite(time), time - np.nanmin(time), 0)
+	# Stars with unknown errors are weighted uniformly
+	known = ((np.isfinite(error) & (error > 0)) | ~valid).all(axis= 0)
+	sigma = np.where(known & valid, error, 1)
+	weights = np.where(valid, 1 / sigma ** 2, 0)
+	total = weights.sum(axis= 0)
+	weights /= np.where(total > 0, total, 1)
+	y = np.where(valid, flux, 0)
+	y -= (weights * y).sum(axis= 0)
+	yy = (weights * y ** 2).sum(axis= 0)
+
+	size = _fft_size(chunk)
+	single = _extirpolation((t * df * size) % size, size)
+	double = _extirpolation((2 * t * df * size) % size, size)
+	stars = flux.shape[1]
+	best_index = np.zeros(stars, dtype= np.int64)
+	best_power = np.full(stars, -np.inf)
+	power = np.empty((stars, n)) if keep_power else None
+	for start in range(0, n, chunk):
+		count = min(chunk, n - start)
+		f = f0 + start * df
+		phase = np.exp(2j * np.pi * f * t)[:, None]
+		sums = _trig_sums(single, np.concatenate((weights * y, weights), axis= 1) * phase, size, count)
+		s2c2 = _trig_sums(double, weights * phase ** 2, size, count)
+		sh, ch = sums[:, :stars].imag, sums[:, :stars].real
+		s, c = sums[:, stars:].imag, sums[:, stars:].real
+		s2, c2 = s2c2.imag, s2c2.real
+
+		# Time offset tau that decouples the sine and cosine terms, with the mean fitted. Stars without measurements give 0 / 0
+		with np.errstate(divide= 'ignore', invalid= 'ignore'):
+			tan_2wt = (s2 - 2 * s * c) / (c2 - (c * c - s * s))
+			c2w = 1 / np.sqrt(1 + tan_2wt ** 2)
+			s2w = tan_2wt * c2w
+			cw = np.sqrt(0.5 * (1 + c2w))
+			sw = np.sign(s2w) * np.sqrt(0.5 * (1 - c2w))
+			yc = ch * cw + sh * sw
+			ys = sh * cw - ch * sw
+			cc = 0.5 * (1 + c2 * c2w + s2 * s2w) - (c * cw + s * sw) ** 2
+			ss = 0.5 * (1 - c2 * c2w - s2 * s2w) - (s * cw - c * sw) ** 2
+			p = ((yc * yc / cc + ys * ys / ss) / yy).T
+		p = np.where(np.isfinite(p), p, 0)
+		if power is not None:
+			power[:, start:start + count] = p
+		index = p.argmax(axis= 1)
+		peak = p[np.arange(stars), index]
+		better = peak > best_power
+		best_index[better] = start + index[better]
+		best_power[better] = peak[better]
+	return best_index, best_power, power
+
+def false_alarm(power : ArrayLike, fmax : float, time : ArrayLike, error : Optional[ArrayLike] = None) -> NDArray:
+	'''
+		False alarm probability of the highest peak of a periodogram (standard normalization) with the given power,
+		that is the probability that pure noise reaches that power at any frequency up to fmax.
+		Uses the approximation of Baluev (2008), valid for small probabilities and conservative otherwise.
+
+		Parameters:
+		- power (arraylike): Power of the peaks
+		- fmax (float): Highest frequency searched
+		- time (arraylike): Times of the valid measurements of the light curve
+		- error (arraylike, optional): Flux uncertainties, which weight the times
+	'''
+	z = np.clip(np.asarray(power, dtype= np.float64), 0, 1)
+	t = np.asarray(time, dtype= np.float64)
+	n = len(t)
+	if n < 4:
+		return np.full(z.shape, np.nan)
+	w = np.ones(n) if error is None else 1 / np.asarray(error, dtype= np.float64) ** 2
+	w /= w.sum()
+	variance = float(np.dot(w, (t - np.dot(w, t)) ** 2))
+	width = fmax * math.sqrt(4 * math.pi * variance)
+	nh, nk = n - 1, n - 3
+	gamma = math.sqrt(2 / nh) * math.exp(math.lgamma(nh / 2) - math.lgamma((nh - 1) / 2))
+	single = 1 - (1 - z) ** (0.5 * (n - 3))
+	tau = gamma * width * (1 - z) ** (0.5 * (nk - 1)) * np.sqrt(0.5 * nh * z)
+	return np.clip(1 - single * np.exp(-tau), 0, 1)
+
+def lomb_scargle(curves : LightCurves, min_period : Optional[float] = None, max_period : Optional[float] = None, samples_per_peak : float = 5,
+						frequency : Optional[Tuple[float, float, int]] = None, chunk : int = 1 << 14, keep_power : bool = False,
+						workers : Optional[int] = None, max_bytes : int = 256 << 20) -> Periodogram:
+	'''
+		Lomb-Scargle periodogram of every star of the light curves, see the module documentation.
+
+		Parameters:
+		- curves (LightCurves): Light curves, NaN fluxes are ignored and the errors (when finite) weight the measurements
+		- min_period, max_period, samples_per_peak: Frequency grid, see frequency_grid()
+		- frequency (tuple, optional): Explicit regular grid as (first frequency, step, number of frequencies), overrides the periods
+		- chunk (int, default: 16384): Number of frequencies evaluated by each FFT
+		- keep_power (bool, default: False): Whether to return the power of every frequency, which takes n_stars x n_frequencies floats
+		- workers (int, optional): Number of processes, default: os.cpu_count(). With one worker the stars are processed in this process
+		- max_bytes (int, default: 256 MB): Memory budget of the FFT grids of a block of stars
+	'''
+	f0, df, n = frequency if frequency is not None else frequency_grid(curves.time[np.isfinite(curves.time)], min_period, max_period, samples_per_peak)
+	assert f0 >= 0 and df > 0 and n > 0, 'Invalid frequency grid'
+	chunk = max(1, min(chunk, n))
+	time, flux, error = curves.time, curves.flux, curves.error
+	stars = flux.shape[1]
+	workers = workers if workers else (os.cpu_count() or 1)
+
+	# Each star of a block holds three complex grids of the FFT size and the power of a chunk
+	size = _fft_size(chunk)
+	block = int(max(1, min(max_bytes // (size * 64 + chunk * 8), -(-stars // workers))))
+	args = [(time, flux[:, i:i + block], error[:, i:i + block], f0, df, n, chunk, keep_power) for i in range(0, stars, block)]
+	if workers == 1 or len(args) <= 1:
+		results = [_best_peaks(*arg) for arg in args]
+	else:
+		with ProcessPoolExecutor(min(workers, len(args))) as executor:
+			results = list(executor.map(_best_peaks, *zip(*args)))
+
+	frequencies = f0 + df * np.arange(n)
+	best_index = np.concatenate([r[0] for r in results]) if results else np.zeros(0, dtype= np.int64)
+	best_power = np.concatenate([r[1] for r in results]) if results else np.zeros(0)
+	power = np.concatenate([r[2] for r in results]) if keep_power and results else None
+	valid = np.isfinite(flux) & np.isfinite(time)[:, None]
+	fap = np.array([false_alarm(best_power[i], frequencies[-1], time[valid[:, i]], _weights_error(error[valid[:, i], i])) for i in range(stars)])
+	best_frequency = frequencies[best_index]
+	# Stars without enough measurements to fit a sinusoid
+	few = valid.sum(axis= 0) < 4
+	best_frequency[few] = np.nan
+	best_power[few] = np.nan
+	return Periodogram(frequencies, power, best_frequency, best_power, fap)
+
+def _weights_error(error : NDArray) -> Optional[NDArray]:
+	return error if np.all(np.isfinite(error) & (error > 0)) else None
@@ -0,0 +1,247 @@
+'''
+	Lightweight stage profiler.
+
+	Time is aggregated per stage (call count, total, maximum and bytes read) and per call stack, so nested stages can be
+	exported as a folded flame graph with flame().
+
+	There are two ways of collecting timings:
+	* attach() hooks the entry points of StarDetector, Tracker, PhotometryBase and the FITS readers (including the subclasses already defined),
+		detach() restores the original methods so there is no overhead left.
+	* stage(name) and @profiled(name) can be used in user code, they are no-ops unless the profiler is enabled.
+		If the environment variable STARTRAK_PROFILE is not set when this module is imported, @profiled returns the decorated function unchanged.
+
+	Example:
+	```
+		from startrak import profiling
+		with profiling.session():
+			for file in files:
+				tracker.track(file.get_data())
+		print(profiling.summary())
+	```
+'''
+from __future__ import annotations
+import contextlib
+from functools import wraps
+import os
+from threading import Lock, local
+import time
+from typing import Any, Callable, Dict, Final, Iterator, List, Optional, Tuple, TypeVar
+
+__all__ = ['StageStats', 'enable', 'disable', 'is_enabled', 'stage', 'profiled', 'attach', 'detach',
+			  'session', 'reset', 'get_stats', 'summary', 'flame']
+
+_TFunc = TypeVar('_TFunc', bound= Callable[..., Any])
+_COMPILED_IN : Final[bool] = bool(os.environ.get('STARTRAK_PROFILE'))
+
+class StageStats:
+	__slots__ = ('count', 'total', 'max', 'bytes')
+	count : int
+	total : float
+	max : float
+	bytes : int
+
+	def __init__(self) -> None:
+		self.count = 0
+		self.total = 0.
+		self.max = 0.
+		self.bytes = 0
+
+	@property
+	def mean(self) -> float:
+		return self.total / self.count if self.count else 0.
+
+	def add(self, elapsed : float, nbytes : int):
+		self.count += 1
+		self.total += elapsed
+		self.bytes += nbytes
+		if elapsed > self.max:
+			self.max = elapsed
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} (calls= {self.count}, total= {self.total * 1000:.2f} ms, max= {self.max * 1000:.2f} ms, bytes= {self.bytes})'
+
+_enabled = False
+_lock = Lock()
+_stages = dict[str, StageStats]()
+_stacks = dict[str, StageStats]()
+_thread = local()
+
+def enable():
+	global _enabled
+	_enabled = True
+def disable():
+	global _enabled
+	_enabled = False
+def is_enabled() -> bool:
+	return _enabled
+
+def reset():
+	''' Clears all the collected timings '''
+	with _lock:
+		_stages.clear()
+		_stacks.clear()
+
+def _stack() -> List[str]:
+	stack = getattr(_thread, 'stack', None)
+	if stack is None:
+		stack = _thread.stack = list[str]()
+	return stack
+
+class _Timer:
+	__slots__ = ('name', 'nbytes', '_start')
+	def __init__(self, name : str, nbytes : int = 0) -> None:
+		self.name = name
+		self.nbytes = nbytes
+		self._start = 0.
+	def __enter__(self) -> _Timer:
+		_stack().append(self.name)
+		self._start = time.perf_counter()
+		return self
+	def __exit__(self, *args):
+		elapsed = time.perf_counter() - self._start
+		stack = _stack()
+		path = ';'.join(stack)
+		stack.pop()
+		with _lock:
+			_stages.setdefault(self.name, StageStats()).add(elapsed, self.nbytes)
+			_stacks.setdefault(path, StageStats()).add(elapsed, self.nbytes)
+
+class _NullTimer:
+	__slots__ = ('nbytes',)
+	def __init__(self) -> None:
+		self.nbytes = 0
+	def __enter__(self) -> _NullTimer:
+		return self
+	def __exit__(self, *args):
+		pass
+_NULL : Final[_NullTimer] = _NullTimer()
+
+def stage(name : str, nbytes : int = 0) -> _Timer | _NullTimer:
+	''' Context manager timing the enclosed block as the given stage, the number of bytes can be set (or updated through the returned object's nbytes)'''
+	if not _enabled:
+		return _NULL
+	return _Timer(name, nbytes)
+
+def profiled(name : Optional[str] = None, measure : Optional[Callable[[Any], int]] = None) -> Callable[[_TFunc], _TFunc]:
+	'''
+		Decorator timing every call of a function as a stage (default name: the function qualified name).
+		measure(result) may return the number of bytes read by the call.
+	'''
+	def decorator(func : _TFunc) -> _TFunc:
+		if not _COMPILED_IN:
+			return func
+		return _timed(func, name or func.__qualname__, measure)
+	return decorator
+
+def _timed(func : _TFunc, name : str, measure : Optional[Callable[[Any], int]] = None) -> _TFunc:
+	@wraps(func)
+	def wrapper(*args : Any, **kwargs : Any) -> Any:
+		if not _enabled:
+			return func(*args, **kwargs)
+		with _Timer(name) as timer:
+			result = func(*args, **kwargs)
+			if measure is not None:
+				timer.nbytes = measure(result)
+		return result
+	wrapper.__profiled__ = func		#type: ignore[attr-defined]
+	return wrapper		#type: ignore[return-value]
+
+#region Hooks
+_patches = list[Tuple[type, str, Any]]()
+
+def _subclasses(cls : type) -> Iterator[type]:
+	for sub in cls.__subclasses__():
+		yield sub
+		yield from _subclasses(sub)
+
+def _patch(owner : type, attr : str, name : str, measure : Optional[Callable[[Any], int]] = None):
+	original = owner.__dict__.get(attr)
+	if original is None or getattr(original, '__isabstractmethod__', False):
+		return
+	if hasattr(getattr(original, '__func__', original), '__profiled__'):
+		return
+	if isinstance(original, classmethod):
+		hooked : Any = classmethod(_timed(original.__func__, name, measure))
+		hooked.__func__.__profiled__ = original
+	else:
+		hooked = _timed(original, name, measure)
+	try:
+		setattr(owner, attr, hooked)
+	except (AttributeError, TypeError):
+		return
+	_patches.append((owner, attr, original))
+
+def attach():
+	'''
+		Hooks the stage entry points: StarDetector.detect/_detect, Tracker.track, PhotometryBase.evaluate and the FITS header and data readers.
+		Only subclasses defined before calling attach() are hooked.
+	'''
+	from startrak.native import FileInfo, PhotometryBase, StarDetector, Tracker
+	from startrak.native.fits import _bound_reader
+
+	_patch(StarDetector, 'detect', 'StarDetector.detect')
+	for cls in _subclasses(StarDetector):
+		_patch(cls, '_detect', cls.__name__ + '._detect')
+	for cls in _subclasses(Tracker):
+		_patch(cls, 'track', cls.__name__ + '.track')
+		_patch(cls, 'setup_model', cls.__name__ + '.setup_model')
+	for cls in _subclasses(PhotometryBase):
+		_patch(cls, 'evaluate', cls.__name__ + '.evaluate')
+	_patch(FileInfo, 'new', 'fits.read_header', lambda info: info.get_data.offset)
+	_patch(_bound_reader, '__call__', 'fits.read_data', lambda data: data.nbytes)
+
+def detach():
+	''' Restores every method hooked by attach() '''
+	while _patches:
+		owner, attr, original = _patches.pop()
+		setattr(owner, attr, original)
+
+@contextlib.contextmanager
+def session(clear : bool = True) -> Iterator[None]:
+	''' Enables the profiler and attaches the hooks inside a with block '''
+	if clear:
+		reset()
+	was_enabled = _enabled
+	enable()
+	attach()
+	try:
+		yield
+	finally:
+		detach()
+		if not was_enabled:
+			disable()
+#endregion
+
+#region Reports
+def get_stats() -> Dict[str, StageStats]:
+	''' Returns a copy of the aggregated statistics per stage '''
+	with _lock:
+		return dict(_stages)
+
+def summary(sort_by : str = 'total') -> str:
+	''' Returns a table with the statistics of each stage, sorted by total time ("total", "count", "max" or "bytes")'''
+	stats = sorted(get_stats().items(), key= lambda item: getattr(item[1], sort_by), reverse= True)
+	width = max([len(name) for name, _ in stats] + [5])
+	lines = [f'{"stage":<{width}}  {"calls":>7}  {"total ms":>10}  {"mean ms":>9}  {"max ms":>9}  {"MB read":>8}']
+	for name, s in stats:
+		lines.append(f'{name:<{width}}  {s.count:>7}  {s.total * 1000:>10.2f}  {s.mean * 1000:>9.3f}  {s.max * 1000:>9.3f}  {s.bytes / 1048576:>8.2f}')
+	return '\n'.join(lines)
+
+def flame(path : Optional[str] = None) -> str:
+	'''
+		Returns the collected call stacks in folded format ("outer;inner <self time in microseconds>" per line),
+		which can be rendered by flamegraph.pl, speedscope or inferno. The output is also written to path if given.
+	'''
+	with _lock:
+		totals = {stack : s.total for stack, s in _stacks.items()}
+	self_time = dict(totals)
+	for stack, total in totals.items():
+		parent, sep, _ = stack.rpartition(';')
+		if sep and parent in self_time:
+			self_time[parent] -= total
+	folded = '\n'.join(f'{stack} {max(int(t * 1e6), 0)}' for stack, t in sorted(self_time.items()))
+	if path:
+		with open(path, 'w') as out:
+			out.write(folded + '\n')
+	return folded
+#endregion
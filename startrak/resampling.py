@@ -0,0 +1,202 @@
+'''
+	Resampling of images through tracking solutions.
+
+	warp() builds the image seen in the reference frame: each output pixel p takes the value of the image at solution.transform(p)
+	(solutions map reference positions into the frame), interpolated with the nearest neighbor, bilinear or Lanczos (a= 3) kernels.
+	The source indices and weights of a warp are computed once per (shapes, method, transform) and cached, transforms are quantized
+	so that any two whose displacements differ by less than QUANTUM pixels over the whole image share the same plan.
+	Pure integer translations skip the interpolation: the result is a view of the image when it lies inside it, a single block copy otherwise.
+
+	Example:
+	```
+		aligned = warp(file.get_data(), solution, 'lanczos')
+		difference = aligned - reference
+	```
+'''
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Literal, NamedTuple, Optional, Tuple
+import numpy as np
+from numpy.typing import NDArray as _NDArray
+from startrak.native.classes import TrackingSolution
+from startrak.native.alias import ArrayLike, ImageLike, NDArray
+
+__all__ = ['Interpolation', 'sample', 'warp', 'clear_plans']
+
+Interpolation = Literal['nearest', 'bilinear', 'lanczos']
+LANCZOS_A = 3
+QUANTUM = 1 / 256
+MAX_CACHED_PLANS = 4
+MAX_PLAN_BYTES = 256 << 20
+
+class _Plan(NamedTuple):
+	# Integer part (row, column) and fraction of the source coordinates of every output pixel, and which of them lie inside the image
+	row : NDArray
+	col : NDArray
+	fy : NDArray
+	fx : NDArray
+	valid : _NDArray[np.bool_]
+
+	@property
+	def nbytes(self) -> int:
+		return sum(a.nbytes for a in self)
+
+_plans = OrderedDict[Hashable, _Plan]()
+_plans_lock = Lock()
+
+def _lanczos(t : NDArray) -> NDArray:
+	return np.multiply(np.sinc(t), np.sinc(t / LANCZOS_A))
+
+def _prepare(x : NDArray, y : NDArray, shape : Tuple[int, ...], method : Interpolation) -> _Plan:
+	rows, cols = shape[0], shape[1]
+	# Samples lying exactly on the last row or column are still valid
+	valid = (x >= 0) & (x <= cols - 1) & (y >= 0) & (y <= rows - 1)
+	if method == 'nearest':
+		col = np.clip(np.rint(x), 0, cols - 1).astype(np.intp)
+		row = np.clip(np.rint(y), 0, rows - 1).astype(np.intp)
+		empty = np.empty(0, dtype= np.float32)
+		return _Plan(row, col, empty, empty, valid)
+	col = np.floor(x)
+	row = np.floor(y)
+	if method == 'bilinear':
+		col = np.clip(col, 0, max(cols - 2, 0))
+		row = np.clip(row, 0, max(rows - 2, 0))
+	fx = (x - col).astype(np.float32)
+	fy = (y - row).astype(np.float32)
+	return _Plan(row.astype(np.intp), col.astype(np.intp), fy, fx, valid)
+
+def _apply(data : NDArray, plan : _Plan, method : Interpolation, out : NDArray, fill : float):
+	# Gathers use flat indices, np.take is much faster than indexing with two arrays
+	rows, cols = data.shape
+	flat = data.ravel()
+	if method == 'nearest':
+		out[...] = np.take(flat, plan.row * cols + plan.col)
+	elif method == 'bilinear':
+		top = plan.row * cols + plan.col
+		bottom = np.minimum(plan.row + 1, rows - 1) * cols + plan.col
+		right = np.minimum(plan.col + 1, cols - 1) - plan.col
+		upper = np.take(flat, top) * (1 - plan.fx) + np.take(flat, top + right) * plan.fx
+		lower = np.take(flat, bottom) * (1 - plan.fx) + np.take(flat, bottom + right) * plan.fx
+		out[...] = upper * (1 - plan.fy) + lower * plan.fy
+	else:
+		# Separable kernel over the 2a x 2a neighborhood, the weights are normalized and the edges extended
+		taps = np.arange(1 - LANCZOS_A, LANCZOS_A + 1)
+		wx = [_lanczos(plan.fx - i) for i in taps]
+		wy = [_lanczos(plan.fy - j) for j in taps]
+		norm = sum(wx) * sum(wy)
+		columns = [np.clip(plan.col + i, 0, cols - 1) for i in taps]
+		total = np.zeros(out.shape, dtype= np.float64)
+		line = np.empty(out.shape, dtype= np.float64)
+		for j, weight_y in zip(taps, wy):
+			offset = np.clip(plan.row + j, 0, rows - 1) * cols
+			line[...] = 0
+			for column, weight_x in zip(columns, wx):
+				line += np.take(flat, offset + column) * weight_x
+			total += line * weight_y
+		out[...] = total / norm
+	out[~plan.valid] = fill
+
+def sample(image : ImageLike, x : ArrayLike, y : ArrayLike, method : Interpolation = 'bilinear', fill : float = np.nan) -> NDArray:
+	'''
+		Samples the image at fractional (x, y) pixel coordinates, pixel centers lie on integer coordinates.
+
+		Parameters:
+		- image (arraylike) : The image to sample
+		- x, y (arraylike): Coordinates of the samples, any shape (both must have the same)
+		- method (str, default: 'bilinear'): 'nearest', 'bilinear' or 'lanczos'
+		- fill (float, default: nan): Value of the samples outside the image
+	'''
+	assert method in ('nearest', 'bilinear', 'lanczos'), f'Unknown interpolation method "{method}"'
+	data = np.asarray(image)
+	x = np.asarray(x, dtype= np.float64)
+	y = np.asarray(y, dtype= np.float64)
+	out = np.empty(x.shape, dtype= np.float64)
+	_apply(data, _prepare(x, y, data.shape, method), method, out, fill)
+	return out
+
+def _matrix(transform : TrackingSolution | ArrayLike) -> NDArray:
+	if isinstance(transform, TrackingSolution):
+		return np.asarray(transform.matrix, dtype= np.float64)
+	return np.asarray(transform, dtype= np.float64).reshape(3, 3)
+
+def _shift(matrix : NDArray) -> Optional[Tuple[int, int]]:
+	# Integer translation of a transform without rotation nor scale, or None
+	if not np.allclose(matrix[:2, :2], np.eye(2), rtol= 0, atol= 1e-9):
+		return None
+	tx, ty = matrix[0, 2], matrix[1, 2]
+	if abs(tx - round(tx)) > 1e-9 or abs(ty - round(ty)) > 1e-9:
+		return None
+	return int(round(tx)), int(round(ty))
+
+def _plan(matrix : NDArray, shape : Tuple[int, int], source : Tuple[int, ...], method : Interpolation, cache : bool) -> _Plan:
+	# The linear terms are quantized so that their effect over the largest coordinate changes by less than QUANTUM
+	extent = max(shape[0], shape[1], 1)
+	quantized = np.concatenate((np.round(matrix[:2, :2] * extent / QUANTUM) * QUANTUM / extent, np.round(matrix[:2, 2:] / QUANTUM) * QUANTUM), axis= 1)
+	key = (shape, source[:2], method, quantized.tobytes())
+	if cache:
+		with _plans_lock:
+			plan = _plans.get(key)
+			if plan is not None:
+				_plans.move_to_end(key)
+				return plan
+	ys, xs = np.arange(shape[0], dtype= np.float64), np.arange(shape[1], dtype= np.float64)
+	x = quantized[0, 0] * xs[None, :] + quantized[0, 1] * ys[:, None] + quantized[0, 2]
+	y = quantized[1, 0] * xs[None, :] + quantized[1, 1] * ys[:, None] + quantized[1, 2]
+	plan = _prepare(x, y, source, method)
+	if cache and plan.nbytes <= MAX_PLAN_BYTES:
+		with _plans_lock:
+			_plans[key] = plan
+			while len(_plans) > MAX_CACHED_PLANS or sum(p.nbytes for p in _plans.values()) > MAX_PLAN_BYTES:
+				_plans.popitem(last= False)
+	return plan
+
+def warp(image : ImageLike, transform : TrackingSolution | ArrayLike, method : Interpolation = 'bilinear', shape : Optional[Tuple[int, int]] = None,
+			out : Optional[NDArray] = None, fill : float = np.nan, cache : bool = True) -> NDArray:
+	'''
+		Resamples the image into the reference frame of a transform, see the module documentation.
+
+		Parameters:
+		- image (arraylike) : The image to warp
+		- transform (TrackingSolution or 3x3 array): Transform from the reference frame into the image (the tracking solution of the image)
+		- method (str, default: 'bilinear'): 'nearest', 'bilinear' or 'lanczos'
+		- shape (tuple, optional): Shape of the output, default: the shape of the image
+		- out (array, optional): Buffer where the result is written, its shape sets the output shape. Default: a new float32 array (float64 for float64 images)
+		- fill (float, default: nan): Value of the pixels that fall outside the image
+		- cache (bool, default: True): Whether to look up and store the warp plan in the cache
+
+		Integer translations return a view of the image (with its data type) if no buffer is given and the result lies inside the image.
+	'''
+	assert method in ('nearest', 'bilinear', 'lanczos'), f'Unknown interpolation method "{method}"'
+	data = np.asarray(image)
+	matrix = _matrix(transform)
+	if out is not None:
+		shape = (out.shape[0], out.shape[1])
+	elif shape is None:
+		shape = (data.shape[0], data.shape[1])
+	rows, cols = shape
+
+	shift = _shift(matrix)
+	if shift is not None:
+		tx, ty = shift
+		if out is None and tx >= 0 and ty >= 0 and tx + cols <= data.shape[1] and ty + rows <= data.shape[0]:
+			return data[ty:ty + rows, tx:tx + cols]
+		if out is None:
+			out = np.empty(shape, dtype= np.float64 if data.dtype == np.float64 else np.float32)
+		out[...] = fill
+		# Overlap of the output with the shifted image
+		r0, r1 = max(0, -ty), min(rows, data.shape[0] - ty)
+		c0, c1 = max(0, -tx), min(cols, data.shape[1] - tx)
+		if r1 > r0 and c1 > c0:
+			out[r0:r1, c0:c1] = data[r0 + ty:r1 + ty, c0 + tx:c1 + tx]
+		return out
+
+	if out is None:
+		out = np.empty(shape, dtype= np.float64 if data.dtype == np.float64 else np.float32)
+	_apply(data, _plan(matrix, shape, data.shape, method, cache), method, out, fill)
+	return out
+
+def clear_plans():
+	''' Clears the cached warp plans'''
+	with _plans_lock:
+		_plans.clear()
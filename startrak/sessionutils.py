@@ -1,10 +1,12 @@
 from pathlib import Path
-from typing import Collection, Literal, overload
-from startrak.native import FileList, Session, Star, StarList
+from typing import Collection, Literal, Sequence, overload
+from startrak.native import FileList, Session, Star, StarList, Tracker
 from startrak.native.classes import RelativeContext
 from startrak.types.sessions import *
 from startrak.types.exporters import TextExporter
 from startrak.types.importers import TextImporter
+from startrak.types.alignment import AlignmentTable, SessionAlignment
+from startrak.stacking import StackMethod, StackResult, stack_frames
 
 __all__ = ['new_session', 
 				'get_session', 
@@ -17,7 +19,9 @@ __all__ = ['new_session',
 				'get_file',
 				'get_star',
 				'get_files',
-				'get_stars',]
+				'get_stars',
+				'align_session',
+				'stack_session',]
 SessionType = Literal['inspect', 'scan']
 __session__ : Session = InspectionSession('default')
 
@@ -141,4 +145,23 @@ def get_files() -> FileList:
 
 def get_stars() -> StarList:
 	''' Returns a read-only copy of the current session included stars list'''
-	return __session__.included_stars.copy(closed= True)
\ No newline at end of file
+	return __session__.included_stars.copy(closed= True)
+
+def align_session(tracker : Tracker, keyframes : int | Sequence[str | int] = 1, workers : int | None = None, force : bool = False) -> AlignmentTable:
+	'''
+		Aligns every file of the current session and stores the solutions in the session (see SessionAlignment), 
+		only files added or modified since the last call are tracked unless force is True.
+	'''
+	return SessionAlignment(tracker, keyframes, workers).run(__session__, force)
+
+def stack_session(method : StackMethod = 'mean', sigma : float = 3.0, workers : int | None = None) -> StackResult:
+	'''
+		Stacks the files of the current session with the solutions of its alignment (see align_session and stacking.stack_frames),
+		files that were not aligned are skipped.
+	'''
+	table = __session__.alignment
+	if not isinstance(table, AlignmentTable):
+		raise RuntimeError('The session is not aligned, call align_session() first')
+	files = list(__session__.included_files)
+	solutions = [table.get(file) if file.name in table else None for file in files]
+	return stack_frames(files, solutions, method, sigma, workers= workers)
@@ -0,0 +1,123 @@
+'''
+	Stacking of aligned frames into a deep reference image.
+
+	Every frame is resampled into the pixel grid of the reference frame through its tracking solution (which maps reference positions
+	into the frame, as computed by the trackers), see startrak.resampling. The reference grid is processed in bands of rows and
+	only the rows of each frame that a band needs are read (FileInfo.get_data.rows), so the memory used is of the order of one frame:
+	the mean is accumulated frame by frame, the median and the sigma clipped mean combine a stack of the band that fits in max_bytes.
+	Bands are distributed over a pool of processes, the data hook of the parent (e.g. an installed Calibration) is also used by the workers.
+
+	Example:
+	```
+		table = align_session(GlobalAlignmentTracker('local_maxima'))
+		result = stack_frames(get_files(), table.solutions(), method= 'sigma_clip')
+		stars = detect_stars(result.filled(), 'local_maxima')
+	```
+'''
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import List, Literal, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from startrak.imageutils import combine_stack
+from startrak.native import FileInfo, TrackingSolution
+from startrak.native.alias import NDArray
+from startrak.native.fits import _bound_reader, get_data_hook, set_data_hook
+from startrak.native.utils.transformutils import transform_points
+from startrak.resampling import LANCZOS_A, Interpolation, sample
+
+__all__ = ['StackResult', 'StackMethod', 'stack_frames']
+
+StackMethod = Literal['mean', 'median', 'sigma_clip']
+
+class StackResult(NamedTuple):
+	image : NDArray
+	''' Stacked frame in float32, NaN where no frame covers the pixel'''
+	coverage : NDArray
+	''' Number of frames contributing to each pixel'''
+
+	def filled(self, value : Optional[float] = None) -> NDArray:
+		''' The stacked frame with the uncovered pixels set to value (default: the median of the covered pixels), as expected by the detectors'''
+		covered = self.coverage > 0
+		if value is None:
+			value = float(np.median(self.image[covered])) if covered.any() else 0.
+		return np.where(covered, self.image, np.float32(value))
+
+def _sample_band(reader : _bound_reader, matrix : NDArray, start : int, stop : int, cols : int, interpolation : Interpolation) -> NDArray:
+	# Rows [start, stop) of the reference grid sampled from a frame, only the rows of the frame they fall onto are read
+	if np.allclose(matrix, np.eye(3)) and reader.shape[1] == cols and stop <= reader.shape[0]:
+		return np.asarray(reader.rows(start, stop), dtype= np.float32)
+	y, x = np.mgrid[start:stop, 0:cols]
+	points = transform_points(matrix, np.column_stack((x.ravel(), y.ravel())).astype(np.float64))
+	# The strip includes the rows under the interpolation kernel
+	margin = LANCZOS_A if interpolation == 'lanczos' else 1
+	lo = max(int(np.floor(points[:, 1].min())) - margin, 0)
+	hi = min(int(np.ceil(points[:, 1].max())) + margin + 1, reader.shape[0])
+	if hi - lo < 2:
+		return np.full((stop - start, cols), np.nan, dtype= np.float32)
+	strip = reader.rows(lo, hi)
+	values = sample(strip, points[:, 0], points[:, 1] - lo, interpolation)
+	return values.reshape(stop - start, cols).astype(np.float32)
+
+def _stack_band(readers : List[_bound_reader], matrices : NDArray, start : int, stop : int, cols : int,
+						method : StackMethod, sigma : float, interpolation : Interpolation) -> Tuple[NDArray, NDArray]:
+	if method == 'mean':
+		total = np.zeros((stop - start, cols), dtype= np.float64)
+		count = np.zeros((stop - start, cols), dtype= np.int32)
+		for reader, matrix in zip(readers, matrices):
+			band = _sample_band(reader, matrix, start, stop, cols, interpolation)
+			valid = np.isfinite(band)
+			total += np.where(valid, band, 0)
+			count += valid
+		with np.errstate(invalid= 'ignore', divide= 'ignore'):
+			return (total / count).astype(np.float32), count
+	stack = np.empty((len(readers), stop - start, cols), dtype= np.float32)
+	for i, (reader, matrix) in enumerate(zip(readers, matrices)):
+		stack[i] = _sample_band(reader, matrix, start, stop, cols, interpolation)
+	return combine_stack(stack, method, sigma).astype(np.float32), np.isfinite(stack).sum(axis= 0, dtype= np.int32)
+
+def stack_frames(files : Sequence[FileInfo], solutions : Optional[Sequence[Optional[TrackingSolution]]] = None,
+						method : StackMethod = 'mean', sigma : float = 3.0, shape : Optional[Tuple[int, int]] = None,
+						workers : Optional[int] = None, max_bytes : int = 64 << 20, interpolation : Interpolation = 'bilinear') -> StackResult:
+	'''
+		Stacks the frames into the pixel grid of the reference frame, see the module documentation.
+
+		Parameters:
+		- files (sequence of FileInfo): Frames to stack
+		- solutions (sequence of TrackingSolution): Solution of each frame (reference to frame), frames with None are skipped. Default: the frames are already aligned
+		- method (str, default: 'mean'): 'mean', 'median' or 'sigma_clip' (mean of the values within sigma standard deviations of the median)
+		- sigma (float, default: 3): Clipping threshold of the sigma_clip method
+		- shape (tuple, optional): Shape of the reference grid, default: the shape of the first frame
+		- workers (int, optional): Number of processes, default: os.cpu_count(). With one worker the bands are stacked in this process
+		- max_bytes (int, default: 64 MB): Memory budget of a band
+		- interpolation (str, default: 'bilinear'): 'nearest', 'bilinear' or 'lanczos', see resampling.sample
+	'''
+	assert method in ('mean', 'median', 'sigma_clip'), f'Unknown stacking method "{method}"'
+	if solutions is None:
+		solutions = [TrackingSolution.identity()] * len(files)
+	assert len(solutions) == len(files), 'There must be a solution for every file'
+	used = [(file, solution) for file, solution in zip(files, solutions) if solution is not None]
+	assert len(used) > 0, 'At least one frame with a solution is required'
+	readers = [file.get_data for file, _ in used]
+	matrices = TrackingSolution.stack([solution for _, solution in used])
+	rows, cols = shape if shape else readers[0].shape
+	workers = workers if workers else (os.cpu_count() or 1)
+
+	# Mean bands hold the accumulators and the sampling coordinates, the others a band of every frame
+	per_row = cols * (40 if method == 'mean' else 4 * len(used) + 40)
+	band = int(max(1, min(max_bytes // per_row, -(-rows // workers))))
+	bands = [(start, min(start + band, rows)) for start in range(0, rows, band)]
+
+	image = np.empty((rows, cols), dtype= np.float32)
+	coverage = np.empty((rows, cols), dtype= np.int32)
+	args = [(readers, matrices, start, stop, cols, method, sigma, interpolation) for start, stop in bands]
+	if workers == 1 or len(bands) == 1:
+		results = [_stack_band(*arg) for arg in args]
+	else:
+		with ProcessPoolExecutor(min(workers, len(bands)), initializer= set_data_hook, initargs= (get_data_hook(),)) as executor:
+			results = list(executor.map(_stack_band, *zip(*args)))
+	for (start, stop), (data, count) in zip(bands, results):
+		image[start:stop] = data
+		coverage[start:stop] = count
+	image[coverage == 0] = np.nan
+	return StackResult(image, coverage)
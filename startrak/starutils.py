@@ -1,33 +1,21 @@
 from math import isnan
 from typing import List, Literal, Tuple
 from startrak.native import PhotometryBase, Star, StarDetector, StarList
+from startrak.framecontext import find_context
 from startrak.imageutils import sigma_stretch
 from startrak.types import detection
 from startrak.types import phot
 import numpy as np
-import cv2
 
 from startrak.native.alias import ImageLike
 
 __all__ = ['detect_stars', ]
-_Method = Literal['hough', 'hough_adaptive', 'hough_threshold']
 
 def detect_stars(image : ImageLike, 
-					  method : _Method | StarDetector = 'hough', photometry : Literal['aperture']|PhotometryBase|None = 'aperture', **detector_args) -> StarList:
-	_detector : StarDetector
-	# todo: replace with dict based mapping
-	if method == 'hough':
-		_detector = detection.HoughCircles(**detector_args)
-	elif method == 'hough_adaptive':
-		_detector = detection.AdaptiveHoughCircles(**detector_args)
-	elif method == 'hough_threshold':
-		_detector = detection.ThresholdHoughCircles(**detector_args)
-	elif isinstance(method, StarDetector):
-		_detector = method
-	else:
-		raise ValueError(method)
-	
-	stars = _detector.detect(image)
+					  method : detection.DetectionMethod | StarDetector = 'hough', photometry : Literal['aperture']|PhotometryBase|None = 'aperture', **detector_args) -> StarList:
+	_detector = detection.get_detector(method, **detector_args)
+	context = find_context(image)
+	stars = context.detect(_detector) if context is not None else _detector.detect(image)
 	if photometry:
 		phot_method : PhotometryBase
 		if photometry == 'aperture':
@@ -40,6 +28,7 @@ def detect_stars(image : ImageLike,
 
 def visualize_stars(image : ImageLike, stars : List[Star],
 					vsize : int= 720, sigma : int = 4, color : Tuple[int, int, int] = (200, 0, 0)):
+	import cv2
 	if vsize is not None and vsize != 0:
 		_f = vsize / np.min(image.shape) 
 		image = cv2.resize(image, None, fx=_f, fy=_f, interpolation=cv2.INTER_CUBIC)
@@ -0,0 +1,186 @@
+'''
+	Observation times of the frames, as Julian dates.
+
+	The time keywords of all the headers are gathered first and parsed together (the ISO dates in a single numpy conversion),
+	the keywords are read in order of precedence: JD, JD-OBS, MJD-OBS and DATE-OBS (with TIME-OBS when DATE-OBS only has the date).
+	All of them are taken as the start of the exposure, the mid-exposure time adds half of the exposure time (EXPTIME or EXPOSURE).
+	A TimeIndex keeps the times sorted, so the frames within a time range or closest to a time are found by binary search.
+
+	Example:
+	```
+		index = TimeIndex.from_files(get_files())
+		night = index.select(2460310.5, 2460311.5)		# FileList of the frames of a night
+		curves = LightCurves.from_results(results, stars, index.values)
+	```
+'''
+from __future__ import annotations
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from numpy.typing import NDArray as _NDArray
+from startrak.native import FileInfo, FileList, Header
+from startrak.native.alias import ArrayLike, NDArray, ValueType
+
+__all__ = ['TimeIndex', 'frame_time', 'frame_times', 'exposure_time', 'exposure_times']
+
+JD_UNIX_EPOCH = 2440587.5
+MJD_OFFSET = 2400000.5
+SECONDS_PER_DAY = 86400.
+_DAY = np.timedelta64(86400_000_000, 'us')
+_EXPOSURE_KEYS = ('EXPTIME', 'EXPOSURE')
+
+def _column(headers : Sequence[Header], key : str) -> List[Optional[ValueType]]:
+	return [header[key] if key in header else None for header in headers]
+
+def _numbers(values : Sequence[Optional[ValueType]]) -> NDArray:
+	# Numeric keyword values, NaN for the missing and non numeric ones
+	result = np.full(len(values), np.nan)
+	for i, value in enumerate(values):
+		if value is not None and not isinstance(value, bool):
+			try:
+				result[i] = float(value)
+			except ValueError:
+				pass
+	return result
+
+def _iso_dates(dates : Sequence[Optional[str]]) -> _NDArray[np.float64]:
+	# Julian dates of ISO 8601 strings, NaN for the missing and invalid ones
+	result = np.full(len(dates), np.nan)
+	present = [i for i, date in enumerate(dates) if date]
+	if not present:
+		return result
+	text = [str(dates[i]).strip().rstrip('Z') for i in present]
+	try:
+		parsed = np.array(text, dtype= 'datetime64[us]')
+	except ValueError:
+		# Some date is invalid, parse them one by one
+		parsed = np.array([_iso_date(date) for date in text], dtype= 'datetime64[us]')
+		print(f'Unable to parse {int(np.isnat(parsed).sum())} observation dates')
+	result[present] = JD_UNIX_EPOCH + (parsed - np.datetime64(0, 'us')) / _DAY
+	return result
+
+def _iso_date(text : str) -> np.datetime64:
+	try:
+		return np.datetime64(text, 'us')
+	except ValueError:
+		return np.datetime64('NaT', 'us')
+
+def _exposures(headers : Sequence[Header]) -> NDArray:
+	exposure = np.full(len(headers), np.nan)
+	for key in reversed(_EXPOSURE_KEYS):
+		values = _numbers(_column(headers, key))
+		exposure = np.where(np.isfinite(values), values, exposure)
+	return np.where(np.isfinite(exposure), exposure, 0.)
+
+def _times(headers : Sequence[Header], midpoint : bool) -> NDArray:
+	dates = [str(date) if date is not None else None for date in _column(headers, 'DATE-OBS')]
+	clock = _column(headers, 'TIME-OBS')
+	dates = [date + 'T' + str(time).strip() if date and time is not None and 'T' not in date else date for date, time in zip(dates, clock)]
+	times : _NDArray[np.float64] = _iso_dates(dates)
+	# Keywords of higher precedence overwrite the lower ones
+	for key, offset in (('MJD-OBS', MJD_OFFSET), ('JD-OBS', 0.), ('JD', 0.)):
+		values = _numbers(_column(headers, key))
+		times = np.where(np.isfinite(values), values + offset, times)
+	if midpoint:
+		times += _exposures(headers) / (2 * SECONDS_PER_DAY)
+	return times
+
+def frame_time(header : Header, midpoint : bool = True) -> float:
+	''' Julian date of a frame (of the middle of the exposure by default, else of its start), see the module documentation. NaN if the header has no time keywords'''
+	return float(_times([header], midpoint)[0])
+
+def frame_times(files : Sequence[FileInfo], midpoint : bool = True) -> NDArray:
+	''' Julian dates of the frames (float64), see frame_time()'''
+	return _times([file.header for file in files], midpoint)
+
+def exposure_time(file : FileInfo) -> float:
+	''' Exposure time of a file in seconds (EXPTIME or EXPOSURE keywords), 0 if the header has neither'''
+	return float(_exposures([file.header])[0])
+
+def exposure_times(files : Sequence[FileInfo]) -> NDArray:
+	''' Exposure times of the frames in seconds (float64), see exposure_time()'''
+	return _exposures([file.header for file in files])
+
+class TimeIndex:
+	'''
+		Sorted index of the frames by their time (or any other value, such as the exposure time).
+		Frames without a value (NaN) are left out of the queries, results are frame indices in ascending order of their value.
+
+		Parameters:
+		* values (arraylike): Value of each frame
+		* files (sequence of FileInfo, optional): The frames, needed by select()
+	'''
+	values : NDArray
+	order : NDArray
+	files : Optional[List[FileInfo]]
+
+	def __init__(self, values : ArrayLike, files : Optional[Sequence[FileInfo]] = None) -> None:
+		self.values = np.asarray(values, dtype= np.float64).ravel()
+		assert files is None or len(files) == len(self.values), 'There must be a value for every file'
+		self.files = list(files) if files is not None else None
+		known = np.flatnonzero(np.isfinite(self.values))
+		self.order = known[np.argsort(self.values[known], kind= 'stable')]
+		self._sorted = self.values[self.order]
+
+	@classmethod
+	def from_files(cls, files : Sequence[FileInfo], midpoint : bool = True) -> TimeIndex:
+		''' Index of the files by their Julian date, see frame_times()'''
+		return cls(frame_times(files, midpoint), files)
+
+	def __len__(self) -> int:
+		return len(self.order)
+
+	@property
+	def span(self) -> Tuple[float, float]:
+		''' The first and last values'''
+		assert len(self) > 0, 'The index is empty'
+		return float(self._sorted[0]), float(self._sorted[-1])
+
+	def bounds(self, start : float, stop : float) -> Tuple[int, int]:
+		''' Positions in the sorted order of the frames with start <= value < stop'''
+		return int(np.searchsorted(self._sorted, start, 'left')), int(np.searchsorted(self._sorted, stop, 'left'))
+
+	def range(self, start : float, stop : float) -> NDArray:
+		''' Indices of the frames with start <= value < stop'''
+		lo, hi = self.bounds(start, stop)
+		return self.order[lo:hi]
+
+	def count(self, start : float, stop : float) -> int:
+		''' Number of frames with start <= value < stop'''
+		lo, hi = self.bounds(start, stop)
+		return hi - lo
+
+	def nearest(self, value : float | ArrayLike) -> int | NDArray:
+		''' Index of the frame closest to each value'''
+		assert len(self) > 0, 'The index is empty'
+		target = np.asarray(value, dtype= np.float64)
+		right = np.clip(np.searchsorted(self._sorted, target), 1, max(len(self) - 1, 1))
+		left = right - 1
+		closest = np.where(np.abs(self._sorted[right] - target) < np.abs(target - self._sorted[left]), right, left)
+		result = self.order[closest]
+		return int(result) if result.ndim == 0 else result
+
+	def split(self, edges : ArrayLike) -> List[NDArray]:
+		''' Indices of the frames in each window [edges[i], edges[i + 1]) of an ascending sequence of edges'''
+		positions = np.searchsorted(self._sorted, np.asarray(edges, dtype= np.float64), 'left')
+		return [self.order[lo:hi] for lo, hi in zip(positions[:-1], positions[1:])]
+
+	def windows(self, width : float, step : Optional[float] = None) -> List[NDArray]:
+		''' Indices of the frames in consecutive windows of the given width (every step, default: width) from the first value'''
+		first, last = self.span
+		step = step if step else width
+		assert width > 0 and step > 0, 'The width and step must be greater than zero'
+		starts = first + step * np.arange(int((last - first) // step) + 1)
+		lo = np.searchsorted(self._sorted, starts, 'left')
+		hi = np.searchsorted(self._sorted, starts + width, 'left')
+		return [self.order[a:b] for a, b in zip(lo, hi)]
+
+	def select(self, start : float, stop : float) -> FileList:
+		''' The files with start <= value < stop, in order'''
+		assert self.files is not None, 'The index was not built with files'
+		return FileList( *[self.files[i] for i in self.range(start, stop)])
+
+	def __repr__(self) -> str:
+		if len(self) == 0:
+			return f'{type(self).__name__} (empty)'
+		first, last = self.span
+		return f'{type(self).__name__} ({len(self)} frames, {first:.6f} - {last:.6f})'
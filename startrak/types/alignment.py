@@ -0,0 +1,265 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import hashlib
+import math
+import os
+from threading import local
+from typing import Dict, List, Optional, Self, Sequence, Tuple
+import numpy as np
+from startrak.native import FileInfo, MotionModel, Position, Session, Star, StarList, Tracker, TrackingSolution
+from startrak.native.ext import AttrDict, _register_class, spaces
+from startrak.native.utils.transformutils import compose
+
+__all__ = ['AlignmentTable', 'SessionAlignment', 'file_signature']
+
+_REFERENCE = -1		# Keyframe column of the frames tracked directly against the session stars
+_COLUMNS = 5
+
+def file_signature(file : FileInfo) -> str:
+	''' Returns a string that changes whenever the file is modified (size and modification time), or an empty string if it cannot be read'''
+	try:
+		st = os.stat(file.path)
+	except OSError:
+		return ''
+	return f'{st.st_size}-{st.st_mtime_ns}'
+
+def _row(solution : TrackingSolution, keyframe : int) -> Tuple[float, ...]:
+	matrix = solution.rotation_matrix
+	return (solution.translation.x, solution.translation.y, math.atan2(matrix.c, matrix.a), solution.error, float(keyframe))
+
+def _parameters(obj : object, nested : bool = False) -> List[Tuple]:
+	# Scalar attributes of the tracker (public only, private ones may hold its model) and of the objects it holds (all of them, e.g. detectors)
+	params = list[Tuple]()
+	for key, value in sorted(vars(obj).items()):
+		if isinstance(value, (int, float, str, bool, tuple, type(None))):
+			if nested or not key.startswith('_'):
+				params.append((key, value))
+		elif not nested and hasattr(value, '__dict__') and not callable(value) and not isinstance(value, MotionModel):
+			params.append((key, type(value).__qualname__, _parameters(value, True)))
+	return params
+
+class AlignmentTable:
+	'''
+		Tracking solutions of the files of a session, stored in a (F, 5) array with one row per file:
+		translation x, translation y, rotation in radians, error in pixels and the keyframe used (index in `keyframes`, -1 for the session stars).
+		Files that could not be aligned are filled with NaN.
+	'''
+	name : str
+	names : List[str]
+	signatures : List[str]
+	keyframes : List[str]
+	model_key : str
+	data : np.ndarray
+
+	def __init__(self, names : List[str], signatures : List[str], keyframes : List[str], model_key : str, data : np.ndarray) -> None:
+		assert len(names) == len(signatures) == len(data), 'Names, signatures and data must have the same length'
+		self.name = 'alignment'
+		self.names = names
+		self.signatures = signatures
+		self.keyframes = keyframes
+		self.model_key = model_key
+		self.data = np.asarray(data, dtype= np.float64).reshape(-1, _COLUMNS)
+		self._index = {name : i for i, name in enumerate(names)}
+
+	def __len__(self) -> int:
+		return len(self.names)
+	def __contains__(self, file : FileInfo | str) -> bool:
+		return (file if isinstance(file, str) else file.name) in self._index
+
+	def index(self, file : FileInfo | str) -> int:
+		return self._index[file if isinstance(file, str) else file.name]
+
+	def get(self, file : FileInfo | str) -> Optional[TrackingSolution]:
+		''' Returns the solution of a file (by name or FileInfo), or None if the file could not be aligned'''
+		tx, ty, rotation, error, _ = self.data[self.index(file)]
+		if math.isnan(tx):
+			return None
+		return TrackingSolution.new('alignment', Position(float(tx), float(ty)), float(rotation), float(error))
+
+	def solutions(self) -> List[Optional[TrackingSolution]]:
+		return [self.get(name) for name in self.names]
+
+	def matrices(self) -> np.ndarray:
+		''' Returns the (F, 3, 3) homogeneous matrices of every file, see startrak.native.utils.transformutils'''
+		cos, sin = np.cos(self.data[:, 2]), np.sin(self.data[:, 2])
+		out = np.zeros((len(self.data), 3, 3))
+		out[:, 0, 0], out[:, 0, 1], out[:, 0, 2] = cos, -sin, self.data[:, 0]
+		out[:, 1, 0], out[:, 1, 1], out[:, 1, 2] = sin, cos, self.data[:, 1]
+		out[:, 2, 2] = 1
+		return out
+
+	def __export__(self) -> AttrDict:
+		return {
+			'names' : self.names,
+			'signatures' : self.signatures,
+			'keyframes' : self.keyframes,
+			'model_key' : self.model_key,
+			'data' : [[None if math.isnan(v) else v for v in row] for row in self.data.tolist()] }
+
+	@classmethod
+	def __import__(cls, attributes : AttrDict, **cls_kw) -> Self:
+		data = np.array([[math.nan if v is None else v for v in row] for row in attributes['data']], dtype= np.float64)
+		return cls(attributes['names'], attributes['signatures'], attributes['keyframes'], attributes['model_key'], data)
+
+	def __pprint__(self, indent : int, fold : int) -> str:
+		aligned = int(np.count_nonzero(~np.isnan(self.data[:, 0])))
+		if fold == 0:
+			return type(self).__name__ + f': {aligned}/{len(self)} files'
+		indentation = spaces * (2*indent + 1)
+		string = [spaces * (2*indent) + type(self).__name__ + ':'
+					,indentation + f'files:     {len(self)}'
+					,indentation + f'aligned:   {aligned}'
+					,indentation + f'keyframes: {", ".join(self.keyframes)}']
+		if indent != 0:
+			string.insert(0, '')
+		return '\n'.join(string)
+
+	def __str__(self) -> str:
+		return self.__pprint__(0, 1)
+	def __repr__(self) -> str:
+		return self.__pprint__(0, 0)
+_register_class(AlignmentTable)
+
+class SessionAlignment:
+	'''
+		Aligns every file of a session to the session stars and stores the solutions in `session.alignment` (an AlignmentTable),
+		which is saved and loaded along with the session.
+
+		Frames are not chained one after another: a few keyframes are aligned to the session stars first,
+		then every other frame is tracked against the star positions of its nearest keyframe, so each solution is the composition
+		of two transforms at most and errors do not accumulate along the sequence.
+		Frames are processed in parallel by a pool of threads, each with its own copy of the tracker.
+		When run again, only the files that were added or modified (or whose keyframe was modified) are tracked,
+		every solution is recomputed if the tracker parameters or the session stars change.
+
+		Parameters:
+		* tracker (Tracker): Tracker used to align the frames, it is copied for every thread and keyframe so it should not depend on the order of the frames.
+		* keyframes (int or sequence of str/int): Number of keyframes evenly spaced along the session files, or the names/indices of the files to use as keyframes. Default: 1 (the middle file).
+		* workers (int): Number of threads, default: os.cpu_count().
+	'''
+	tracker : Tracker
+	keyframes : int | Sequence[str | int]
+	workers : int
+
+	def __init__(self, tracker : Tracker, keyframes : int | Sequence[str | int] = 1, workers : Optional[int] = None) -> None:
+		if isinstance(keyframes, int):
+			assert keyframes >= 1, 'Number of keyframes must be greater or equal than one'
+		else:
+			assert len(keyframes) >= 1, 'At least one keyframe is required'
+		self.tracker = tracker
+		self.keyframes = keyframes
+		self.workers = workers if workers else (os.cpu_count() or 1)
+		assert self.workers >= 1, 'Number of workers must be greater or equal than one'
+
+	def keyframe_indices(self, files : Sequence[FileInfo]) -> List[int]:
+		''' Returns the sorted indices of the keyframes among the given files'''
+		if isinstance(self.keyframes, int):
+			count = min(self.keyframes, len(files))
+			return sorted({int((k + 0.5) * len(files) / count) for k in range(count)})
+		names = [file.name for file in files]
+		return sorted({names.index(k) if isinstance(k, str) else int(k) % len(files) for k in self.keyframes})
+
+	def model_key(self, stars : StarList) -> str:
+		''' Returns a hash of the tracker type, its public parameters (and those of the objects it holds, like its detector) and the session stars'''
+		stars_key = [(star.name, tuple(star.position), star.aperture) for star in stars]
+		return hashlib.sha1(repr((type(self.tracker).__qualname__, _parameters(self.tracker), stars_key)).encode()).hexdigest()
+
+	def run(self, session : Session, force : bool = False) -> AlignmentTable:
+		''' Aligns the files of the session that are not aligned yet (or all of them if force is True) and returns the updated table'''
+		files = list(session.included_files)
+		stars = session.included_stars
+		key = self.model_key(stars)
+		signatures = [file_signature(file) for file in files]
+		current = dict(zip([file.name for file in files], signatures))
+
+		previous = session.alignment if isinstance(session.alignment, AlignmentTable) else None
+		if force or previous is None or previous.model_key != key:
+			previous = None
+
+		keyframes = self.keyframe_indices(files) if files else []
+		names = [files[k].name for k in keyframes]
+		data = np.full((len(files), _COLUMNS), np.nan)
+		pending = list[int]()
+		for i, file in enumerate(files):
+			row = self._reusable(previous, file.name, current, is_keyframe= i in keyframes)
+			if row is None:
+				pending.append(i)
+				continue
+			data[i] = row
+			if row[4] != _REFERENCE:
+				assert previous is not None
+				keyframe = previous.keyframes[int(row[4])]
+				if keyframe not in names:
+					names.append(keyframe)
+				data[i, 4] = names.index(keyframe)
+
+		if pending:
+			nearest = {i : min(keyframes, key= lambda k: abs(k - i)) for i in pending}
+			self._align(files, stars, keyframes, nearest, data)
+			print(f'{len(pending)} of {len(files)} files aligned')
+
+		table = AlignmentTable([file.name for file in files], signatures, names, key, data)
+		session.alignment = table
+		return table
+
+	def _reusable(self, previous : Optional[AlignmentTable], name : str, current : Dict[str, str], is_keyframe : bool) -> Optional[np.ndarray]:
+		if previous is None or name not in previous:
+			return None
+		i = previous.index(name)
+		row = previous.data[i]
+		if previous.signatures[i] != current[name] or math.isnan(row[0]):
+			return None
+		if row[4] == _REFERENCE:
+			return row.copy()
+		if is_keyframe:
+			return None
+		keyframe = previous.keyframes[int(row[4])]
+		if keyframe not in previous or previous.signatures[previous.index(keyframe)] != current.get(keyframe):
+			return None
+		return row.copy()
+
+	@staticmethod
+	def _solution(row : np.ndarray) -> TrackingSolution:
+		return TrackingSolution.new('keyframe', Position(float(row[0]), float(row[1])), float(row[2]), float(row[3]))
+
+	def _align(self, files : List[FileInfo], stars : StarList, keyframes : List[int], nearest : Dict[int, int], data : np.ndarray):
+		state = local()
+		models : Dict[int, StarList] = {_REFERENCE : stars}
+
+		def track(i : int, keyframe : int) -> Optional[TrackingSolution]:
+			trackers : Dict[int, Tracker] = state.__dict__.setdefault('trackers', {})
+			if keyframe not in trackers:
+				tracker = copy.deepcopy(self.tracker)
+				tracker.setup_model(models[keyframe])
+				trackers[keyframe] = tracker
+			try:
+				return trackers[keyframe].track(files[i].context.data)
+			except (OSError, ValueError, RuntimeError, AssertionError) as e:
+				print(f'Unable to align "{files[i].name}": {e}')
+				return None
+
+		with ThreadPoolExecutor(self.workers, thread_name_prefix= 'alignment') as executor:
+			# Keyframes are aligned to the session stars, unless their solution is already known
+			required = sorted(set(nearest.values()))
+			missing = [k for k in required if math.isnan(data[k, 0]) or data[k, 4] != _REFERENCE]
+			for k, solution in zip(missing, executor.map(lambda k: track(k, _REFERENCE), missing)):
+				data[k] = _row(solution, _REFERENCE) if solution is not None else np.nan
+			for k in required:
+				if math.isnan(data[k, 0]):
+					continue
+				solution = self._solution(data[k])
+				positions = solution.transform_array([tuple(star.position) for star in stars])
+				models[k] = StarList( *[Star(star.name, (float(x), float(y)), star.aperture, star.photometry)
+											for star, (x, y) in zip(stars, positions)])
+
+			frames = [(i, k) for i, k in nearest.items() if i != k and k in models]
+			for (i, k), solution in zip(frames, executor.map(lambda item: track(*item), frames)):
+				if solution is None:
+					continue
+				keyframe = self._solution(data[k])
+				combined = TrackingSolution.from_matrix('alignment', compose(keyframe.matrix, solution.matrix), math.hypot(keyframe.error, solution.error))
+				data[i] = _row(combined, keyframes.index(k))
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} ({type(self.tracker).__name__}, keyframes= {self.keyframes}, workers= {self.workers})'
@@ -1,12 +1,70 @@
 
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Dict, List, Literal, Tuple, Type
 
-import cv2
-from startrak.imageutils import sigma_stretch
+import numpy as np
+from startrak.framecontext import find_context
+from startrak.imageutils import background_mesh, frame_stats, gaussian_kernel, separable_filter, sigma_stretch
 from startrak.native import StarDetector
 from startrak.native.alias import ImageLike
 from startrak.native import PositionArray
 
+__all__ = ['HoughCircles', 'AdaptiveHoughCircles', 'ThresholdHoughCircles', 'LocalMaxima', 'TiledDetector', 'DetectionMethod', 'get_detector']
+DetectionMethod = Literal['hough', 'hough_adaptive', 'hough_threshold', 'local_maxima']
+
+def _circles(circles : np.ndarray | None) -> Tuple[PositionArray, List[float]]:
+	# cv2.HoughCircles returns None when nothing is found
+	if circles is None:
+		return PositionArray(), []
+	return PositionArray(*circles[0][:, :2]), circles[0][:, 2].tolist()
+
+def _close_pairs(points : np.ndarray, distance : float) -> Tuple[np.ndarray, np.ndarray]:
+	# Pairs (i, j), i < j, of points closer than distance. Points are binned in a grid of distance sized cells,
+	# so only the pairs within a cell and with the forward half of its 3x3 neighborhood are compared
+	cells = np.floor(points / distance).astype(np.int64)
+	cells -= cells.min(axis= 0) - 1
+	width = int(cells[:, 1].max()) + 2
+	order = np.argsort(cells[:, 0] * width + cells[:, 1], kind= 'stable')
+	key = (cells[:, 0] * width + cells[:, 1])[order]
+	first, second = list[np.ndarray](), list[np.ndarray]()
+	for offset in (0, 1, width - 1, width, width + 1):
+		lo = np.searchsorted(key, key + offset, 'left')
+		counts = np.searchsorted(key, key + offset, 'right') - lo
+		total = int(counts.sum())
+		if total == 0:
+			continue
+		a = np.repeat(np.arange(len(key)), counts)
+		b = np.arange(total) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+		if offset == 0:
+			a, b = a[a < b], b[a < b]
+		i, j = order[a], order[b]
+		close = ((points[i] - points[j]) ** 2).sum(axis= 1) < distance ** 2
+		first.append(np.minimum(i, j)[close]); second.append(np.maximum(i, j)[close])
+	if not first:
+		return np.empty(0, dtype= np.intp), np.empty(0, dtype= np.intp)
+	return np.concatenate(first), np.concatenate(second)
+
+def _suppress_close(points : np.ndarray, distance : float, limit : int | None = None) -> np.ndarray:
+	'''
+		Greedy non maximum suppression: drops every point closer than distance to a kept point that comes before it.
+		Points are given in order of priority, (n, 2), returns the indices of the kept points in that order (at most limit of them).
+	'''
+	n = len(points)
+	if n == 0 or distance <= 0:
+		return np.arange(n)[:limit]
+	earlier, later = _close_pairs(points, distance)
+	# 1: kept, -1: dropped, 0: undecided. A point is kept once all the points close to it that come before are dropped,
+	# the first undecided point is always kept so every pass decides at least one point
+	state = np.zeros(n, dtype= np.int8)
+	while len(later):
+		blocked = np.bincount(later[state[earlier] >= 0], minlength= n)
+		state[(state == 0) & (blocked == 0)] = 1
+		state[later[state[earlier] == 1]] = -1
+		pending = state[later] == 0
+		earlier, later = earlier[pending], later[pending]
+	state[state == 0] = 1
+	return np.flatnonzero(state == 1)[:limit]
 
 class HoughCircles(StarDetector):
 	_sigma : float
@@ -37,14 +95,26 @@ class HoughCircles(StarDetector):
 		self._p2 = param2
 		self._dp = dp
 	
+	def _stretched(self, image : ImageLike) -> np.ndarray:
+		# Stretched and blurred image, shared through the frame context if the image has one
+		import cv2
+		context = find_context(image)
+		def compute() -> np.ndarray:
+			img = context.stretched(self._sigma) if context is not None else sigma_stretch(image, sigma= self._sigma)
+			if self._ksize is not None:
+				img = cv2.GaussianBlur(img, self._ksize, 0)
+			return img
+		if context is None:
+			return compute()
+		return context.get(('hough', self._sigma, self._ksize), compute)
+
 	def _detect(self, image : ImageLike) -> Tuple[PositionArray, List[float]]:
-		img = sigma_stretch(image, sigma= self._sigma)
-		if self._ksize is not None:
-			img = cv2.GaussianBlur(img, self._ksize, 0)
+		import cv2
+		img = self._stretched(image)
 
 		circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
 										minDist= self._min_dst, param1= self._p1, param2= self._p2, minRadius= self._min_size, maxRadius= self._max_size)
-		return PositionArray(*circles[0][:, :2]), circles[0][:, 2].tolist()
+		return _circles(circles)
 	
 class AdaptiveHoughCircles(HoughCircles):
 	_block_size : int
@@ -58,14 +128,13 @@ class AdaptiveHoughCircles(HoughCircles):
 		super().__init__(**kwargs)
 
 	def _detect(self, image : ImageLike) -> Tuple[PositionArray, List[float]]:
-		img = sigma_stretch(image, sigma= self._sigma)
-		if self._ksize is not None:
-			img = cv2.GaussianBlur(img, self._ksize, 0)
+		import cv2
+		img = self._stretched(image)
 		img = cv2.adaptiveThreshold(img, 
 											255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, blockSize= self._block_size, C= self._threshold)
 		circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
 										minDist= self._min_dst, param1= self._p1, param2= self._p2, minRadius= self._min_size, maxRadius= self._max_size)
-		return PositionArray(*circles[0][:, :2]), circles[0][:, 2].tolist()
+		return _circles(circles)
 
 class ThresholdHoughCircles(HoughCircles):
 	_threshold : int
@@ -76,11 +145,211 @@ class ThresholdHoughCircles(HoughCircles):
 		super().__init__(**kwargs)
 
 	def _detect(self, image : ImageLike) -> Tuple[PositionArray, List[float]]:
-		img = sigma_stretch(image, sigma= self._sigma)
-		if self._ksize is not None:
-			img = cv2.GaussianBlur(img, self._ksize, 0)
+		import cv2
+		img = self._stretched(image)
 		_, img = cv2.threshold(img, self._threshold, 255, cv2.THRESH_BINARY+cv2.THRESH_OTSU)
 		circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
 										minDist= self._min_dst, param1= self._p1, param2= self._p2, minRadius= self._min_size, maxRadius= self._max_size)
-		return PositionArray(*circles[0][:, :2]), circles[0][:, 2].tolist()
-	
+		return _circles(circles)
+
+class LocalMaxima(StarDetector):
+	'''
+		Detects stars as local maxima of the smoothed image above the background level plus `threshold` times its noise.
+
+		The image is processed in its native range (no 8 bit stretch): it is smoothed with a gaussian kernel matching the expected
+		star size, the peaks closer than `min_dst` to a brighter one are discarded and each remaining peak is refined to sub-pixel
+		precision with the intensity weighted centroid of the raw data, the aperture radius is estimated from the second moments.
+
+		Parameters:
+		* threshold (float): Detection threshold in units of the background standard deviation (of the smoothed image).
+		* fwhm (float): Expected full width at half maximum of the stars in pixels, sets the smoothing kernel and the centroid window.
+		* min_dst (float): Minimum distance between two detected stars.
+		* min_radius, max_radius (int): Limits of the estimated aperture radius.
+		* border (int): Peaks closer than this to the edges are ignored, default: the centroid window size.
+		* max_stars (int): Keep only the brightest detections, default: all of them.
+		* mesh (int): Size of the background mesh cells, if given the local background (see imageutils.BackgroundMesh) is subtracted
+			instead of a global level, which keeps the threshold uniform over gradients. Default: global background.
+	'''
+	_threshold : float
+	_fwhm : float
+	_min_dst : float
+	_min_size : int
+	_max_size : int
+	_border : int
+	_max_stars : int | None
+	_mesh : int | None
+	_kernel : np.ndarray
+
+	def __init__(self, *, threshold= 5.0, fwhm= 4.0, min_dst= 8, min_radius= 2, max_radius= 16, 
+					border : int | None = None, max_stars : int | None = None, mesh : int | None = None) -> None:
+		assert threshold > 0, "threshold must be greater than zero"
+		self._threshold = threshold
+		assert fwhm > 0, "fwhm must be greater than zero"
+		self._fwhm = fwhm
+		assert min_dst >= 0, "min_dst must be a positive number"
+		self._min_dst = min_dst
+		assert min_radius > 0, "min_radius must be greater than zero"
+		assert max_radius >= min_radius, "max_radius must be greater or equal than min_radius"
+		self._min_size = min_radius
+		self._max_size = max_radius
+		assert max_stars is None or max_stars > 0, "max_stars must be greater than zero"
+		self._max_stars = max_stars
+		assert mesh is None or mesh >= 2, "mesh must be greater or equal than two"
+		self._mesh = mesh
+		self._window = max(int(np.ceil(fwhm)), 2)
+		self._border = self._window if border is None else max(border, self._window)
+		self._kernel = gaussian_kernel(fwhm / 2.3548, truncate= 2.0)
+
+	@staticmethod
+	def _background(image : np.ndarray, cache : bool = True) -> Tuple[float, float]:
+		# Median and MAD based sigma, see frame_stats
+		stats = frame_stats(image, samples= 1 << 16, cache= cache)
+		return stats.median, stats.sigma
+
+	def _peaks(self, smooth : np.ndarray, level : float) -> Tuple[np.ndarray, np.ndarray]:
+		b = self._border
+		rows, cols = smooth.shape
+		# Flat indices of the contiguous array, much faster to search than the 2D indices of the inner view
+		flat = np.ravel(smooth)
+		index = np.flatnonzero(flat > level)
+		y, x = np.divmod(index, cols)
+		index = index[(y >= b) & (y < rows - b) & (x >= b) & (x < cols - b)]
+		# 3x3 local maxima, only the pixels above the threshold are compared
+		values = flat[index]
+		peak = np.ones(len(index), dtype= bool)
+		for offset in (-cols - 1, -cols, -cols + 1, -1, 1, cols - 1, cols, cols + 1):
+			peak &= values >= flat[index + offset]
+		index = index[peak]
+		order = np.argsort(values[peak])[::-1]
+		y, x = np.divmod(index[order], cols)
+		return y, x
+
+	def _suppress(self, y : np.ndarray, x : np.ndarray) -> np.ndarray:
+		# Peaks closer than min_dst to a brighter one are dropped, peaks are sorted by brightness
+		return _suppress_close(np.column_stack((x, y)).astype(np.float64), self._min_dst, self._max_stars)
+
+	def _detect(self, image : ImageLike) -> Tuple[PositionArray, List[float]]:
+		data = np.asarray(image)
+		if data.shape[0] <= 2 * self._border or data.shape[1] <= 2 * self._border:
+			return PositionArray(), []
+		dtype = np.float64 if data.dtype == np.float64 else np.float32
+		context = find_context(image)
+		smooth = context.smoothed(self._kernel, dtype) if context is not None else separable_filter(data, self._kernel, dtype)
+		if self._mesh:
+			mesh = context.background(self._mesh) if context is not None else background_mesh(data, self._mesh)
+			smooth = smooth - mesh.map()
+		median, sigma = self._background(smooth, cache= False)
+		y, x = self._peaks(smooth, median + self._threshold * sigma)
+		if len(y) == 0:
+			return PositionArray(), []
+		keep = self._suppress(y, x)
+		y, x = y[keep], x[keep]
+
+		# Centroid and second moments over a (2w+1)^2 window of the raw data above the background
+		w = self._window
+		offsets = np.arange(-w, w + 1)
+		rows = y[:, None, None] + offsets[None, :, None]
+		cols = x[:, None, None] + offsets[None, None, :]
+		if self._mesh:
+			threshold = (mesh.at(x, y) + mesh.rms_at(x, y))[:, None, None]
+		else:
+			threshold = np.asarray(sum(self._background(data)))
+		weights = np.clip(data[rows, cols].astype(dtype) - threshold, 0, None)
+		weights[~np.isfinite(weights)] = 0
+		total = weights.sum(axis= (1, 2))
+		total[total == 0] = 1
+		dy = (weights * offsets[None, :, None]).sum(axis= (1, 2)) / total
+		dx = (weights * offsets[None, None, :]).sum(axis= (1, 2)) / total
+		var = (weights * ((offsets[None, :, None] - dy[:, None, None]) ** 2 
+									+ (offsets[None, None, :] - dx[:, None, None]) ** 2)).sum(axis= (1, 2)) / total
+		radius = np.clip(np.round(3 * np.sqrt(var / 2)), self._min_size, self._max_size)
+		
+		positions = np.column_stack((x + dx, y + dy))
+		return PositionArray(*positions.tolist()), radius.tolist()
+
+class TiledDetector(StarDetector):
+	'''
+		Runs another detector over overlapping tiles of the image in a thread pool (NumPy and OpenCV release the GIL).
+
+		Detections are merged through a spatial hash: when two detections are closer than `merge_distance`
+		the one lying farther from the edges of its tile is kept.
+
+		Parameters:
+		* detector (StarDetector): Detector applied to each tile.
+		* tile_size (int): Size of the tiles (without overlap) in pixels.
+		* overlap (int): Number of pixels each tile extends over its neighbors, should be larger than the stars and the detector border.
+		* workers (int): Number of threads, default: the number of CPUs.
+		* merge_distance (float): Distance below which two detections are considered the same star.
+	'''
+	detector : StarDetector
+	tile_size : int
+	overlap : int
+	workers : int
+	merge_distance : float
+
+	def __init__(self, detector : StarDetector, *, tile_size= 1024, overlap= 32, workers : int | None = None, merge_distance= 4.0) -> None:
+		assert isinstance(detector, StarDetector), "detector must be a StarDetector"
+		assert tile_size > 0, "tile_size must be greater than zero"
+		assert overlap >= 0, "overlap must be a positive number"
+		assert merge_distance > 0, "merge_distance must be greater than zero"
+		self.detector = detector
+		self.tile_size = tile_size
+		self.overlap = overlap
+		self.workers = workers if workers else (os.cpu_count() or 1)
+		self.merge_distance = merge_distance
+
+	def tiles(self, shape : Tuple[int, ...]) -> List[Tuple[int, int, int, int]]:
+		''' Returns the (row_start, row_end, col_start, col_end) bounds of every tile, including the overlap'''
+		bounds = list[Tuple[int, int, int, int]]()
+		for r in range(0, shape[0], self.tile_size):
+			for c in range(0, shape[1], self.tile_size):
+				bounds.append((max(r - self.overlap, 0), min(r + self.tile_size + self.overlap, shape[0]),
+									max(c - self.overlap, 0), min(c + self.tile_size + self.overlap, shape[1])))
+		return bounds
+
+	def _detect_tile(self, image : ImageLike, bounds : Tuple[int, int, int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+		r0, r1, c0, c1 = bounds
+		positions, radii = self.detector._detect(image[r0:r1, c0:c1])
+		if len(positions) == 0:
+			return np.empty((0, 2)), np.empty(0), np.empty(0)
+		local = np.array([(p.x, p.y) for p in positions], dtype= float)
+		# Distance to the closest tile edge that is not an image edge
+		shape = image.shape
+		inf = np.full(len(local), np.inf)
+		edges = np.column_stack((local[:, 0] if c0 > 0 else inf, (c1 - c0) - local[:, 0] if c1 < shape[1] else inf,
+										local[:, 1] if r0 > 0 else inf, (r1 - r0) - local[:, 1] if r1 < shape[0] else inf))
+		return local + (c0, r0), np.asarray(radii, dtype= float), edges.min(axis= 1)
+
+	def _merge(self, positions : np.ndarray, edges : np.ndarray) -> np.ndarray:
+		# Duplicates found by overlapping tiles are merged, keeping the detection farthest from the edges of its tile
+		priority = np.argsort(-edges, kind= 'stable')
+		return np.sort(priority[_suppress_close(positions[priority], self.merge_distance)])
+
+	def _detect(self, image : ImageLike) -> Tuple[PositionArray, List[float]]:
+		bounds = self.tiles(image.shape)
+		if len(bounds) == 1 or self.workers == 1:
+			results = [self._detect_tile(image, b) for b in bounds]
+		else:
+			with ThreadPoolExecutor(min(self.workers, len(bounds))) as pool:
+				results = list(pool.map(lambda b: self._detect_tile(image, b), bounds))
+		positions = np.concatenate([r[0] for r in results])
+		if len(positions) == 0:
+			return PositionArray(), []
+		radii = np.concatenate([r[1] for r in results])
+		keep = self._merge(positions, np.concatenate([r[2] for r in results]))
+		return PositionArray(*positions[keep].tolist()), radii[keep].tolist()
+
+_DETECTORS : Dict[str, Type[StarDetector]] = {
+	'hough' : HoughCircles,
+	'hough_adaptive' : AdaptiveHoughCircles,
+	'hough_threshold' : ThresholdHoughCircles,
+	'local_maxima' : LocalMaxima,
+}
+
+def get_detector(method : DetectionMethod | StarDetector, **detector_args) -> StarDetector:
+	''' Returns a detector instance from its method name, detector instances are returned unchanged'''
+	if isinstance(method, StarDetector):
+		return method
+	if method not in _DETECTORS:
+		raise ValueError(f'Unsupported detection method "{method}", available options are {", ".join(_DETECTORS)}')
+	return _DETECTORS[method](**detector_args)
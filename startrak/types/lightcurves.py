@@ -0,0 +1,94 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from startrak.native import Star
+from startrak.native.alias import ArrayLike, NDArray
+from startrak.timeaxis import frame_times
+from startrak.types.pipeline import FrameResult
+if TYPE_CHECKING:
+	from startrak.folding import FoldedCurves
+
+__all__ = ['LightCurves']
+
+class LightCurves(NamedTuple):
+	'''
+		Columnar light curves of a set of stars: one row per frame and one column per star.
+		Missing measurements (lost stars, zero or negative fluxes) are NaN.
+	'''
+	time : NDArray
+	''' Time of each frame, float64 of shape (n_frames,)'''
+	flux : NDArray
+	''' Flux of each star in each frame, float64 of shape (n_frames, n_stars)'''
+	error : NDArray
+	''' Flux uncertainty, same shape as flux'''
+	names : Tuple[str, ...]
+	''' Name of each star (column)'''
+
+	@classmethod
+	def new(cls, time : ArrayLike, flux : ArrayLike, error : Optional[ArrayLike] = None, names : Optional[Sequence[str]] = None) -> LightCurves:
+		''' Validates and converts the arrays, a 1D flux is a single star. Default error: NaN (unknown), default names: star_0, star_1...'''
+		flux = np.array(flux, dtype= np.float64, ndmin= 1)
+		if flux.ndim == 1:
+			flux = flux[:, None]
+		time = np.array(time, dtype= np.float64, ndmin= 1)
+		error = np.full(flux.shape, np.nan) if error is None else np.array(error, dtype= np.float64).reshape(flux.shape)
+		assert flux.ndim == 2 and time.shape == (flux.shape[0],), 'There must be a time for every frame (row) of the fluxes'
+		names = tuple(names) if names is not None else tuple(f'star_{i}' for i in range(flux.shape[1]))
+		assert len(names) == flux.shape[1], 'There must be a name for every star (column) of the fluxes'
+		return cls(time, flux, error, names)
+
+	@classmethod
+	def from_results(cls, results : Sequence[FrameResult], stars : Sequence[Star | str], time : Optional[ArrayLike] = None) -> LightCurves:
+		'''
+			Gathers the photometry of pipeline results into light curves.
+
+			Parameters:
+			- results (sequence of FrameResult): One result per frame, the photometry in the order of the stars
+			- stars (sequence of Star or str): The stars measured (the included stars of the session when the pipeline was started)
+			- time (arraylike, optional): Time of each result, default: the Julian date of the middle of the exposure of each frame (see timeaxis.frame_times), or the index of the result if the headers have no dates
+		'''
+		names = [star if isinstance(star, str) else star.name for star in stars]
+		flux = np.full((len(results), len(names)), np.nan)
+		error = np.full((len(results), len(names)), np.nan)
+		for i, result in enumerate(results):
+			assert len(result.photometry) == len(names), f'The result of "{result.file.name}" does not have a measurement for every star'
+			flux[i] = [phot.flux.value for phot in result.photometry]
+			error[i] = [phot.error for phot in result.photometry]
+		flux[~(flux > 0)] = np.nan
+		if time is None:
+			time = frame_times([result.file for result in results])
+			if not np.isfinite(time).any():
+				print('The frames have no observation dates, the light curves use the frame index as time')
+				time = np.arange(len(results))
+		return cls.new(time, flux, error, names)
+
+	@property
+	def shape(self) -> Tuple[int, int]:
+		''' (n_frames, n_stars)'''
+		return self.flux.shape[0], self.flux.shape[1]
+
+	def column(self, star : Star | str) -> int:
+		''' Column of a star'''
+		return self.names.index(star if isinstance(star, str) else star.name)
+
+	def select(self, stars : Optional[Sequence[Star | str | int]] = None, frames : Optional[ArrayLike] = None) -> LightCurves:
+		''' Subset of the stars (names or columns) and of the frames (indices or boolean mask)'''
+		time, flux, error, names = self.time, self.flux, self.error, self.names
+		if frames is not None:
+			rows = np.asarray(frames)
+			time, flux, error = time[rows], flux[rows], error[rows]
+		if stars is not None:
+			columns = [s if isinstance(s, int) else self.column(s) for s in stars]
+			flux, error = flux[:, columns], error[:, columns]
+			names = tuple(self.names[c] for c in columns)
+		return LightCurves(time, flux, error, names)
+
+	def fold(self, period : float | ArrayLike, n_bins : int = 20, epoch : Optional[float] = None) -> FoldedCurves:
+		''' Phase folded and binned light curves, see folding.fold()'''
+		from startrak.folding import fold
+		return fold(self, period, n_bins, epoch)
+
+	def sorted(self) -> LightCurves:
+		''' The light curves in chronological order'''
+		order = np.argsort(self.time, kind= 'stable')
+		return LightCurves(self.time[order], self.flux[order], self.error[order], self.names)
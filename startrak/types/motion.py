@@ -0,0 +1,127 @@
+from __future__ import annotations
+from collections import deque
+import math
+from typing import Deque, Optional, Tuple
+import numpy as np
+from startrak.native import MotionModel, Position, TrackingSolution
+
+__all__ = ['ConstantVelocity', 'KalmanMotion']
+
+# Solutions are handled as (translation x, translation y, rotation angle in radians)
+def _params(solution : TrackingSolution) -> Tuple[float, float, float]:
+	matrix = solution.rotation_matrix
+	return solution.translation.x, solution.translation.y, math.atan2(matrix.c, matrix.a)
+
+def _solution(params : np.ndarray | Tuple[float, float, float], error : float) -> TrackingSolution:
+	return TrackingSolution.new('prediction', Position(float(params[0]), float(params[1])), float(params[2]), error)
+
+class ConstantVelocity(MotionModel):
+	'''
+		Extrapolates the translation and rotation with a least squares line fitted to the last `history` solutions.
+		The error of the prediction is the RMS residual of the fit plus `min_error` pixels.
+
+		Parameters:
+		* history (int): Number of previous solutions used in the fit, at least two.
+		* min_error (float): Minimum uncertainty of the predictions in pixels.
+	'''
+	history : int
+	min_error : float
+
+	def __init__(self, history : int = 4, min_error : float = 1.0) -> None:
+		assert history >= 2, 'History must be greater or equal than two'
+		assert min_error >= 0, 'Minimum error must be a positive number'
+		self.history = history
+		self.min_error = min_error
+		self._frames : Deque[Tuple[float, Tuple[float, float, float]]] = deque(maxlen= history)
+		self._count = 0
+
+	def update(self, solution : TrackingSolution, time : Optional[float] = None):
+		self._frames.append((float(self._count if time is None else time), _params(solution)))
+		self._count += 1
+
+	def predict(self, time : Optional[float] = None) -> Optional[TrackingSolution]:
+		if len(self._frames) < 2:
+			return None
+		t = np.array([f[0] for f in self._frames])
+		p = np.array([f[1] for f in self._frames])
+		t_next = float(self._count if time is None else time)
+		if np.ptp(t) == 0:
+			return _solution(p[-1], math.inf)
+
+		t0 = t.mean()
+		slope = ((t - t0)[:, None] * (p - p.mean(axis= 0))).sum(axis= 0) / ((t - t0) ** 2).sum()
+		fitted = p.mean(axis= 0) + slope * (t - t0)[:, None]
+		residual = math.sqrt(float(((p[:, :2] - fitted[:, :2]) ** 2).sum(axis= 1).mean()))
+		return _solution(p.mean(axis= 0) + slope * (t_next - t0), residual + self.min_error)
+
+	def reset(self):
+		self._frames.clear()
+		self._count = 0
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} (history= {self.history}, {len(self._frames)} frames)'
+
+class KalmanMotion(MotionModel):
+	'''
+		Kalman filter with a constant velocity model for the translation and the rotation.
+
+		Parameters:
+		* process_noise (float): Acceleration noise in pixels / s^2 (or per frame^2 if no times are given).
+		* measurement_noise (float): Uncertainty of the measured translations in pixels, the error of the solutions is used if it is larger.
+		* initial_velocity_sigma (float): Uncertainty of the initial velocity in pixels / s.
+	'''
+	process_noise : float
+	measurement_noise : float
+
+	def __init__(self, process_noise : float = 0.05, measurement_noise : float = 0.5, initial_velocity_sigma : float = 10.) -> None:
+		assert process_noise > 0, 'Process noise must be greater than zero'
+		assert measurement_noise > 0, 'Measurement noise must be greater than zero'
+		self.process_noise = process_noise
+		self.measurement_noise = measurement_noise
+		self._v0 = initial_velocity_sigma
+		self.reset()
+
+	def reset(self):
+		# One independent [position, velocity] filter per parameter (x, y, angle)
+		self._state = np.zeros((3, 2))
+		self._cov = np.zeros((3, 2, 2))
+		self._time : float | None = None
+		self._count = 0
+
+	def _propagate(self, dt : float) -> Tuple[np.ndarray, np.ndarray]:
+		F = np.array([[1., dt], [0., 1.]])
+		q = self.process_noise ** 2
+		Q = q * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+		# Rotations are in radians, their noise is scaled down accordingly
+		scale = np.array([1., 1., 1e-3])[:, None, None] ** 2
+		state = self._state @ F.T
+		cov = F @ self._cov @ F.T + Q * scale
+		return state, cov
+
+	def update(self, solution : TrackingSolution, time : Optional[float] = None):
+		t = float(self._count if time is None else time)
+		self._count += 1
+		measured = np.array(_params(solution))
+		r = max(self.measurement_noise, solution.error if math.isfinite(solution.error) else 0) ** 2
+		R = np.array([r, r, r * 1e-6])
+		if self._time is None:
+			self._state = np.column_stack((measured, np.zeros(3)))
+			self._cov = np.array([np.diag([R[i], (self._v0 * (1e-3 if i == 2 else 1)) ** 2]) for i in range(3)])
+			self._time = t
+			return
+		state, cov = self._propagate(t - self._time)
+		gain = cov[:, :, 0] / (cov[:, 0, 0] + R)[:, None]
+		innovation = measured - state[:, 0]
+		self._state = state + gain * innovation[:, None]
+		self._cov = cov - gain[:, :, None] * cov[:, None, 0, :]
+		self._time = t
+
+	def predict(self, time : Optional[float] = None) -> Optional[TrackingSolution]:
+		if self._time is None or self._count < 2:
+			return None
+		t = float(self._count if time is None else time)
+		state, cov = self._propagate(t - self._time)
+		return _solution(state[:, 0], math.sqrt(cov[0, 0, 0] + cov[1, 0, 0]))
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} ({self._count} frames)'
@@ -1,5 +1,7 @@
 
 import numpy as np
+from startrak.framecontext import find_context
+from startrak.imageutils import BackgroundMesh, background_mesh
 from startrak.native import PhotometryBase, PhotometryResult
 from startrak.native.alias import ImageLike
 from startrak.native import Position, PositionLike
@@ -18,18 +20,32 @@ def _get_cropped(img : ImageLike, position : Position | PositionLike, aperture:
 			return padded_img[rmin + padr[0] :rmax + padr[1] + padr[0], cmin + padc[0]: cmax + padc[1] + padc[0]]
 		return img[rmin:rmax, cmin:cmax].copy()
 
+def frame_background(img : ImageLike, box : int) -> BackgroundMesh:
+	''' Background mesh of a frame, shared with the other stages through its frame context (or the background_mesh cache)'''
+	context = find_context(img)
+	return context.background(box) if context is not None else background_mesh(img, box)
+
 class AperturePhot(PhotometryBase):
-	''' Aperture photometry with sigma clipping'''
+	'''
+		Aperture photometry with sigma clipping.
+		If mesh is given the background and its noise are interpolated from the background mesh of the frame (see imageutils.BackgroundMesh)
+		instead of measured in an annulus around every star, which is faster and less sensitive to close neighbors.
+	'''
 	width : int
 	offset : int
 	sigma : int
+	mesh : int | None
 
-	def __init__(self, width : int, offset : int, sigma : int = 0) :
+	def __init__(self, width : int, offset : int, sigma : int = 0, mesh : int | None = None) :
+		assert mesh is None or mesh >= 2, 'Mesh size must be greater or equal than two'
 		self.width = width
 		self.offset = offset
 		self.sigma = sigma
+		self.mesh = mesh
 	
 	def evaluate(self, img: ImageLike, position : Position | PositionLike, aperture: int) -> PhotometryResult:
+		if self.mesh:
+			return self._evaluate_mesh(img, position, aperture)
 		_offset = (self.width + self.offset)
 		crop = _get_cropped(img, position, aperture, _offset)
 		_y, _x = np.ogrid[:crop.shape[0], :crop.shape[1]]
@@ -65,3 +81,28 @@ class AperturePhot(PhotometryBase):
 											annulus_width= self.width,
 											annulus_offset= self.offset
 											)
+
+	def _evaluate_mesh(self, img: ImageLike, position : Position | PositionLike, aperture: int) -> PhotometryResult:
+		assert self.mesh is not None
+		mesh = frame_background(img, self.mesh)
+		crop = _get_cropped(img, position, aperture)
+		_y, _x = np.ogrid[:crop.shape[0], :crop.shape[1]]
+		flux_array = crop[(_x - crop.shape[1]/2) **2 + (_y - crop.shape[0]/2) **2 < aperture ** 2]
+		
+		flux_mean = float(np.nanmean(flux_array))
+		bkg_mean = float(mesh.at(position[0], position[1]))
+		bkg_sigma = float(mesh.rms_at(position[0], position[1]))
+		# No background pixels are measured, the maximum is the highest level of the mesh cells around the position
+		bkg_max = float(mesh.max_at(position[0], position[1]))
+		return PhotometryResult.new(flux= 				flux_mean - bkg_mean,
+											flux_sigma= 		float(np.nanstd(flux_array)),
+											flux_raw= 			flux_mean,
+											flux_max= 			float(np.nanmax(flux_array)),
+											background= 		bkg_mean,
+											background_sigma= bkg_sigma,
+											background_max= 	bkg_max,
+											method= 'aperture',
+											aperture_radius= aperture,
+											annulus_width= 0,
+											annulus_offset= 0
+											)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+from collections import deque
+import copy
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Deque, List, Literal, NamedTuple, Optional
+from startrak.events import call_event
+from startrak.metrics import LatencyMetrics
+from startrak.native import FileInfo, PhotometryBase, PhotometryResult, Session, StarList, Tracker, TrackingSolution
+from startrak.types.phot import AperturePhot
+
+__all__ = ['LivePipeline', 'FrameResult', 'DropPolicy']
+
+DropPolicy = Literal['block', 'drop_oldest', 'drop_newest']
+
+class FrameResult(NamedTuple):
+	file : FileInfo
+	solution : TrackingSolution
+	photometry : List[PhotometryResult]
+
+class LivePipeline:
+	'''
+		Real-time reduction stage for scan sessions.
+
+		Every submitted file is placed in a bounded queue and processed by a pool of worker threads which load the data,
+		track it with the given tracker and measure the photometry of the session stars at the tracked positions.
+		Results are kept in a ring buffer (see `results`) and published through the named event `event_name` with the `FrameResult` as argument.
+		Dropped frames are published through `event_name + "_dropped"` with the `FileInfo` as argument.
+
+		Parameters:
+		* tracker (Tracker): Tracker used to align each frame, its model is set up from the session stars when attached.
+			Every worker tracks with its own copy, so with more than one worker the state a tracker keeps between frames (e.g. a motion model)
+			only sees the frames of its worker, which may arrive out of order. Use a single worker for such trackers.
+		* photometry (PhotometryBase): Photometry method, default: AperturePhot(4, 1, 0).
+		* workers (int): Number of worker threads.
+		* queue_size (int): Maximum number of frames waiting to be processed.
+		* policy ("block", "drop_oldest", "drop_newest"): What to do when the queue is full
+			* "block" waits up to `block_timeout` seconds for a free slot and drops the new frame if none is available
+			* "drop_oldest" discards the oldest waiting frame in favor of the new one (default)
+			* "drop_newest" discards the new frame
+		* buffer_size (int): Number of results kept in memory.
+		* event_name (str): Name of the event called after each frame is processed.
+		* metrics (LatencyMetrics): Optional latency metrics, each frame is timestamped after being loaded, tracked and photometered.
+	'''
+	tracker : Tracker
+	photometry : PhotometryBase
+	policy : DropPolicy
+	event_name : str
+	metrics : Optional[LatencyMetrics]
+	dropped : int
+	processed : int
+
+	def __init__(self, tracker : Tracker, photometry : Optional[PhotometryBase] = None, *,
+						workers : int = 2, queue_size : int = 8, policy : DropPolicy = 'drop_oldest', block_timeout : float = 1.0,
+						buffer_size : int = 1024, event_name : str = 'frame_processed', metrics : Optional[LatencyMetrics] = None) -> None:
+		assert workers >= 1, 'Number of workers must be greater or equal than one'
+		assert queue_size >= 1, 'Queue size must be greater or equal than one'
+		assert buffer_size >= 1, 'Buffer size must be greater or equal than one'
+		if policy not in ('block', 'drop_oldest', 'drop_newest'):
+			raise ValueError(f'Invalid policy: "{policy}", expected "block", "drop_oldest" or "drop_newest".')
+		self.tracker = tracker
+		self.photometry = photometry if photometry else AperturePhot(4, 1, 0)
+		self.policy = policy
+		self.event_name = event_name
+		self.metrics = metrics
+		self.dropped = 0
+		self.processed = 0
+
+		self._n_workers = workers
+		self._timeout = block_timeout
+		self._queue = Queue[FileInfo | None](maxsize= queue_size)
+		self._results : Deque[FrameResult] = deque(maxlen= buffer_size)
+		self._lock = Lock()
+		self._workers = list[Thread]()
+		self._stars = StarList()
+
+	@property
+	def running(self) -> bool:
+		return len(self._workers) > 0
+	@property
+	def pending(self) -> int:
+		return self._queue.qsize()
+	@property
+	def results(self) -> List[FrameResult]:
+		''' Returns a copy of the results currently held in the ring buffer, oldest first '''
+		with self._lock:
+			return list(self._results)
+
+	def start(self, session : Session):
+		''' Sets up the tracker model using the session stars and starts the worker threads '''
+		if self.running:
+			raise RuntimeError('Pipeline is already running')
+		self._stars = session.included_stars.copy(closed= True)
+		self.tracker.setup_model(self._stars)
+		for i in range(self._n_workers):
+			# Trackers keep state between frames (model, motion), so every worker tracks with its own copy
+			worker = Thread(target= self._work, args= (copy.deepcopy(self.tracker),), name= f'pipeline-worker-{i}', daemon= True)
+			worker.start()
+			self._workers.append(worker)
+
+	def stop(self, wait : bool = True):
+		''' Stops the workers after the queued frames are processed '''
+		workers, self._workers = self._workers, []
+		for _ in workers:
+			self._queue.put(None)
+		if wait:
+			for worker in workers:
+				worker.join()
+
+	def submit(self, file : FileInfo) -> bool:
+		''' Queues a file to be processed, returns False if the file (or an older one) had to be dropped'''
+		if not self.running:
+			raise RuntimeError('Pipeline is not running')
+		if self.policy == 'block':
+			try:
+				self._queue.put(file, timeout= self._timeout)
+				return True
+			except Full:
+				self._drop(file)
+				return False
+
+		try:
+			self._queue.put_nowait(file)
+			return True
+		except Full:
+			pass
+		if self.policy == 'drop_newest':
+			self._drop(file)
+			return False
+		# drop_oldest: make room for the new frame
+		try:
+			oldest = self._queue.get_nowait()
+			self._queue.task_done()
+			if oldest is None:
+				# The pipeline is stopping, the stop signal of the worker goes back and the new frame is dropped
+				self._queue.put(None)
+				self._drop(file)
+				return False
+			self._drop(oldest)
+		except Empty:
+			pass
+		try:
+			self._queue.put_nowait(file)
+		except Full:
+			self._drop(file)
+		return False
+
+	def join(self):
+		''' Blocks until all the queued frames are processed '''
+		self._queue.join()
+
+	def clear(self):
+		with self._lock:
+			self._results.clear()
+
+	def process(self, file : FileInfo) -> FrameResult:
+		''' Processes a single file synchronously '''
+		return self._process(file, self.tracker)
+
+	def _process(self, file : FileInfo, tracker : Tracker) -> FrameResult:
+		self._mark(file, 'started')
+		image = file.context.data
+		self._mark(file, 'loaded')
+		solution = tracker.track(image)
+		self._mark(file, 'tracked')
+		phot = [self.photometry.evaluate(image, solution.transform(star.position), star.aperture)
+						for star in self._stars]
+		self._mark(file, 'photometered')
+		return FrameResult(file, solution, phot)
+
+	def _mark(self, file : FileInfo, stage : str):
+		if self.metrics is not None:
+			self.metrics.mark(file.name, stage)
+
+	def _work(self, tracker : Tracker):
+		while True:
+			file = self._queue.get()
+			if file is None:
+				self._queue.task_done()
+				return
+			try:
+				result = self._process(file, tracker)
+			except Exception as e:
+				print(f'Unable to process "{file.name}": {e}')
+				self._drop(file)
+			else:
+				with self._lock:
+					self._results.append(result)
+					self.processed += 1
+				if self.metrics is not None:
+					self.metrics.complete(file.name)
+				self._publish(self.event_name, result)
+			finally:
+				self._queue.task_done()
+
+	def _drop(self, file : FileInfo):
+		with self._lock:
+			self.dropped += 1
+		if self.metrics is not None:
+			self.metrics.discard(file.name)
+		self._publish(self.event_name + '_dropped', file)
+
+	def _publish(self, event_name : str, argument : FrameResult | FileInfo):
+		# A failing listener must not stop the worker threads
+		try:
+			call_event(event_name, argument)
+		except Exception as e:
+			print(f'Listener of "{event_name}" failed: {type(e).__name__}: {e}')
+
+	def __repr__(self) -> str:
+		return f'{type(self).__name__} ({type(self.tracker).__name__}, {self.processed} processed, {self.dropped} dropped, {self.pending} pending)'
@@ -1,12 +1,44 @@
 from __future__ import annotations
 from collections.abc import Callable, Iterable, Mapping
 import os
-from threading import Thread
-import time
-from typing import Any, Self, Sequence, Set
+from select import select
+from threading import Event, Thread
+from typing import Any, Dict, Literal, NamedTuple, Self, Sequence, Set
+from startrak.internals import inotify
+from startrak.metrics import LatencyMetrics
 from startrak.native import FileInfo, Session
 from startrak.native.classes import FileInfo
 from startrak.native.ext import AttrDict
+from startrak.types.pipeline import LivePipeline
+
+_FITS_EXT = ('.fit', '.fits', '.FIT', '.FITS')
+_WatcherBackend = Literal['auto', 'inotify', 'poll']
+
+class _Snapshot(NamedTuple):
+	size : int
+	mtime : int
+
+def _stat(path : str) -> _Snapshot | None:
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return _Snapshot(st.st_size, st.st_mtime_ns)
+
+def _scan(directory : str) -> Dict[str, _Snapshot]:
+	snapshot = dict[str, _Snapshot]()
+	with os.scandir(directory) as entries:
+		for entry in entries:
+			if not entry.name.endswith(_FITS_EXT):
+				continue
+			try:
+				if not entry.is_file():
+					continue
+				st = entry.stat()
+			except OSError:
+				continue
+			snapshot[entry.name] = _Snapshot(st.st_size, st.st_mtime_ns)
+	return snapshot
 
 class InspectionSession(Session):
 
@@ -24,50 +56,190 @@ class InspectionSession(Session):
 
 class ScanSession(Session):
 	_watcher : DirectoryWatcher | None
+	_pipeline : LivePipeline | None
+	metrics : LatencyMetrics | None
 	class DirectoryWatcher(Thread):
-		def __init__(self, session : ScanSession, cadence_ms : int = 100, *args) -> None:
+		'''
+			Watches the session working directory for FITS files being added or removed.
+
+			Two backends are available: "inotify" (Linux only) blocks until the kernel reports a change, 
+			"poll" compares scandir snapshots every `cadence_ms` milliseconds. "auto" uses inotify whenever possible.
+			In both cases a new file is only added to the session once its size and modification time stay the same for `settle_ms` milliseconds,
+			so files that are still being written are not read.
+		'''
+		def __init__(self, session : ScanSession, cadence_ms : int = 100, settle_ms : int = 50, 
+							backend : _WatcherBackend = 'auto', *args) -> None:
 			super().__init__(name= 'watcher-thread', daemon=False)
+			if backend not in ('auto', 'inotify', 'poll'):
+				raise ValueError(f'Invalid watcher backend: "{backend}", expected "auto", "inotify" or "poll".')
+			if backend == 'inotify' and not inotify.available():
+				raise OSError('inotify is not available in this platform')
 			self._session = session
 			self._sleep = cadence_ms / 1000
-			self._stop = False
+			self._settle = settle_ms / 1000
+			self._backend = backend
+			self._stop_event = Event()
+			self._known = set[str]()
+			self._pending = dict[str, _Snapshot]()
+			self._wakeup = -1
+
+		@property
+		def backend(self) -> str:
+			if self._backend == 'auto':
+				return 'inotify' if inotify.available() else 'poll'
+			return self._backend
+		@property
+		def stopped(self) -> bool:
+			return self._stop_event.is_set()
+
 		def start(self) -> None:
-			self._stop = False
+			self._stop_event.clear()
 			return super().start()
 		def stop(self) -> None:
-			self._stop = True
+			self._stop_event.set()
+			try:
+				if self._wakeup >= 0:
+					os.write(self._wakeup, b'\0')
+			except OSError:
+				pass
 		
 		def run(self):
-			before = self._session.included_files.names
-			while not self._stop:
-				time.sleep (self._sleep)
-				after = os.listdir (self._session.working_dir)
-				added = [f for f in after if not f in before]
-				removed = [f for f in before if not f in after]
-				if added:
-					self.process_added(added)
-				if removed: 
+			directory = self._session.working_dir
+			if not os.path.isdir(directory):
+				print(f'Cannot scan "{directory}", directory does not exist')
+				return
+			self._known = set(self._session.included_files.names)
+			if self.backend == 'inotify':
+				self._run_inotify(directory)
+			else:
+				self._run_polling(directory)
+
+		def _run_inotify(self, directory : str):
+			mask = (inotify.IN_CREATE | inotify.IN_MODIFY | inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO 
+						| inotify.IN_DELETE | inotify.IN_MOVED_FROM | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF)
+			wake_r, self._wakeup = os.pipe()
+			try:
+				with inotify.Inotify(directory, mask) as notifier:
+					self._inotify_loop(directory, notifier, wake_r)
+			finally:
+				os.close(wake_r)
+				os.close(self._wakeup)
+				self._wakeup = -1
+
+		def _inotify_loop(self, directory : str, notifier : inotify.Inotify, wake_r : int):
+			# Files created before the watch was registered
+			snapshot = _scan(directory)
+			self._pending.update( (name, snap) for name, snap in snapshot.items() if name not in self._known)
+			for name in self._pending:
+				self._mark(name, 'detected')
+			if missing := self._known - snapshot.keys():
+				self.process_removed(list(missing))
+
+			while not self._stop_event.is_set():
+				# Block until something happens, only wake up periodically while files are settling
+				timeout = self._settle if self._pending else None
+				ready, _, _ = select([notifier, wake_r], [], [], timeout)
+				removed = list[str]()
+				if notifier in ready:
+					for event in notifier.read():
+						if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+							print(f'Stopped scanning, "{directory}" was removed')
+							return
+						if event.mask & inotify.IN_Q_OVERFLOW:
+							self._pending.update( (name, snap) for name, snap in _scan(directory).items() if name not in self._known)
+							continue
+						if event.mask & inotify.IN_ISDIR or not event.name.endswith(_FITS_EXT):
+							continue
+						if event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+							self._pending.pop(event.name, None)
+							if event.name in self._known:
+								removed.append(event.name)
+						elif event.name in self._known:
+							continue
+						elif event.mask & (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO):
+							# Only files closed by the writer are considered, then they must settle
+							self._pending[event.name] = _Snapshot(-1, -1)
+							self._mark(event.name, 'detected')
+						elif event.name in self._pending:
+							# Reopened for writing
+							del self._pending[event.name]
+				if removed:
 					self.process_removed(removed)
-				before = after
+				if self._pending:
+					self._settle_pending(directory)
+
+		def _run_polling(self, directory : str):
+			while not self._stop_event.is_set():
+				snapshot = _scan(directory)
+				added = snapshot.keys() - self._known - self._pending.keys()
+				removed = self._known - snapshot.keys()
+				for name in self._pending.keys() - snapshot.keys():
+					del self._pending[name]
+				if removed: 
+					self.process_removed(list(removed))
+				
+				ready = [name for name, snap in self._pending.items() if snapshot[name] == snap and snap.size > 0]
+				for name in ready:
+					del self._pending[name]
+				for name in added | self._pending.keys():
+					self._pending[name] = snapshot[name]
+				for name in added:
+					self._mark(name, 'detected')
+				if ready:
+					self.process_added(sorted(ready))
+				self._stop_event.wait(self._settle if self._pending else self._sleep)
+
+		def _settle_pending(self, directory : str):
+			ready = list[str]()
+			for name, last in list(self._pending.items()):
+				current = _stat(os.path.join(directory, name))
+				if current is None:
+					del self._pending[name]
+				elif current == last and current.size > 0:
+					del self._pending[name]
+					ready.append(name)
+				else:
+					self._pending[name] = current
+			if ready:
+				self.process_added(sorted(ready))
 
 		def process_added(self, names : list[str]):
 			files = []
 			for name in names:
 				path = os.path.join(self._session.working_dir, name)
-				if os.path.isfile(path) and not name.endswith(
-					('.fit', '.fits', '.FIT', '.FITS')):
+				if not name.endswith(_FITS_EXT) or not os.path.isfile(path):
+					continue
+				try:
+					self._mark(name, 'written', os.path.getmtime(path))
+					info = FileInfo.new(path)
+				except (OSError, ValueError, AssertionError) as e:
+					print(f'Unable to read "{name}": {e}')
+					if (metrics := self._session.metrics) is not None:
+						metrics.discard(name)
 					continue
-				info = FileInfo.new(path)
+				self._mark(name, 'parsed')
 				files.append(info)
-			Session.add_file(self._session, *files)
+				self._known.add(name)
+			if files:
+				Session.add_file(self._session, *files)
+			if (metrics := self._session.metrics) is not None and self._session.pipeline is None:
+				for file in files:
+					metrics.complete(file.name)
+
+		def _mark(self, name : str, stage : str, timestamp : float | None = None):
+			if (metrics := self._session.metrics) is not None:
+				metrics.mark(name, stage, timestamp)
 			
 		def process_removed(self, names : list[str]):
 			files = []
 			for name in names:
+				self._known.discard(name)
 				if name not in self._session.included_files:
 					continue
 				file = self._session.included_files[name]
 				files.append(file)
-			Session.remove_file(self._session, *files)
+			if files:
+				Session.remove_file(self._session, *files)
 
 	def add_file(self, *items: FileInfo):
 		pass
@@ -75,23 +247,49 @@ class ScanSession(Session):
 		pass
 		
 	def __init__(self, name: str, working_dir: str, auto_start : bool = True,
-					force_validation: bool = False, use_relativePaths: bool = False):
+					force_validation: bool = False, use_relativePaths: bool = False, watcher_backend : _WatcherBackend = 'auto', track_latency : bool = False):
 		super().__init__(name, working_dir, force_validation, use_relativePaths)
 		self._watcher = None
+		self._watcher_backend = watcher_backend
+		self._pipeline = None
+		self.metrics = LatencyMetrics() if track_latency else None
 		if auto_start:
 			self.begin_scan()
 	
 	def begin_scan(self):
-		if self._watcher is None or self._watcher._stop is True:
-			self._watcher = ScanSession.DirectoryWatcher(self)
+		if self._watcher is not None and self._watcher.is_alive() and not self._watcher.stopped:
+			return
+		self._watcher = ScanSession.DirectoryWatcher(self, backend= self._watcher_backend)
 		self._watcher.start()
 
 	def end_scan(self):
 		if self._watcher is not None:
 			self._watcher.stop()
 
+	@property
+	def pipeline(self) -> LivePipeline | None:
+		return self._pipeline
+
+	def attach_pipeline(self, pipeline : LivePipeline):
+		''' Starts the given pipeline using this session stars, every file added afterwards is submitted to it '''
+		self.detach_pipeline()
+		if pipeline.metrics is None:
+			pipeline.metrics = self.metrics
+		pipeline.start(self)
+		self._pipeline = pipeline
+
+	def detach_pipeline(self, wait : bool = True):
+		''' Stops the current pipeline (if any), when wait is True the frames already queued are processed first '''
+		if self._pipeline is not None:
+			self._pipeline.stop(wait)
+			self._pipeline = None
+
 	def __item_added__(self, added : Sequence[FileInfo]): 
-		print ("Added", added)
+		if self._pipeline is None:
+			print ("Added", added)
+			return
+		for file in added:
+			self._pipeline.submit(file)
 	def __item_removed__(self, removed : Sequence[FileInfo]): 
 		print ("Removed", removed)
 	
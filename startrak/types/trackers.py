@@ -1,20 +1,38 @@
-from random import randint, uniform
+import math
+from random import uniform
+import warnings
 from typing import Any, List, Literal, Sequence, Tuple
 import numpy as np
 from startrak.native.classes import TrackingSolution
 from startrak.native.numeric import average
 
 from startrak.native.utils.geomutils import *
-from startrak.native import PhotometryResult, StarDetector, StarList, Tracker, TrackingSolution
+from startrak.native import MotionModel, PhotometryResult, StarDetector, StarList, Tracker, TrackingSolution
 from startrak.native.alias import ImageLike
 from startrak.native import PositionArray
-from startrak.types.phot import _get_cropped
+from startrak.framecontext import find_context
+from startrak.imageutils import ImagePyramid, background_mesh, bilinear_sample, extract_windows, frame_stats, refine_centroids
 from startrak.types import detection
 
-__all__ = ['PhotometryTracker', 'GlobalAlignmentTracker', 'Tracker']
+__all__ = ['PhotometryTracker', 'GlobalAlignmentTracker', 'PhaseCorrelationTracker', 'Tracker']
 class PhotometryTracker(Tracker):
+	'''
+		Tracks each star by the weighted centroid of its brightest pixels inside a window around its expected position.
+
+		If a motion model is given, the windows of each frame are placed at the positions predicted from the previous solutions
+		and their size is reduced to `3 * error` of the prediction (never larger than tracking_size nor smaller than min_size).
+		Pass the frame time (seconds) to track() when the cadence is not regular.
+
+		The background of each window is the mean of its edges, if mesh is given it is interpolated from the background mesh of the frame
+		(see imageutils.BackgroundMesh, computed once per frame) instead, which is not biased by neighbors crossing the window edges.
+	'''
+	motion_model : MotionModel | None
+	min_size : int
+	mesh : int | None
+
 	def __init__(self, tracking_size : int, tracking_steps : int = 1, size_mul : float | Literal['auto', 'random'] = 0.5, verbose : bool = False,
-							stochasticity : float | None = None, rejection_sigma= 3, rejection_iter= 3) -> None:
+							stochasticity : float | None = None, rejection_sigma= 3, rejection_iter= 3,
+							motion_model : MotionModel | None = None, min_size : int = 6, mesh : int | None = None) -> None:
 		assert tracking_size > 0 and type(tracking_size) is int, 'Tracking size must be a positive integer'
 		assert tracking_steps >= 1, 'Tracking steps must be greater or equal than one'
 		assert isinstance(size_mul, (float, int)) or (type(size_mul) is str and (size_mul == 'auto' or size_mul=='random')),\
@@ -30,6 +48,11 @@ class PhotometryTracker(Tracker):
 		self.size_mult = size_mul
 		self.random_size = stochasticity if stochasticity else 0
 		self.verbose = verbose
+		assert min_size > 0, 'Minimum size must be greater than zero'
+		self.motion_model = motion_model
+		self.min_size = min_size
+		assert mesh is None or mesh >= 2, 'Mesh size must be greater or equal than two'
+		self.mesh = mesh
 
 	# todo: Weights should be inside the Star object, not the tracker
 	# todo: Trackers models should contain references to stars
@@ -48,41 +71,65 @@ class PhotometryTracker(Tracker):
 				phot.append(star.photometry)
 		self._model_phot = phot
 		self._model_count = len(phot)
+		# Thresholds of the pixel masks, one per star
+		self._bkg_sigma = np.array([p.background.sigma for p in phot], dtype= float)
+		self._flux = np.array([p.flux.value for p in phot], dtype= float)
+		self._flux_sigma = np.array([p.flux.sigma for p in phot], dtype= float)
+		self._flux_max = np.array([p.flux.max for p in phot], dtype= float)
+		self._snr = np.array([p.snr for p in phot], dtype= float)
 		self._model_coords = coords
 		self._model_coords.close()
+		if self.motion_model is not None:
+			self.motion_model.reset()
 
-	def track(self, image: ImageLike) -> TrackingSolution:
+	def track(self, image: ImageLike, time : float | None = None) -> TrackingSolution:
 		start_coords = self._model_coords.copy()
-		last_dp = image.shape[0]
 		crop_size = self.crop_size
+		prediction = self.motion_model.predict(time) if self.motion_model is not None else None
+		if prediction is not None:
+			start_coords = PositionArray( *[prediction.transform(pos) for pos in self._model_coords])
+			if math.isfinite(prediction.error):
+				crop_size = int(min(self.crop_size, max(self.min_size, math.ceil(3 * prediction.error))))
+		background = None
+		if self.mesh:
+			context = find_context(image)
+			background = context.background(self.mesh) if context is not None else background_mesh(image, self.mesh)
 
 		def track_single():
-			current = PositionArray()
-			lost = list[int]()
-			for i in range(self._model_count): 
+			# All the windows are stacked in a (n, size, size) array and processed at once
+			size = 2 * int(crop_size)
+			coords = np.array(start_coords, dtype= float).reshape(-1, 2)
+			if self.random_size > 0:
 				rand_size = int(crop_size * self.random_size)
-				rand_offset = randint(-rand_size, rand_size), randint(-rand_size, rand_size)
-
-				crop = _get_cropped(image, start_coords[i] + rand_offset, 0, padding= int(crop_size))
-				phot = self._model_phot[i]
-				bkg = np.nanmean((np.nanmean(crop[-4:, :]), np.nanmean(crop[:, -4:]), np.nanmean(crop[:4, :]), np.nanmean(crop[:, :4])))
-				try:	
-					mask = (crop - bkg) > phot.background.sigma * (1 + phot.snr * 2)
-					mask &= (crop - bkg) > phot.flux.sigma * (1 + phot.snr) / 2
-					mask &= ((crop - bkg) - phot.flux.max) <  phot.flux.sigma
-					mask &= ~np.isnan(crop)
-
-					indices = np.transpose(np.nonzero(mask))
-					if len(indices) < 16: raise IndexError()
-					_w = np.clip(crop[indices[:, 0], indices[:, 1]] - bkg, 0, phot.flux.max) / phot.flux
-					_w[np.isnan(_w)] = 0
-					avg = np.average(indices, weights= _w ** 2, axis= 0)[::-1]
-				except:	#raises ZeroDivisionError and IndexError
-					lost.append(i)
-					current.append(start_coords[i])
-					continue
-				current.append(avg - (crop_size,) * 2 + start_coords[i])
-			return current - start_coords, lost
+				coords = coords + np.random.randint(-rand_size, rand_size + 1, coords.shape)
+			corner = np.floor(coords).astype(int) - int(crop_size)
+			crops = extract_windows(image, corner[:, 1], corner[:, 0], size).astype(float)
+
+			with np.errstate(invalid= 'ignore', divide= 'ignore'), warnings.catch_warnings():
+				warnings.simplefilter('ignore', RuntimeWarning)
+				if background is not None:
+					bkg = background.at(coords[:, 0], coords[:, 1])[:, None, None]
+				else:
+					edges = np.stack((np.nanmean(crops[:, -4:, :], axis= (1, 2)), np.nanmean(crops[:, :, -4:], axis= (1, 2)),
+											np.nanmean(crops[:, :4, :], axis= (1, 2)), np.nanmean(crops[:, :, :4], axis= (1, 2))))
+					bkg = np.nanmean(edges, axis= 0)[:, None, None]
+				signal = crops - bkg
+				mask = signal > (self._bkg_sigma * (1 + self._snr * 2))[:, None, None]
+				mask &= signal > (self._flux_sigma * (1 + self._snr) / 2)[:, None, None]
+				mask &= (signal - self._flux_max[:, None, None]) < self._flux_sigma[:, None, None]
+				mask &= ~np.isnan(crops)
+
+				weights = np.clip(signal, 0, self._flux_max[:, None, None]) / self._flux[:, None, None]
+				weights = np.where(mask & np.isfinite(weights), weights ** 2, 0)
+				total = weights.sum(axis= (1, 2))
+				offsets = np.arange(size)
+				cy = (weights * offsets[None, :, None]).sum(axis= (1, 2)) / total
+				cx = (weights * offsets[None, None, :]).sum(axis= (1, 2)) / total
+			lost_mask = (mask.sum(axis= (1, 2)) < 16) | ~(total > 0)
+
+			current = np.column_stack((corner[:, 0] + cx, corner[:, 1] + cy)) - np.array(start_coords, dtype= float).reshape(-1, 2)
+			current[lost_mask] = 0
+			return PositionArray( *current.tolist()), np.flatnonzero(lost_mask).tolist()
 		
 		def change_size(previous_size : float, lost_indices):
 			if isinstance(self.size_mult, (float, int)):
@@ -102,37 +149,57 @@ class PhotometryTracker(Tracker):
 			if self.verbose:
 				print(f'iter: {i}, size mode= {self.size_mult} crop size= {crop_size}, lost= {len(lost)}, displacement= {avg.length:.2f}')
 			
-			if avg.length < 2: # px
-				if len(lost) < self._model_count // 2:
-					break
-			crop_size = change_size(crop_size, lost)
 			res = current_dp - avg
 			var = average( [r.sq_length for r in res])
 			
 			for j, dp in enumerate(res):
 				if j in lost or dp.sq_length > max(var * self.rej_sigma, 1):
 					current_dp[j] = avg
+			# The last displacement is applied before stopping, otherwise up to 2px of error are kept
 			start_coords += current_dp
+			if avg.length < 2: # px
+				if len(lost) < self._model_count // 2:
+					break
+			crop_size = change_size(crop_size, lost)
 
 		lost_indices = lost #type:ignore
-		return TrackingSolution.compute('photometry', self._model_coords, start_coords, 
+		solution = TrackingSolution.compute('photometry', self._model_coords, start_coords, 
 													weights= tuple(self._model_weights), lost_indices= lost_indices)
+		if self.motion_model is not None:
+			self.motion_model.update(solution, time)
+		return solution
 
-# todo: move elsewhere
-_Method = Literal['hough', 'hough_adaptive', 'hough_threshold']
 class GlobalAlignmentTracker(Tracker):
+	'''
+		Aligns each image by matching triangles of neighbor stars against the model.
+
+		If pyramid_level > 0 the stars are detected and matched on a block averaged version of the image (pyramid_factor ** pyramid_level times smaller),
+		the matched positions are then refined on the full resolution image using only windows of refine_radius pixels around each of them.
+		Detector arguments (sizes and distances) apply to the downsampled image in that case.
+		Mismatched triangles are rejected with the given estimator of TrackingSolution.compute, sigma clipping of the displacements by default ('ransac' and 'lmeds' are robust to many more mismatches).
+		If verbose is True the number of correspondences rejected by the robust estimators is printed for every frame.
+	'''
 	sigma : int
 	iterations : int
 	tolerance : float
+	pyramid_level : int
+	pyramid_factor : int
+	refine_radius : int
+	estimator : str
+	verbose : bool
 	
 	_detector : StarDetector
 	_method : CongruenceMethod
 
-	def __init__(self, detection_method : _Method | StarDetector = 'hough',
+	def __init__(self, detection_method : detection.DetectionMethod | StarDetector = 'hough',
 							congruence_method: Literal['sss', 'sas', 'aaa'] = 'sss',
 							congruence_tolerance : float = 0.05,
 							area_weight : bool = True,
-							rejection_sigma= 3, rejection_iter= 3,  **detector_args) -> None:
+							rejection_sigma= 3, rejection_iter= 3,
+							pyramid_level : int = 0, pyramid_factor : int = 2, refine_radius : int | None = None,
+							estimator : Literal['sigma_clip', 'ransac', 'lmeds'] = 'sigma_clip', verbose : bool = False, **detector_args) -> None:
+		assert pyramid_level >= 0, 'Pyramid level must be a positive integer'
+		assert pyramid_factor >= 2, 'Pyramid factor must be greater or equal than two'
 		self.sigma = rejection_sigma
 		self.iterations = rejection_iter
 		self.tolerance = congruence_tolerance
@@ -147,16 +214,12 @@ class GlobalAlignmentTracker(Tracker):
 			raise ValueError(f'Unsupported congruence method "{self._method}" available options are sss, sas and aaa')
 		
 		self._use_w = area_weight
-		if detection_method == 'hough':
-			self._detector = detection.HoughCircles(**detector_args)
-		elif detection_method == 'hough_adaptive':
-			self._detector = detection.AdaptiveHoughCircles(**detector_args)
-		elif detection_method == 'hough_threshold':
-			self._detector = detection.ThresholdHoughCircles(**detector_args)
-		elif isinstance(detection_method, StarDetector):
-			self._detector = detection_method
-		else:
-			raise ValueError(detection_method)
+		self.estimator = estimator
+		self.verbose = verbose
+		self.pyramid_level = pyramid_level
+		self.pyramid_factor = pyramid_factor
+		self.refine_radius = refine_radius if refine_radius else 2 * pyramid_factor ** pyramid_level + 2
+		self._detector = detection.get_detector(detection_method, **detector_args)
 
 	def setup_model(self, stars: StarList, **kwargs):
 		if len(stars) <= 3:
@@ -171,27 +234,39 @@ class GlobalAlignmentTracker(Tracker):
 			coord.close()
 			self._model.append(coord)
 
-		if self._use_w:
-			self._areas = np.array([area(trig) for trig in self._model])
+		self._areas = np.array([area(trig) for trig in self._model])
 
 	def track(self, image: ImageLike) -> TrackingSolution:
-		detected_stars = self._detector.detect(image)
+		pyramid = ImagePyramid(image, self.pyramid_level, self.pyramid_factor)
+		level = self.pyramid_level
+		# Detections and pyramid levels are shared with other consumers of the same frame
+		context = find_context(image)
+		detected_stars = context.detect(self._detector, level, self.pyramid_factor) if context is not None else self._detector.detect(pyramid[level])
 		if len(detected_stars) <= 3:
 			print('Less than 3 stars were detected for this image')
 			return TrackingSolution.identity()
 		
-		coords = PositionArray( *sorted(detected_stars.positions, key= lambda p: p.y))
+		positions = sorted(detected_stars.positions, key= lambda p: p.y)
+		if level > 0:
+			positions = pyramid.to_full(positions, level).tolist()
+		coords = PositionArray( *positions)
+		# Coarse positions are less precise, so the area ratio tolerance grows with the pixel scale
+		area_tol = 0.01 * pyramid.scale(level)
 		indices = k_neighbors(coords, 2)
 		triangles : List[PositionArray] = [coords[idx] for idx in indices]
+		areas = np.array([area(trig) for trig in triangles])
 		
-		# !warning: slow code
+		# The area ratio is checked first (vectorized) so the congruence test only runs on the candidates
 		matched = list[Tuple[int, int]]()
-		for i, trig1 in enumerate(self._model):
-			for j, trig2 in enumerate(triangles):
-				if self._method(trig1, trig2, self.tolerance):
-					if 0.99 < area(trig1) / area(trig2) < 1.01:
-						matched.append((i, j))
-						break
+		with np.errstate(divide= 'ignore', invalid= 'ignore'):
+			candidates = np.abs(self._areas[:, None] / areas[None, :] - 1) < area_tol
+		last = -1
+		for i, j in zip( *(idx.tolist() for idx in np.nonzero(candidates))):
+			if i == last:
+				continue
+			if self._method(self._model[i], triangles[j], self.tolerance):
+				matched.append((i, j))
+				last = i
 		if len(matched) == 0:
 			print('No triangles were matched for this image')
 			return TrackingSolution.identity()
@@ -210,11 +285,173 @@ class GlobalAlignmentTracker(Tracker):
 			if self._use_w:
 				_areas.append(self._areas[model_idx])
 
+		if level > 0:
+			current = PositionArray( *refine_centroids(image, np.asarray(current), self.refine_radius).tolist())
+
 		if self._use_w:
 			weight_array = tuple(np.repeat(_areas, 3).tolist())
 		else:
 			weight_array = None
 
 		print(f'Matched {len(matched)} of {len(triangles)} triangles')
-		return TrackingSolution.compute('global_alignment', reference, current, 
-													weights= weight_array, rejection_iter= self.iterations, rejection_sigma= self.sigma)
\ No newline at end of file
+		return TrackingSolution.compute('global_alignment', reference, current, weights= weight_array, 
+													rejection_iter= self.iterations, rejection_sigma= self.sigma, estimator= self.estimator, verbose= self.verbose)
+
+class PhaseCorrelationTracker(Tracker):
+	'''
+		Estimates the translation of each image by FFT phase correlation against a reference spectrum computed once in setup_model.
+
+		The reference is the image passed to setup_model(stars, reference= image), otherwise it is rendered from the model stars
+		(gaussian profiles weighted by their flux) using the shape of the first tracked image.
+		If estimate_rotation is True the rotation around the image center is estimated first by phase correlation of the log-polar
+		transform of the magnitude spectra (rotations must be within +-90 degrees), the image is then rotated back before estimating the translation.
+
+		Parameters:
+		* estimate_rotation (bool): Whether to estimate the rotation, default: False (translation only).
+		* window (bool): Apply a Hann window to reduce the edge effects of the FFT.
+		* fwhm (float): Full width at half maximum of the stars rendered in the reference image.
+		* angular_samples, radial_samples (int): Size of the log-polar transform.
+
+		After each call to track(), `peak` holds the height of the correlation peak (1 for identical images, close to 0 if the images are unrelated).
+	'''
+	estimate_rotation : bool
+	window : bool
+	fwhm : float
+	peak : float
+
+	def __init__(self, estimate_rotation : bool = False, window : bool = True, fwhm : float = 4.0,
+							angular_samples : int = 720, radial_samples : int = 256) -> None:
+		assert fwhm > 0, 'FWHM must be greater than zero'
+		assert angular_samples >= 8 and radial_samples >= 8, 'Log-polar size must be at least 8 samples'
+		self.estimate_rotation = estimate_rotation
+		self.window = window
+		self.fwhm = fwhm
+		self.peak = 0.
+		self._n_theta = angular_samples
+		self._n_rho = radial_samples
+		self._reference : np.ndarray | None = None
+		self._ref_spectrum : np.ndarray | None = None
+		self._ref_logpolar : np.ndarray | None = None
+		self._windows = dict[Tuple[int, int], np.ndarray]()
+
+	def setup_model(self, stars: StarList, reference : ImageLike | None = None, **kwargs : Any):
+		self._positions = np.array([tuple(star.position) for star in stars], dtype= float).reshape(-1, 2)
+		self._fluxes = np.array([star.photometry.flux.value if star.photometry else 1. for star in stars], dtype= float)
+		self._reference = None
+		self._ref_spectrum = None
+		self._ref_logpolar = None
+		if reference is not None:
+			self._set_reference(np.asarray(reference, dtype= np.float64))
+
+	def _render(self, shape : Tuple[int, int]) -> np.ndarray:
+		image = np.zeros(shape, dtype= np.float64)
+		sigma = self.fwhm / 2.3548
+		radius = int(np.ceil(3 * sigma))
+		offsets = np.arange(-radius, radius + 1)
+		cx = np.round(self._positions[:, 0]).astype(int)
+		cy = np.round(self._positions[:, 1]).astype(int)
+		px = (cx[:, None] + offsets[None, :])[:, None, :]
+		py = (cy[:, None] + offsets[None, :])[:, :, None]
+		sq = (px - self._positions[:, 0, None, None]) ** 2 + (py - self._positions[:, 1, None, None]) ** 2
+		profile = np.exp(-sq / (2 * sigma ** 2)) * self._fluxes[:, None, None]
+		rr, cc = np.broadcast_to(py, profile.shape), np.broadcast_to(px, profile.shape)
+		valid = (rr >= 0) & (rr < shape[0]) & (cc >= 0) & (cc < shape[1])
+		np.add.at(image, (rr[valid], cc[valid]), profile[valid])
+		return image
+
+	def _set_reference(self, reference : np.ndarray):
+		self._reference = reference
+		self._ref_spectrum = np.fft.rfft2(self._prepare(reference))
+		if self.estimate_rotation:
+			self._ref_logpolar = self._logpolar(reference)
+
+	def _hann(self, shape : Tuple[int, int]) -> np.ndarray:
+		if shape not in self._windows:
+			self._windows[shape] = np.outer(np.hanning(shape[0]), np.hanning(shape[1]))
+		return self._windows[shape]
+
+	def _prepare(self, image : ImageLike) -> np.ndarray:
+		data = np.asarray(image, dtype= np.float64)
+		data = np.nan_to_num(data - frame_stats(image, samples= 1 << 16).median)
+		if self.window:
+			rows, cols = data.shape
+			data *= self._hann((rows, cols))
+		return data
+
+	@staticmethod
+	def _correlate(spectrum : np.ndarray, ref_spectrum : np.ndarray, shape : Tuple[int, int]) -> Tuple[float, float, float]:
+		# Normalized cross power spectrum, the peak of its inverse is located at the (dx, dy) shift
+		cross = spectrum * np.conj(ref_spectrum)
+		cross /= np.maximum(np.abs(cross), 1e-12)
+		corr = np.fft.irfft2(cross, s= shape)
+		iy, ix = np.unravel_index(int(np.argmax(corr)), corr.shape)
+		
+		def subpixel(c_m : float, c_0 : float, c_p : float) -> float:
+			denom = c_m - 2 * c_0 + c_p
+			return 0.5 * (c_m - c_p) / denom if denom != 0 else 0.
+		rows, cols = shape
+		dx = ix + subpixel(corr[iy, ix - 1], corr[iy, ix], corr[iy, (ix + 1) % cols])
+		dy = iy + subpixel(corr[iy - 1, ix], corr[iy, ix], corr[(iy + 1) % rows, ix])
+		if dx > cols / 2: dx -= cols
+		if dy > rows / 2: dy -= rows
+		return float(dx), float(dy), float(corr[iy, ix])
+
+	def _logpolar(self, image : ImageLike) -> np.ndarray:
+		# Log-polar transform of the high-pass filtered magnitude spectrum, which is invariant to translation
+		data = self._prepare(image)
+		magnitude = np.abs(np.fft.fftshift(np.fft.fft2(data)))
+		rows, cols = magnitude.shape
+		fy = np.fft.fftshift(np.fft.fftfreq(rows))[:, None]
+		fx = np.fft.fftshift(np.fft.fftfreq(cols))[None, :]
+		cos = np.cos(np.pi * fy) * np.cos(np.pi * fx)
+		magnitude *= (1 - cos) * (2 - cos)
+
+		# Only the mid frequencies are sampled, the lowest are dominated by the window and the highest by noise
+		center_x, center_y = cols // 2, rows // 2
+		nyquist = min(center_x, center_y) - 1
+		theta = np.linspace(0, np.pi, self._n_theta, endpoint= False)
+		rho = np.exp(np.linspace(np.log(max(0.05 * nyquist, 1)), np.log(0.6 * nyquist), self._n_rho))
+		x = center_x + rho[None, :] * np.cos(theta[:, None])
+		y = center_y + rho[None, :] * np.sin(theta[:, None])
+		return np.nan_to_num(bilinear_sample(magnitude, x, y, fill= 0))
+
+	def _rotation(self, image : ImageLike) -> float:
+		assert self._ref_logpolar is not None
+		rows, cols = self._ref_logpolar.shape
+		shape = (rows, cols)
+		logpolar = self._logpolar(image)
+		_, d_theta, _ = self._correlate(np.fft.rfft2(logpolar), np.fft.rfft2(self._ref_logpolar), shape)
+		return d_theta * np.pi / self._n_theta
+
+	def track(self, image: ImageLike) -> TrackingSolution:
+		rows, cols = image.shape
+		shape = (rows, cols)
+		if self._reference is None or self._reference.shape != shape:
+			if self._reference is not None:
+				print('Image shape differs from the reference, rendering a new reference from the model stars')
+			if len(self._positions) == 0:
+				raise RuntimeError(f'Model of {type(self).__name__} requires a reference image or at least one star')
+			self._set_reference(self._render(shape))
+		assert self._reference is not None and self._ref_spectrum is not None
+
+		center = Position((shape[1] - 1) / 2, (shape[0] - 1) / 2)
+		angle = 0.
+		data = image
+		if self.estimate_rotation:
+			if self._ref_logpolar is None:
+				self._ref_logpolar = self._logpolar(self._reference)
+			angle = self._rotation(image)
+			if angle != 0:
+				# Rotate the image back around the center so only the translation remains
+				yy, xx = np.mgrid[0:shape[0], 0:shape[1]]
+				cos, sin = np.cos(angle), np.sin(angle)
+				x = cos * (xx - center.x) - sin * (yy - center.y) + center.x
+				y = sin * (xx - center.x) + cos * (yy - center.y) + center.y
+				data = bilinear_sample(image, x, y)
+
+		dx, dy, self.peak = self._correlate(np.fft.rfft2(self._prepare(data)), self._ref_spectrum, shape)
+		# A reference point p maps to R (p + d - c) + c, with c the rotation center, the translation is the image of the origin
+		cos, sin = np.cos(angle), np.sin(angle)
+		ox, oy = dx - center.x, dy - center.y
+		origin = Position(cos * ox - sin * oy + center.x, sin * ox + cos * oy + center.y)
+		return TrackingSolution.new('phase_correlation', origin, angle, 0.)
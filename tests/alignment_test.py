@@ -0,0 +1,85 @@
+# type: ignore
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_sequence
+from startrak import sessionutils
+from startrak.native import FileInfo, Star
+from startrak.types.alignment import AlignmentTable, SessionAlignment
+from startrak.types.trackers import GlobalAlignmentTracker
+
+class _CountingTracker(GlobalAlignmentTracker):
+	calls = 0
+	def track(self, image):
+		type(self).calls += 1
+		return super().track(image)
+
+class AlignmentTests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		spec = FieldSpec(shape= (256, 256), n_stars= 30, fwhm= 4.0, flux_range= (2e4, 2e5))
+		self.frames = generate_sequence(self._tmp.name, 6, spec, drift= (2.5, -1.5), rotation= 0.2)
+		self.session = sessionutils.new_session('alignment', 'inspect', self._tmp.name, overwrite= True)
+		self.session.add_file( *[FileInfo.new(frame.path) for frame in self.frames])
+		self.session.add_star( *[Star(f'star_{i}', (float(x), float(y)), 6) for i, (x, y) in enumerate(self.frames[0].positions)])
+		_CountingTracker.calls = 0
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def _run(self, runner, **kwargs):
+		with contextlib.redirect_stdout(io.StringIO()):
+			return runner.run(self.session, **kwargs)
+
+	def _max_error(self, table):
+		predicted = np.einsum('fij,nj->fni', table.matrices()[:, :2, :2], self.frames[0].positions) + table.matrices()[:, None, :2, 2]
+		truth = np.array([frame.positions for frame in self.frames])
+		return np.sqrt(((predicted - truth) ** 2).sum(axis= 2)).max()
+
+	def test_alignment(self):
+		runner = SessionAlignment(_CountingTracker('local_maxima', fwhm= 4), keyframes= 2, workers= 2)
+		table = self._run(runner)
+		self.assertIs(self.session.alignment, table)
+		self.assertEqual(len(table), 6)
+		self.assertEqual(len(table.keyframes), 2)
+		self.assertLess(self._max_error(table), 0.5)
+		self.assertEqual(_CountingTracker.calls, 6)
+		# Keyframes are aligned to the session stars, the other frames to their keyframe
+		self.assertEqual(sorted(table.data[:, 4].tolist()), [-1, -1, 0, 0, 1, 1])
+
+	def test_incremental(self):
+		runner = SessionAlignment(_CountingTracker('local_maxima', fwhm= 4), keyframes= [0], workers= 2)
+		first = self._run(runner)
+		self._run(runner)
+		self.assertEqual(_CountingTracker.calls, 6)
+
+		stat = os.stat(self.frames[3].path)
+		os.utime(self.frames[3].path, ns= (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+		second = self._run(runner)
+		self.assertEqual(_CountingTracker.calls, 7)
+		self.assertTrue(np.allclose(first.data, second.data))
+
+		# The keyframe changed, every frame tracked against it is aligned again
+		os.utime(self.frames[0].path, ns= (stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+		self._run(runner)
+		self.assertEqual(_CountingTracker.calls, 13)
+		self._run(SessionAlignment(_CountingTracker('local_maxima', fwhm= 4, min_dst= 10), keyframes= [0]))
+		self.assertEqual(_CountingTracker.calls, 19)
+
+	def test_persistence(self):
+		table = self._run(SessionAlignment(GlobalAlignmentTracker('local_maxima', fwhm= 4), keyframes= 2))
+		table.data[2] = np.nan
+		output = os.path.join(self._tmp.name, 'session')
+		with contextlib.redirect_stdout(io.StringIO()):
+			sessionutils.save_session(output)
+			loaded = sessionutils.load_session(output, overwrite= False)
+		self.assertIsInstance(loaded.alignment, AlignmentTable)
+		self.assertEqual(loaded.alignment.names, table.names)
+		self.assertEqual(loaded.alignment.model_key, table.model_key)
+		self.assertTrue(np.allclose(loaded.alignment.data, table.data, equal_nan= True))
+		self.assertIsNone(loaded.alignment.get(table.names[2]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,75 @@
+# type: ignore
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import write_fits
+from startrak.calibration import Calibration, combine
+from startrak.native import FileInfo
+from startrak.native.fits import get_data_hook
+
+SHAPE = (120, 160)
+
+class CalibrationTests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		self.dir = self._tmp.name
+		self.rng = np.random.default_rng(11)
+		self.bias = 1000 + self.rng.normal(0, 3, SHAPE)
+		self.dark_rate = self.rng.uniform(0, 2, SHAPE)
+		self.flat = 0.8 + 0.4 * self.rng.random(SHAPE)
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def _write(self, name, data, exptime):
+		path = os.path.join(self.dir, name)
+		write_fits(path, np.clip(data + self.rng.normal(0, 4, SHAPE), 0, 65535).astype(np.uint16), 16, 0, {'EXPTIME' : float(exptime)})
+		return FileInfo.new(path)
+
+	def _frames(self):
+		bias = [self._write(f'bias_{i}.fits', self.bias, 0) for i in range(5)]
+		dark = [self._write(f'dark_{i}.fits', self.bias + self.dark_rate * 60, 60) for i in range(5)]
+		flat = [self._write(f'flat_{i}.fits', self.bias + self.dark_rate * 2 + 20000 * (1 + 0.1 * i) * self.flat, 2) for i in range(5)]
+		return bias, dark, flat
+
+	def test_combine(self):
+		files = [self._write(f'frame_{i}.fits', self.bias, 0) for i in range(5)]
+		stack = np.array([file.get_data() for file in files], dtype= np.float32)
+		# A budget of a few rows per strip
+		self.assertTrue(np.allclose(combine(files, max_bytes= 5 * SHAPE[1] * 4 * 7), np.median(stack, axis= 0)))
+		self.assertTrue(np.allclose(combine(files, 'mean', max_bytes= 1), stack.mean(axis= 0), atol= 1e-3))
+
+		outlier = self._write('outlier.fits', self.bias + 30000, 0)
+		clipped = combine(files + [outlier], 'sigma_clip', sigma= 2)
+		self.assertLess(np.abs(clipped - self.bias).mean(), 5)
+
+	def test_calibration(self):
+		bias, dark, flat = self._frames()
+		light = self._write('light.fits', self.bias + self.dark_rate * 30 + 5000 * self.flat, 30)
+		calibration = Calibration(bias, dark, flat, cache_dir= os.path.join(self.dir, 'cache'))
+		with calibration:
+			self.assertIs(get_data_hook(), calibration)
+			data = light.get_data()
+			self.assertEqual(data.dtype, np.float32)
+			self.assertAlmostEqual(float(np.median(data)), 5000, delta= 10)
+			self.assertLess(data.std(), 10)
+			self.assertEqual(light.get_data(raw= True).dtype, np.uint16)
+			self.assertIs(light.context.data, data)
+		self.assertIsNone(get_data_hook())
+		self.assertEqual(light.get_data().dtype, np.uint16)
+
+	def test_cache(self):
+		bias, dark, flat = self._frames()
+		cache = os.path.join(self.dir, 'cache')
+		masters = Calibration(bias, dark, flat, cache_dir= cache).masters
+		self.assertEqual(len(os.listdir(cache)), 3)
+		self.assertTrue(np.array_equal(Calibration(bias, dark, flat, cache_dir= cache).masters.flat, masters.flat))
+
+		# Modifying a bias frame changes the key of every master
+		stat = os.stat(bias[0].path)
+		os.utime(bias[0].path, ns= (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+		Calibration(bias, dark, flat, cache_dir= cache).masters
+		self.assertEqual(len(os.listdir(cache)), 6)
+
+if __name__ == '__main__':
+	unittest.main()
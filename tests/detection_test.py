@@ -0,0 +1,89 @@
+# type: ignore
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_frame
+from startrak.native import FileInfo
+from startrak.starutils import detect_stars
+from startrak.types.detection import HoughCircles, LocalMaxima, TiledDetector, _suppress_close, get_detector
+from startrak.types.trackers import GlobalAlignmentTracker
+
+class DetectionTests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		self.dir = self._tmp.name
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def test_local_maxima(self):
+		spec = FieldSpec(shape= (256, 320), n_stars= 20, fwhm= 4.0, flux_range= (2e4, 2e5))
+		frame = generate_frame(os.path.join(self.dir, 'field.fits'), spec)
+		image = FileInfo.new(frame.path).get_data()
+		stars = detect_stars(image, 'local_maxima', photometry= None)
+
+		detected = np.array([star.position for star in stars])
+		distance = np.sqrt(((detected[:, None] - frame.positions[None]) ** 2).sum(axis= -1)).min(axis= 1)
+		self.assertGreaterEqual(len(stars), 18)
+		self.assertLess(np.sqrt(np.mean(distance ** 2)), 0.3)
+		for star in stars:
+			self.assertTrue(2 <= star.aperture <= 16)
+
+	def test_mesh_background(self):
+		spec = FieldSpec(shape= (256, 320), n_stars= 20, fwhm= 4.0, flux_range= (2e4, 2e5))
+		frame = generate_frame(os.path.join(self.dir, 'field.fits'), spec)
+		image = FileInfo.new(frame.path).get_data().astype(np.float32)
+		image += np.linspace(0, 3000, image.shape[1], dtype= np.float32)[None, :]		# Strong gradient
+		stars = LocalMaxima(mesh= 32).detect(image)
+
+		detected = np.array([star.position for star in stars])
+		distance = np.sqrt(((detected[:, None] - frame.positions[None]) ** 2).sum(axis= -1)).min(axis= 1)
+		self.assertGreaterEqual(len(stars), 18)
+		self.assertLess(distance.max(), 1)
+
+	def test_tiled(self):
+		spec = FieldSpec(shape= (300, 400), n_stars= 30, fwhm= 4.0, flux_range= (2e4, 2e5))
+		frame = generate_frame(os.path.join(self.dir, 'field.fits'), spec)
+		image = FileInfo.new(frame.path).get_data()
+		detector = TiledDetector(LocalMaxima(), tile_size= 128, overlap= 24, workers= 4)
+		self.assertEqual(len(detector.tiles(image.shape)), 12)
+
+		full = np.array([s.position for s in LocalMaxima().detect(image)])
+		tiled = np.array([s.position for s in detector.detect(image)])
+		self.assertEqual(len(tiled), len(full))
+		distance = np.sqrt(((tiled[:, None] - full[None]) ** 2).sum(axis= -1))
+		self.assertLess(distance.min(axis= 1).max(), 0.5)
+		# no duplicates left in the overlaps
+		distance = np.sqrt(((tiled[:, None] - tiled[None]) ** 2).sum(axis= -1))
+		np.fill_diagonal(distance, np.inf)
+		self.assertGreater(distance.min(), 4)
+
+	def test_suppression(self):
+		def greedy(points, distance, limit):
+			keep = []
+			for i, point in enumerate(points):
+				if all(((point - points[j]) ** 2).sum() >= distance ** 2 for j in keep):
+					keep.append(i)
+			return keep[:limit]
+		rng = np.random.default_rng(2)
+		for limit in (None, 10):
+			points = np.floor(rng.uniform(0, 60, (400, 2)))
+			self.assertEqual(_suppress_close(points, 6, limit).tolist(), greedy(points, 6, limit))
+		self.assertEqual(_suppress_close(points, 0).tolist(), list(range(400)))
+
+	def test_empty_image(self):
+		image = np.full((128, 128), 100, dtype= np.uint16)
+		for detector in (LocalMaxima(), HoughCircles()):
+			with self.subTest(detector= type(detector).__name__):
+				self.assertEqual(len(detector.detect(image)), 0)
+
+	def test_get_detector(self):
+		self.assertIsInstance(get_detector('local_maxima', threshold= 3), LocalMaxima)
+		detector = LocalMaxima()
+		self.assertIs(get_detector(detector), detector)
+		self.assertIs(GlobalAlignmentTracker(detector)._detector, detector)
+		with self.assertRaises(ValueError):
+			get_detector('unknown')
+
+if __name__ == '__main__':
+	unittest.main()
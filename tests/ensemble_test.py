@@ -0,0 +1,63 @@
+# type: ignore
+import unittest
+import numpy as np
+from startrak.ensemble import ensemble_photometry, instrumental_magnitudes
+from startrak.native import ReferenceStar, Star
+from startrak.types.lightcurves import LightCurves
+
+FRAMES = 300
+CATALOG = np.array([11.0, 11.5, 12.0, 12.3, 10.8, 11.7, 12.5, 13.0])
+
+class EnsembleTests(unittest.TestCase):
+	def setUp(self):
+		rng = np.random.default_rng(3)
+		index = np.arange(FRAMES)
+		# Transparency changes and noise of the zero point
+		self.zero_point = 20 + 0.3 * np.sin(index / 30) + rng.normal(0, 0.05, FRAMES)
+		magnitude = CATALOG - self.zero_point[:, None]
+		magnitude[:, 3] += 0.2 * np.sin(index / 7)		# Variable comparison
+		magnitude[:, 7] += 0.3 * np.sin(index / 11)		# Variable target
+		flux = 10 ** (-0.4 * magnitude)
+		error = 0.01 * flux * 10 ** (0.2 * (CATALOG - 11))
+		observed = flux + rng.normal(0, 1, flux.shape) * error
+		observed[5, 0] *= 1.5
+		observed[10:20, 1] = np.nan
+		self.curves = LightCurves.new(index, observed, error, [f'star_{i}' for i in range(8)])
+		self.references = []
+		for i in range(6):
+			star = ReferenceStar(f'star_{i}', (0, 0))
+			star.magnitude = CATALOG[i]
+			self.references.append(star)
+
+	def test_solution(self):
+		solution = ensemble_photometry(self.curves, self.references + [Star('star_6', (0, 0))])
+		self.assertEqual(solution.rejected, ('star_3',))
+		self.assertEqual(solution.comparisons, ('star_0', 'star_1', 'star_2', 'star_4', 'star_5'))
+		self.assertLess(np.abs(solution.zero_point - self.zero_point).max(), 0.03)
+		residual = solution.magnitude - CATALOG
+		# The target recovers its catalog magnitude within its noise, the variable keeps its amplitude
+		self.assertLess(abs(np.mean(residual[:, 6])), 0.005)
+		self.assertLess(np.std(residual[:, 6]), 1.5 * np.median(solution.error[:, 6]))
+		self.assertAlmostEqual(np.std(residual[:, 7]), 0.3 / np.sqrt(2), delta= 0.02)
+		self.assertTrue(np.isnan(solution.magnitude[10:20, 1]).all())
+		self.assertTrue(np.isfinite(solution.zero_point).all())
+		self.assertGreater(solution.scatter[3], 3 * np.median(solution.scatter))
+
+	def test_differential(self):
+		# Without catalog magnitudes (nor errors) the magnitudes are relative to the ensemble
+		curves = LightCurves.new(self.curves.time, self.curves.flux, names= self.curves.names)
+		solution = ensemble_photometry(curves, {name : 0 for name in curves.names[:6]})
+		magnitude, _ = instrumental_magnitudes(curves)
+		relative = np.nanmedian(solution.magnitude, axis= 0)
+		constant = [0, 1, 2, 4, 5, 6]
+		self.assertLess(np.abs(relative - relative[0] - (CATALOG - CATALOG[0]))[constant].max(), 0.01)
+		self.assertAlmostEqual(relative[[0, 1, 2, 4, 5]].mean(), 0, delta= 0.01)
+		# Without flux errors the uncertainty is the one of the zero point
+		self.assertTrue(np.isfinite(solution.zero_point_error).all())
+		measured = np.isfinite(solution.magnitude)
+		self.assertTrue(np.isnan(solution.error[~measured]).all())
+		self.assertTrue(np.allclose((solution.error - solution.zero_point_error[:, None])[measured], 0))
+		self.assertEqual(magnitude.shape, (FRAMES, 8))
+
+if __name__ == '__main__':
+	unittest.main()
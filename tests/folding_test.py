@@ -0,0 +1,45 @@
+# type: ignore
+import unittest
+import numpy as np
+from startrak.folding import fold, pdm
+from startrak.types.lightcurves import LightCurves
+
+class FoldingTests(unittest.TestCase):
+	def setUp(self):
+		rng = np.random.default_rng(8)
+		self.time = 2460000.5 + np.sort(rng.uniform(0, 6, 400))
+		self.periods = np.array([0.13, 0.47, 1.1])
+		# Eclipse-like square waves
+		flux = 100 + 5 * np.sign(np.sin(2 * np.pi * (self.time[:, None] - self.time[0]) / self.periods)) + rng.normal(0, 1, (400, 3))
+		flux[::5, 2] = np.nan
+		self.curves = LightCurves.new(self.time, flux)
+
+	def test_pdm(self):
+		result = pdm(self.curves, min_period= 0.05, max_period= 2, samples_per_peak= 10, keep_theta= True, max_bytes= 1 << 20)
+		# Multiples of the period fold the curves as well
+		ratio = result.best_period / self.periods
+		self.assertTrue(np.allclose(ratio, np.round(ratio), atol= 0.02))
+		self.assertTrue((result.best_theta < 0.3).all())
+		self.assertTrue(np.allclose(np.median(result.theta, axis= 1), 1, atol= 0.05))
+
+		# A fine search around a candidate of each star
+		trials = self.periods[:, None] * np.linspace(0.98, 1.02, 81)
+		local = pdm(self.curves, trials)
+		self.assertTrue(np.allclose(local.best_period, self.periods, rtol= 0.005))
+		self.assertTrue((local.best_theta < 0.06).all())
+
+	def test_fold(self):
+		folded = self.curves.fold(self.periods, 8)
+		self.assertEqual(folded.mean.shape, (8, 3))
+		self.assertTrue(np.array_equal(folded.counts.sum(axis= 0), np.isfinite(self.curves.flux).sum(axis= 0)))
+		# Reference binning of the second star
+		phase = ((self.time - self.time[0]) / self.periods[1]) % 1
+		bins = np.minimum((phase * 8).astype(int), 7)
+		flux = self.curves.flux[:, 1]
+		self.assertTrue(np.allclose(folded.mean[:, 1], [flux[bins == b].mean() for b in range(8)]))
+		self.assertTrue(np.allclose(folded.scatter[:, 1], [flux[bins == b].std(ddof= 1) for b in range(8)]))
+		self.assertTrue(np.allclose(folded.phase, (np.arange(8) + 0.5) / 8))
+		self.assertTrue(np.allclose(fold(self.curves, 0.47, 8).mean[:, 1], folded.mean[:, 1]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+# type: ignore
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_sequence
+from startrak import framecontext
+from startrak.native import FileInfo
+from startrak.starutils import detect_stars
+from startrak.types import detection
+from startrak.types.trackers import GlobalAlignmentTracker
+
+class _CountingDetector(detection.LocalMaxima):
+	calls = 0
+	def _detect(self, image):
+		type(self).calls += 1
+		return super()._detect(image)
+
+class FrameContextTests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		spec = FieldSpec(shape= (128, 128), n_stars= 15, fwhm= 4.0, flux_range= (2e4, 2e5))
+		self.frames = generate_sequence(self._tmp.name, 3, spec, drift= (2, 1))
+		self.files = [FileInfo.new(frame.path) for frame in self.frames]
+		framecontext.clear_contexts()
+		_CountingDetector.calls = 0
+	def tearDown(self):
+		framecontext.clear_contexts()
+		framecontext.configure(max_frames= 8, max_bytes= 512 << 20)
+		self._tmp.cleanup()
+
+	def test_products(self):
+		context = self.files[0].context
+		self.assertIs(self.files[0].context, context)
+		self.assertIs(framecontext.find_context(context.data), context)
+		self.assertIsNone(framecontext.find_context(context.data.copy()))
+		self.assertIs(context.stretched(2), context.stretched(2))
+		self.assertEqual(context.level(1).shape, (64, 64))
+		self.assertEqual(context.background(32).level.shape, (4, 4))
+		self.assertGreater(context.nbytes, context.data.nbytes)
+
+	def test_shared_detection(self):
+		context = self.files[0].context
+		stars = detect_stars(context.data, _CountingDetector(fwhm= 4), photometry= None)
+		tracker = GlobalAlignmentTracker(_CountingDetector(fwhm= 4))
+		tracker.setup_model(stars)
+		solution = tracker.track(context.data)
+		self.assertEqual(_CountingDetector.calls, 1)
+		self.assertAlmostEqual(solution.translation.x, 0, delta= 0.1)
+		# Results are copied, modifying them does not change the cached detection
+		stars[0].position = (-1, -1)
+		self.assertNotEqual(tuple(context.detect(_CountingDetector(fwhm= 4))[0].position), (-1, -1))
+		context.detect(_CountingDetector(fwhm= 5))
+		self.assertEqual(_CountingDetector.calls, 2)
+
+	def test_working_set(self):
+		framecontext.configure(max_frames= 2)
+		contexts = []
+		for file in self.files:
+			contexts.append(file.context)
+			contexts[-1].stats()
+		self.assertEqual(framecontext.working_set()[0], 2)
+		# Evicted contexts keep their data for whoever still holds them, but are no longer found
+		self.assertTrue(contexts[0].evicted)
+		self.assertTrue(contexts[0].loaded)
+		self.assertIsNone(framecontext.find_context(contexts[0].data))
+		reloaded = self.files[0].context
+		self.assertIsNot(reloaded, contexts[0])
+
+		# The most recently used frame is kept even if it exceeds the budget
+		reloaded.stats()
+		framecontext.configure(max_frames= 8, max_bytes= 0)
+		self.assertEqual(framecontext.working_set()[0], 1)
+		self.assertFalse(reloaded.evicted)
+		self.assertTrue(contexts[2].evicted)
+
+		# An evicted context that reads its data joins the working set again
+		framecontext.configure(max_frames= 1, max_bytes= 512 << 20)
+		pending = self.files[1].context
+		self.files[2].context
+		self.assertTrue(pending.evicted)
+		self.assertIs(framecontext.find_context(pending.data), pending)
+		self.assertFalse(pending.evicted)
+		self.assertIs(self.files[1].context, pending)
+
+	def test_invalidation(self):
+		context = self.files[1].context
+		context.stats()
+		stat = os.stat(self.files[1].path)
+		os.utime(self.files[1].path, ns= (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+		self.assertIsNot(self.files[1].context, context)
+		self.assertTrue(context.evicted)
+
+if __name__ == '__main__':
+	unittest.main()
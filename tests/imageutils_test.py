@@ -0,0 +1,81 @@
+# type: ignore
+import unittest
+import numpy as np
+from startrak.imageutils import BackgroundMesh, background_mesh, clear_stats, frame_stats, linear_stretch, sigma_stretch
+
+class FrameStatsTests(unittest.TestCase):
+	def setUp(self):
+		rng = np.random.default_rng(5)
+		self.image = rng.normal(1000, 30, (301, 200)).clip(0)
+
+	def _check(self, data):
+		stats = frame_stats(data, cache= False)
+		median = np.median(data)
+		self.assertAlmostEqual(stats.median, median)
+		self.assertAlmostEqual(stats.mad, np.median(np.abs(data.astype(float) - median)))
+		self.assertAlmostEqual(stats.std, data.std())
+		self.assertEqual((stats.minimum, stats.maximum), (data.min(), data.max()))
+
+	def test_histogram(self):
+		for dtype, offset in ((np.uint16, 0), (np.int16, -1500), (np.uint8, -900)):
+			with self.subTest(np.dtype(dtype).name):
+				data = (self.image + offset).clip(np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+				self._check(data)
+				self._check(data[1:])		# Even number of pixels
+
+	def test_sampled(self):
+		data = self.image.astype(np.float32)
+		data[0, :10] = np.nan
+		stats = frame_stats(data, samples= 1 << 12)
+		self.assertAlmostEqual(stats.median, 1000, delta= 3)
+		self.assertAlmostEqual(stats.sigma, 30, delta= 3)
+
+	def test_cache(self):
+		data = self.image.astype(np.uint16)
+		stats = frame_stats(data)
+		self.assertIs(frame_stats(data), stats)
+		self.assertIsNot(frame_stats(data.copy()), stats)
+		data[:] = 0
+		self.assertIs(frame_stats(data), stats)
+		clear_stats()
+		self.assertEqual(frame_stats(data).median, 0)
+
+	def test_stretch(self):
+		for dtype in (np.uint16, np.int16, np.float64):
+			with self.subTest(np.dtype(dtype).name):
+				data = (self.image - (1500 if dtype is np.int16 else 0)).astype(dtype)
+				median, std = np.median(data), data.std()
+				expected = np.clip((data - (median - 2 * std)) * (255 / (4 * std)), 0, 255).astype(np.uint8)
+				stretched = sigma_stretch(data, sigma= 2)
+				self.assertEqual(stretched.dtype, np.uint8)
+				# Float images use sampled statistics
+				self.assertLessEqual(np.abs(stretched.astype(int) - expected).max(), 0 if dtype is not np.float64 else 2)
+		self.assertFalse(linear_stretch(np.ones((4, 4)), 1, 1).any())
+
+class BackgroundMeshTests(unittest.TestCase):
+	def test_gradient(self):
+		rng = np.random.default_rng(7)
+		y, x = np.mgrid[:300, :420]
+		level = 1000 + 0.5 * x - 0.3 * y
+		image = rng.normal(level, 10)
+		# Bright pixels (stars) must be clipped
+		image[rng.integers(0, 300, 2000), rng.integers(0, 420, 2000)] += 5000
+		image = image.astype(np.uint16)
+
+		mesh = BackgroundMesh(image, box= 32)
+		self.assertEqual(mesh.level.shape, (10, 14))
+		self.assertLess(np.abs(mesh.map() - level)[32:-32, 32:-32].max(), 4)
+		# The gradient inside each cell adds its own variance to the noise
+		self.assertAlmostEqual(float(np.median(mesh.rms)), np.sqrt(10 ** 2 + (16 ** 2 + 9.6 ** 2) / 12), delta= 0.5)
+		px, py = rng.uniform(0, 419, 50), rng.uniform(0, 299, 50)
+		self.assertTrue(np.allclose(mesh.at(px, py), [mesh.map()[int(round(b)), int(round(a))] for a, b in zip(px, py)], atol= 1))
+		self.assertTrue((mesh.max_at(px, py) >= mesh.at(px, py) - 1e-3).all())
+		self.assertEqual(float(mesh.max_at(16, 16)), float(mesh.level[:2, :2].max()))
+
+		self.assertIs(background_mesh(image, 32), background_mesh(image, 32))
+		self.assertIsNot(background_mesh(image, 32), background_mesh(image, 64))
+		flat = BackgroundMesh(np.full((10, 10), 5.0))
+		self.assertEqual(float(flat.at(3, 3)), 5)
+
+if __name__ == '__main__':
+	unittest.main()
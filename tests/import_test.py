@@ -0,0 +1,28 @@
+# type: ignore
+import subprocess
+import sys
+import unittest
+
+class ImportTests(unittest.TestCase):
+	def _loaded(self, statement):
+		code = f'import sys; {statement}; print(",".join(sys.modules))'
+		out = subprocess.run([sys.executable, '-c', code], capture_output= True, text= True, check= True)
+		return out.stdout.strip().split(',')
+
+	def test_lazy_import(self):
+		modules = self._loaded('import startrak')
+		self.assertNotIn('cv2', modules)
+		self.assertNotIn('startrak.starutils', modules)
+		self.assertNotIn('startrak.sessionutils', modules)
+
+	def test_lazy_names(self):
+		modules = self._loaded('from startrak import *; detect_stars, get_session, load_file')
+		self.assertIn('startrak.sessionutils', modules)
+		self.assertNotIn('cv2', modules)
+		import startrak
+		self.assertEqual(set(startrak.__all__) - set(dir(startrak)), set())
+		with self.assertRaises(AttributeError):
+			startrak.not_a_name
+
+if __name__ == '__main__':
+	unittest.main()
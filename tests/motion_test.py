@@ -0,0 +1,54 @@
+# type: ignore
+import contextlib
+import io
+import math
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.scenarios import Fixture, _reference_stars
+from benchmarks.synthetic import FieldSpec, generate_sequence
+from startrak.native import FileInfo, Position, TrackingSolution
+from startrak.types.motion import ConstantVelocity, KalmanMotion
+from startrak.types.trackers import PhotometryTracker
+
+class MotionModelTests(unittest.TestCase):
+	def test_constant_velocity(self):
+		model = ConstantVelocity(history= 3, min_error= 0.5)
+		self.assertIsNone(model.predict())
+		for i in range(5):
+			model.update(TrackingSolution.new('test', Position(2. * i, -1. * i), 0.01 * i, 0), time= 10. * i)
+		prediction = model.predict(50.)
+		self.assertAlmostEqual(prediction.translation.x, 10)
+		self.assertAlmostEqual(prediction.translation.y, -5)
+		self.assertAlmostEqual(math.atan2(prediction.rotation_matrix.c, prediction.rotation_matrix.a), 0.05)
+		self.assertAlmostEqual(prediction.error, 0.5)
+		model.reset()
+		self.assertIsNone(model.predict())
+
+	def test_kalman(self):
+		model = KalmanMotion()
+		rng = np.random.default_rng(1)
+		for i in range(20):
+			noise = rng.normal(0, 0.2, 2)
+			model.update(TrackingSolution.new('test', Position(1.5 * i + noise[0], 0.5 * i + noise[1]), 0, 0))
+		prediction = model.predict()
+		self.assertAlmostEqual(prediction.translation.x, 30, delta= 0.5)
+		self.assertAlmostEqual(prediction.translation.y, 10, delta= 0.5)
+		self.assertLess(prediction.error, 1)
+
+	def test_seeded_tracking(self):
+		with tempfile.TemporaryDirectory() as directory:
+			spec = FieldSpec(shape= (384, 384), n_stars= 30, fwhm= 4.0, flux_range= (2e4, 2e5))
+			frames = generate_sequence(directory, 10, spec, drift= (3.0, -2.0))
+			stars = _reference_stars(Fixture('test', spec, frames, directory))
+			tracker = PhotometryTracker(12, tracking_steps= 3, size_mul= 'auto', motion_model= ConstantVelocity())
+			tracker.setup_model(stars)
+			with contextlib.redirect_stdout(io.StringIO()):
+				for i, frame in enumerate(frames):
+					solution = tracker.track(FileInfo.new(frame.path).get_data(), time= 10. * i)
+					predicted = np.array([tuple(solution.transform(Position(*p))) for p in frames[0].positions])
+					error = np.sqrt(((predicted - frame.positions) ** 2).sum(axis= 1))
+					self.assertLess(np.median(error), 1.0)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+# type: ignore
+import unittest
+import warnings
+import numpy as np
+from startrak.native import PhotometryResult, Star
+from startrak.periodogram import frequency_grid, lomb_scargle
+from startrak.types.lightcurves import LightCurves
+from startrak.types.pipeline import FrameResult
+
+def direct_power(t, y, frequencies):
+	# Floating mean periodogram by least squares at every frequency
+	residual = np.sum((y - y.mean()) ** 2)
+	power = []
+	for f in frequencies:
+		design = np.column_stack((np.ones_like(t), np.cos(2 * np.pi * f * t), np.sin(2 * np.pi * f * t)))
+		fit = np.linalg.lstsq(design, y, rcond= None)[0]
+		power.append(1 - np.sum((y - design @ fit) ** 2) / residual)
+	return np.array(power)
+
+class PeriodogramTests(unittest.TestCase):
+	def setUp(self):
+		self.rng = np.random.default_rng(5)
+		self.time = 2460000.5 + np.sort(self.rng.uniform(0, 8, 250))
+		self.periods = np.array([0.061, 0.37, 1.9])
+		signal = 4 * np.sin(2 * np.pi * (self.time[:, None] - self.time[0]) / self.periods)
+		flux = 1000 + signal + self.rng.normal(0, 1, (250, 3))
+		flux[::9, 1] = np.nan
+		self.curves = LightCurves.new(self.time, flux, np.ones_like(flux))
+
+	def test_periods(self):
+		result = lomb_scargle(self.curves, min_period= 0.05, chunk= 2000, keep_power= True, workers= 1)
+		self.assertTrue(np.allclose(result.best_period, self.periods, rtol= 0.01))
+		self.assertTrue((result.false_alarm < 1e-10).all())
+		self.assertEqual(result.power.shape, (3, len(result.frequency)))
+
+		valid = np.isfinite(self.curves.flux[:, 1])
+		direct = direct_power(self.time[valid], self.curves.flux[valid, 1], result.frequency)
+		self.assertLess(np.abs(direct - result.power[1]).max(), 1e-3)
+
+		parallel = lomb_scargle(self.curves, min_period= 0.05, chunk= 2000, workers= 2, max_bytes= 1)
+		self.assertTrue(np.allclose(parallel.best_power, result.best_power))
+		self.assertIsNone(parallel.power)
+
+	def test_noise(self):
+		noise = LightCurves.new(self.time, self.rng.normal(0, 1, (250, 4)))
+		result = lomb_scargle(noise, frequency= frequency_grid(self.time, 0.05), workers= 1)
+		self.assertTrue((result.false_alarm > 0.01).all())
+		self.assertTrue((result.best_power < 0.2).all())
+
+	def test_missing_star(self):
+		flux = self.curves.flux.copy()
+		flux[:, 2] = np.nan
+		curves = LightCurves.new(self.time, flux, self.curves.error)
+		with warnings.catch_warnings():
+			warnings.simplefilter('error')
+			result = lomb_scargle(curves, min_period= 0.05, workers= 1)
+		self.assertTrue(np.allclose(result.best_period[:2], self.periods[:2], rtol= 0.01))
+
+	def test_from_results(self):
+		stars = [Star('a', (0, 0)), Star('b', (1, 1))]
+		results = [FrameResult(None, None, [PhotometryResult.new(method= 'aperture', flux= flux, flux_sigma= 2, flux_raw= 0, flux_max= 0,
+										background= 10, background_sigma= 1, background_max= 0, aperture_radius= 4, annulus_width= 0, annulus_offset= 0)
+										for flux in (100 + i, -5)]) for i in range(4)]
+		curves = LightCurves.from_results(results, stars, time= [3, 2, 1, 0])
+		self.assertEqual(curves.names, ('a', 'b'))
+		self.assertEqual(curves.shape, (4, 2))
+		self.assertTrue(np.isnan(curves.flux[:, 1]).all())
+		self.assertAlmostEqual(curves.error[0, 0], np.sqrt(5))
+		self.assertTrue(np.array_equal(curves.sorted().flux[:, 0], [103, 102, 101, 100]))
+		self.assertEqual(curves.select(['b']).names, ('b',))
+
+if __name__ == '__main__':
+	unittest.main()
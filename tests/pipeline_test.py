@@ -0,0 +1,83 @@
+# type: ignore
+import contextlib
+import io
+import unittest
+from startrak import *
+from startrak.io import *
+from startrak.events import register_to, get_event
+from startrak.metrics import LatencyMetrics
+from startrak.types.pipeline import LivePipeline, FrameResult
+from startrak.types.trackers import PhotometryTracker
+
+paths = ["aefor4.fit", "aefor7.fit", "aefor16.fit", "aefor25.fit"]
+dir = "./tests/sample_files/"
+
+class PipelineTests(unittest.TestCase):
+	def setUp(self):
+		self.session = new_session('Pipeline session', 'inspect', overwrite= True)
+		image = load_file(dir + paths[0], append= False).get_data()
+		self.session.add_star( *detect_stars(image))
+
+	def test_process_all(self):
+		received = []
+		register_to('pipeline_test', received.append)
+		pipeline = LivePipeline(PhotometryTracker(20), policy= 'block', queue_size= 1, event_name= 'pipeline_test')
+		pipeline.start(self.session)
+		for path in paths:
+			self.assertTrue(pipeline.submit(load_file(dir + path, append= False)))
+		pipeline.stop()
+		
+		self.assertEqual(pipeline.processed, len(paths))
+		self.assertEqual(len(received), len(paths))
+		self.assertIsInstance(received[0], FrameResult)
+		self.assertEqual(len(received[0].photometry), len(self.session.included_stars))
+		get_event('pipeline_test').forget()
+
+	def test_ring_buffer(self):
+		pipeline = LivePipeline(PhotometryTracker(20), workers= 1, policy= 'block', buffer_size= 2)
+		pipeline.start(self.session)
+		for path in paths:
+			pipeline.submit(load_file(dir + path, append= False))
+		pipeline.stop()
+		self.assertEqual(len(pipeline.results), 2)
+		self.assertEqual(pipeline.results[-1].file.name, paths[-1])
+
+	def test_latency_metrics(self):
+		metrics = LatencyMetrics(window= 3)
+		pipeline = LivePipeline(PhotometryTracker(20), policy= 'block', metrics= metrics)
+		pipeline.start(self.session)
+		for path in paths:
+			pipeline.submit(load_file(dir + path, append= False))
+		pipeline.stop()
+		
+		self.assertEqual(metrics.in_flight, 0)
+		for stage in ('loaded', 'tracked', 'photometered', 'total'):
+			stats = metrics.percentiles(stage)
+			self.assertEqual(stats.samples, 3)
+			self.assertTrue(0 <= stats.p50 <= stats.p95 <= stats.p99 <= stats.max)
+		self.assertIn(metrics.bottleneck(), ('loaded', 'tracked', 'photometered'))
+		with self.assertRaises(ValueError):
+			metrics.mark(paths[0], 'invalid')
+
+	def test_failing_listener(self):
+		def fail(result):
+			raise ValueError('listener error')
+		register_to('pipeline_fail', fail)
+		pipeline = LivePipeline(PhotometryTracker(20), workers= 1, policy= 'block', event_name= 'pipeline_fail')
+		pipeline.start(self.session)
+		output = io.StringIO()
+		with contextlib.redirect_stdout(output):
+			for path in paths:
+				pipeline.submit(load_file(dir + path, append= False))
+			pipeline.stop()
+		self.assertEqual(pipeline.processed, len(paths))
+		self.assertIn('listener error', output.getvalue())
+		get_event('pipeline_fail').forget()
+
+	def test_not_running(self):
+		pipeline = LivePipeline(PhotometryTracker(20))
+		with self.assertRaises(RuntimeError):
+			pipeline.submit(load_file(dir + paths[0], append= False))
+
+if __name__ == '__main__':
+	unittest.main()
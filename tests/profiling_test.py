@@ -0,0 +1,38 @@
+# type: ignore
+import unittest
+from startrak import framecontext, profiling
+from startrak.io import load_file
+from startrak.native import FileInfo
+from startrak.starutils import detect_stars
+from startrak.types.trackers import PhotometryTracker
+
+TEST_FITS = './tests/sample_files/aefor4.fit'
+
+class ProfilingTests(unittest.TestCase):
+	def test_session_hooks(self):
+		original = PhotometryTracker.__dict__['track']
+		framecontext.clear_contexts()		# Detections cached by other tests would not be run again
+		with profiling.session():
+			file = FileInfo.new(TEST_FITS)
+			stars = detect_stars(file.get_data())
+			tracker = PhotometryTracker(16)
+			tracker.setup_model(stars)
+			with profiling.stage('tracking'):
+				tracker.track(file.get_data())
+		stats = profiling.get_stats()
+		
+		for name in ('fits.read_header', 'fits.read_data', 'StarDetector.detect', 'PhotometryTracker.track', 'tracking'):
+			self.assertIn(name, stats)
+		self.assertGreater(stats['fits.read_data'].bytes, 0)
+		self.assertIn('tracking;PhotometryTracker.track', profiling.flame())
+		self.assertIs(PhotometryTracker.__dict__['track'], original)
+		self.assertFalse(profiling.is_enabled())
+
+	def test_disabled(self):
+		profiling.reset()
+		with profiling.stage('ignored'):
+			pass
+		self.assertEqual(len(profiling.get_stats()), 0)
+
+if __name__ == '__main__':
+	unittest.main()
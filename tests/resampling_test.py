@@ -0,0 +1,70 @@
+# type: ignore
+import unittest
+import numpy as np
+from startrak.imageutils import bilinear_sample
+from startrak.native import Position, TrackingSolution
+from startrak.resampling import clear_plans, sample, warp, _plans
+
+class ResamplingTests(unittest.TestCase):
+	def setUp(self):
+		rng = np.random.default_rng(4)
+		self.stars = rng.uniform(10, 190, (40, 2))
+		self.image = self._render(*np.mgrid[:150, :200][::-1])
+		self.solution = TrackingSolution.new('test', Position(3.3, -2.7), 0.02, 0)
+		clear_plans()
+
+	def _render(self, x, y):
+		# Gaussian stars (sigma 1.5 px) over a flat background
+		image = np.full(x.shape, 100.0)
+		for sx, sy in self.stars:
+			image += 1000 * np.exp(-((x - sx) ** 2 + (y - sy) ** 2) / (2 * 1.5 ** 2))
+		return image
+
+	def _truth(self):
+		y, x = np.mgrid[:150, :200]
+		m = np.asarray(self.solution.matrix)
+		return self._render(m[0, 0] * x + m[0, 1] * y + m[0, 2], m[1, 0] * x + m[1, 1] * y + m[1, 2])
+
+	def test_methods(self):
+		truth = self._truth()
+		inner = (slice(10, -10), slice(10, -10))
+		errors = {}
+		for method in ('nearest', 'bilinear', 'lanczos'):
+			warped = warp(self.image, self.solution, method)
+			self.assertEqual(warped.shape, (150, 200))
+			errors[method] = np.abs(warped - truth)[inner].max()
+		self.assertLess(errors['lanczos'], errors['bilinear'])
+		self.assertLess(errors['bilinear'], errors['nearest'])
+		self.assertLess(errors['lanczos'], 40)
+
+		m = np.asarray(self.solution.matrix)
+		y, x = np.mgrid[:150, :200]
+		sx, sy = m[0, 0] * x + m[0, 1] * y + m[0, 2], m[1, 0] * x + m[1, 1] * y + m[1, 2]
+		self.assertTrue(np.allclose(sample(self.image, sx, sy), bilinear_sample(self.image, sx, sy), equal_nan= True))
+		self.assertTrue(np.isnan(warp(self.image, self.solution)[:, -1]).all())
+
+	def test_plans(self):
+		out = np.zeros((150, 200))
+		self.assertIs(warp(self.image, self.solution, out= out), out)
+		self.assertEqual(len(_plans), 1)
+		# Transforms closer than the quantum share the plan
+		close = TrackingSolution.new('test', Position(3.3 + 1e-4, -2.7), 0.02, 0)
+		self.assertTrue(np.array_equal(warp(self.image, close), warp(self.image, self.solution), equal_nan= True))
+		self.assertEqual(len(_plans), 1)
+		warp(self.image, self.solution, 'lanczos', fill= 0)
+		self.assertEqual(len(_plans), 2)
+
+	def test_integer_shift(self):
+		shift = np.array([[1, 0, 5], [0, 1, 3], [0, 0, 1]])
+		view = warp(self.image, shift, shape= (100, 150))
+		self.assertTrue(np.shares_memory(view, self.image))
+		self.assertTrue(np.array_equal(view, self.image[3:103, 5:155]))
+
+		shifted = warp(self.image, np.array([[1, 0, -5], [0, 1, 3], [0, 0, 1]]))
+		self.assertFalse(np.shares_memory(shifted, self.image))
+		self.assertTrue(np.isnan(shifted[:, :5]).all() and np.isnan(shifted[-3:]).all())
+		self.assertTrue(np.array_equal(shifted[:-3, 5:], self.image[3:, :-5]))
+		self.assertEqual(len(_plans), 0)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -2,6 +2,10 @@
 __unittest = True
 
 
+import os
+import shutil
+import tempfile
+import time
 import unittest
 from startrak.internals.exceptions import InstantiationError 
 from startrak import *
@@ -47,6 +51,19 @@ class SessionTests(unittest.TestCase):
 			s = new_session(sessionName, 'inspect', overwrite= True)
 			s.add_file( *load_folder(dir))
 			self.assertEqual(len(paths), len(s.included_files))
+	def test_scan_watcher(self):
+		for backend in ('inotify', 'poll'):
+			with self.subTest(backend), tempfile.TemporaryDirectory() as tmp:
+				session = new_session(sessionName, 'scan', tmp, watcher_backend= backend, overwrite= True)
+				time.sleep(0.1)
+				shutil.copy(dir + paths[0], tmp)
+				time.sleep(0.5)
+				self.assertEqual(len(session.included_files), 1)
+				os.remove(os.path.join(tmp, paths[0]))
+				time.sleep(0.5)
+				self.assertEqual(len(session.included_files), 0)
+				session.end_scan()
+
 # ------------- Test for exceptions ---------------
 	def test_invalid_case(self):
 		with self.assertRaises(NameError):
@@ -0,0 +1,75 @@
+# type: ignore
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_sequence, write_fits
+from startrak import sessionutils
+from startrak.native import FileInfo, Star, StarList, TrackingSolution
+from startrak.stacking import stack_frames
+from startrak.starutils import detect_stars
+from startrak.types.trackers import GlobalAlignmentTracker
+
+class StackingTests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		spec = FieldSpec(shape= (200, 240), n_stars= 25, fwhm= 4.0, flux_range= (2e4, 2e5))
+		cls.frames = generate_sequence(cls._tmp.name, 6, spec, drift= (2.5, -1.5), rotation= 0.2)
+		cls.files = [FileInfo.new(frame.path) for frame in cls.frames]
+		cls.stars = StarList( *[Star(f'star_{i}', (float(x), float(y)), 6) for i, (x, y) in enumerate(cls.frames[0].positions)])
+		tracker = GlobalAlignmentTracker('local_maxima', fwhm= 4)
+		tracker.setup_model(cls.stars)
+		with contextlib.redirect_stdout(io.StringIO()):
+			cls.solutions = [tracker.track(file.get_data()) for file in cls.files]
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def test_alignment(self):
+		result = stack_frames(self.files, self.solutions, max_bytes= 1 << 18)
+		self.assertEqual(result.image.shape, (200, 240))
+		self.assertEqual(result.coverage.max(), 6)
+		self.assertTrue(np.isnan(result.image[result.coverage == 0]).all())
+		stars = detect_stars(result.filled(), 'local_maxima', photometry= None, fwhm= 4)
+		detected = np.array([star.position for star in stars])
+		distance = np.sqrt(((detected[:, None] - self.frames[0].positions[None]) ** 2).sum(axis= -1)).min(axis= 1)
+		self.assertGreaterEqual(len(stars), 23)
+		self.assertLess(np.median(distance), 0.1)
+
+	def test_methods(self):
+		# A bright block (e.g. a satellite trail) in one of the frames
+		data = self.files[0].get_data().copy()
+		data[50:70, 50:70] = 30000
+		path = os.path.join(self._tmp.name, 'outlier.fits')
+		write_fits(path, data, 16, 0, {})
+		files = self.files + [FileInfo.new(path)]
+		solutions = self.solutions + [TrackingSolution.identity()]
+
+		mean = stack_frames(files, solutions, 'mean', workers= 1)
+		for method in ('median', 'sigma_clip'):
+			with self.subTest(method):
+				result = stack_frames(files, solutions, method, sigma= 2, workers= 1)
+				self.assertLess(np.abs(result.image[55:65, 55:65] - mean.image[120:130, 150:160].mean()).max(), 2000)
+				self.assertTrue(np.array_equal(result.image, stack_frames(files, solutions, method, sigma= 2, workers= 2, max_bytes= 1 << 18).image, equal_nan= True))
+		self.assertGreater(mean.image[55:65, 55:65].min(), 4000)
+
+	def test_session(self):
+		session = sessionutils.new_session('stacking', 'inspect', self._tmp.name, overwrite= True)
+		session.add_file( *self.files)
+		session.add_star( *self.stars)
+		with self.assertRaises(RuntimeError):
+			sessionutils.stack_session()
+		with contextlib.redirect_stdout(io.StringIO()):
+			sessionutils.align_session(GlobalAlignmentTracker('local_maxima', fwhm= 4))
+		result = sessionutils.stack_session(workers= 1)
+		expected = stack_frames(self.files, self.solutions)
+		# The session solutions may differ by a small fraction of a pixel, which moves the edges of the coverage
+		covered = (result.coverage > 0) & (expected.coverage > 0)
+		self.assertLess(np.abs(np.count_nonzero(result.coverage) - np.count_nonzero(expected.coverage)), 0.01 * covered.size)
+		self.assertTrue(np.allclose(result.image[covered], expected.image[covered], atol= 50))
+
+if __name__ == '__main__':
+	unittest.main()
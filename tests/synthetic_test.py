@@ -0,0 +1,42 @@
+# type: ignore
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_frame, generate_sequence, render_field
+from startrak.native import FileInfo
+
+class SyntheticFieldTests(unittest.TestCase):
+	def setUp(self):
+		self._tmp = tempfile.TemporaryDirectory()
+		self.dir = self._tmp.name
+	def tearDown(self):
+		self._tmp.cleanup()
+
+	def test_bitpix_roundtrip(self):
+		for bitpix in (8, 16, 32, -32, -64):
+			with self.subTest(bitpix= bitpix):
+				spec = FieldSpec(shape= (64, 96), bitpix= bitpix, n_stars= 5, background= 50, flux_range= (100, 500), read_noise= 0, poisson= False)
+				frame = generate_frame(os.path.join(self.dir, f'bp{bitpix}.fits'), spec)
+				data = FileInfo.new(frame.path).get_data()
+				expected = render_field(spec, frame.positions, frame.fluxes)
+				self.assertEqual(data.shape, (64, 96))
+				self.assertLess(np.max(np.abs(data - expected)), 0.51 if bitpix > 0 else 1e-3)
+
+	def test_deterministic(self):
+		spec = FieldSpec(shape= (64, 64), n_stars= 5)
+		a = FileInfo.new(generate_frame(os.path.join(self.dir, 'a.fits'), spec).path).get_data()
+		b = FileInfo.new(generate_frame(os.path.join(self.dir, 'b.fits'), spec).path).get_data()
+		self.assertTrue(np.array_equal(a, b))
+
+	def test_sequence(self):
+		spec = FieldSpec(shape= (128, 128), n_stars= 8, exptime= 30)
+		frames = generate_sequence(self.dir, 3, spec, drift= (1, 2), rotation= 0.5)
+		self.assertEqual(len(frames), 3)
+		self.assertTrue(np.allclose(frames[2].translation, (2, 4)))
+		headers = [FileInfo.new(f.path).header for f in frames]
+		self.assertEqual(headers[1]['DATE-OBS'], '2024-01-01T00:00:30.000')
+		self.assertEqual(headers[0]['EXPTIME'], 30)
+
+if __name__ == '__main__':
+	unittest.main()
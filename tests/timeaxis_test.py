@@ -0,0 +1,59 @@
+# type: ignore
+import contextlib
+import io
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_sequence
+from startrak.native import FileInfo, FileList, Header
+from startrak.timeaxis import TimeIndex, exposure_times, frame_time, frame_times
+
+def header(**keys):
+	return Header('frame.fits', {'SIMPLE' : True, 'BITPIX' : 16, 'NAXIS' : 2, **{key.replace('_', '-') : value for key, value in keys.items()}})
+
+class TimeAxisTests(unittest.TestCase):
+	def test_frame_time(self):
+		self.assertEqual(frame_time(header(JD= 2455000.25)), 2455000.25)
+		self.assertEqual(frame_time(header(MJD_OBS= 55000.)), 2455000.5)
+		self.assertEqual(frame_time(header(JD= 2455000.25, MJD_OBS= 1., DATE_OBS= '2000-01-01')), 2455000.25)
+		self.assertAlmostEqual(frame_time(header(DATE_OBS= '2000-01-01T12:00:00.000')), 2451545.0, places= 9)
+		self.assertAlmostEqual(frame_time(header(DATE_OBS= '2000-01-01', TIME_OBS= '18:00:00')), 2451545.25, places= 9)
+		self.assertAlmostEqual(frame_time(header(DATE_OBS= '2000-01-01T12:00:00', EXPTIME= 864.)), 2451545.005, places= 9)
+		self.assertAlmostEqual(frame_time(header(DATE_OBS= '2000-01-01T12:00:00', EXPOSURE= 864.), midpoint= False), 2451545.0, places= 9)
+		self.assertTrue(np.isnan(frame_time(header())))
+		with contextlib.redirect_stdout(io.StringIO()):
+			self.assertTrue(np.isnan(frame_time(header(DATE_OBS= 'yesterday'))))
+		self.assertAlmostEqual(frame_time(FileInfo.new('./tests/sample_files/aefor4.fit').header, midpoint= False), 2455583.6970486, places= 6)
+
+	def test_files(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			spec = FieldSpec(shape= (32, 32), n_stars= 2, exptime= 30.)
+			frames = generate_sequence(tmp, 5, spec, cadence= 60.)
+			files = [FileInfo.new(frame.path) for frame in frames]
+			start = (datetime(2024, 1, 1) - datetime(1970, 1, 1)).total_seconds() / 86400 + 2440587.5
+			expected = start + (60. * np.arange(5) + 15.) / 86400
+			self.assertTrue(np.allclose(frame_times(files), expected, rtol= 0, atol= 1e-8))
+			self.assertTrue(np.array_equal(exposure_times(files), [30.] * 5))
+
+			index = TimeIndex.from_files(files[::-1])
+			self.assertEqual(len(index), 5)
+			selected = index.select(expected[1], expected[3])
+			self.assertIsInstance(selected, FileList)
+			self.assertEqual([file.path for file in selected], [files[1].path, files[2].path])
+
+	def test_index(self):
+		values = np.array([5., 1., np.nan, 3., 2., 8., 3.])
+		index = TimeIndex(values)
+		self.assertEqual(len(index), 6)
+		self.assertEqual(index.span, (1., 8.))
+		self.assertTrue(np.array_equal(index.range(2., 5.), [4, 3, 6]))
+		self.assertEqual(index.count(0., 100.), 6)
+		self.assertEqual(index.count(9., 10.), 0)
+		self.assertEqual(index.nearest(4.9), 0)
+		self.assertTrue(np.array_equal(index.nearest([-1., 7., 100.]), [1, 5, 5]))
+		self.assertEqual([list(w) for w in index.split([0., 2., 4., 10.])], [[1], [4, 3, 6], [0, 5]])
+		self.assertEqual([list(w) for w in index.windows(3.)], [[1, 4, 3, 6], [0], [5]])
+
+if __name__ == '__main__':
+	unittest.main()
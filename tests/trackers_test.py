@@ -0,0 +1,122 @@
+# type: ignore
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import FieldSpec, generate_sequence
+from startrak.imageutils import ImagePyramid, block_average, extract_windows, refine_centroids
+from startrak.native import FileInfo, Position, PositionArray, Star, StarList, TrackingSolution
+from startrak.types.trackers import GlobalAlignmentTracker, PhaseCorrelationTracker, PhotometryTracker
+from benchmarks.scenarios import Fixture, _reference_stars
+
+class TrackerTests(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._tmp = tempfile.TemporaryDirectory()
+		spec = FieldSpec(shape= (512, 512), n_stars= 40, fwhm= 4.0, flux_range= (2e4, 2e5))
+		cls.frames = generate_sequence(cls._tmp.name, 3, spec, drift= (3.5, -2.0))
+		cls.stars = StarList( *[Star(f'star_{i}', (float(x), float(y)), 6) for i, (x, y) in enumerate(cls.frames[0].positions)])
+	@classmethod
+	def tearDownClass(cls):
+		cls._tmp.cleanup()
+
+	def _error(self, solution, frame):
+		predicted = np.array([tuple(solution.transform(Position(*p))) for p in self.frames[0].positions])
+		return np.sqrt(((predicted - frame.positions) ** 2).sum(axis= 1)).max()
+
+	def test_pyramid(self):
+		image = np.arange(64 * 48, dtype= np.uint16).reshape(64, 48)
+		pyramid = ImagePyramid(image, 2)
+		self.assertEqual(len(pyramid), 3)
+		self.assertIs(pyramid[0], image)
+		self.assertEqual(pyramid[2].shape, (16, 12))
+		self.assertIs(pyramid[1], pyramid[1])
+		self.assertTrue(np.allclose(pyramid[1], image.reshape(32, 2, 24, 2).mean(axis= (1, 3))))
+		self.assertTrue(np.allclose(block_average(image, 4), pyramid[2]))
+		# The center of the first coarse pixel lies between the four pixels it averages
+		self.assertTrue(np.allclose(pyramid.to_full([(0, 0), (2, 1)], 1), [(0.5, 0.5), (4.5, 2.5)]))
+		with self.assertRaises(IndexError):
+			pyramid[3]
+
+	def test_refine_centroids(self):
+		image = FileInfo.new(self.frames[1].path).get_data()
+		truth = self.frames[1].positions
+		refined = refine_centroids(image, np.round(truth) + 1, 5)
+		error = np.sqrt(((refined - truth) ** 2).sum(axis= 1))
+		# a few blended stars are pulled towards their neighbors
+		self.assertLess(np.percentile(error, 90), 0.2)
+
+	def test_robust_solution(self):
+		rng = np.random.default_rng(3)
+		start = rng.uniform(0, 2000, (100, 2))
+		displaced = start + (12.3, -7.1) + rng.normal(0, 0.1, start.shape)
+		# LMedS breaks down at 50% of outliers, RANSAC does not
+		for estimator, fraction in (('ransac', 0.6), ('lmeds', 0.4)):
+			new = displaced.copy()
+			outliers = rng.random(len(start)) < fraction
+			new[outliers] = rng.uniform(0, 2000, (outliers.sum(), 2))
+			with self.subTest(estimator), contextlib.redirect_stdout(io.StringIO()):
+				solution = TrackingSolution.compute('test', start.tolist(), new.tolist(), estimator= estimator)
+				predicted = np.array([tuple(solution.transform(p)) for p in PositionArray( *start.tolist())])
+				error = np.sqrt(((predicted - new) ** 2).sum(axis= 1))
+				self.assertLess(error[~outliers].max(), 0.5)
+				self.assertEqual(set(solution.lost), set(np.flatnonzero(outliers).tolist()))
+		with self.assertRaises(ValueError):
+			TrackingSolution.compute('test', start.tolist(), new.tolist(), estimator= 'unknown')
+
+	def test_extract_windows(self):
+		image = np.arange(100, dtype= float).reshape(10, 10)
+		windows = extract_windows(image, [0, 8, -1], [0, 2, 3], 3)
+		self.assertEqual(windows.shape, (3, 3, 3))
+		self.assertTrue(np.array_equal(windows[0], image[:3, :3]))
+		self.assertTrue(np.array_equal(windows[1, :2], image[8:, 2:5]))
+		self.assertTrue(np.isnan(windows[1, 2]).all() and np.isnan(windows[2, 0]).all())
+		self.assertTrue(np.array_equal(windows[2, 1:], image[:2, 3:6]))
+
+	def test_photometry_tracker(self):
+		stars = _reference_stars(Fixture('test', None, self.frames, self._tmp.name))
+		for mesh in (None, 64):
+			with self.subTest(mesh= mesh):
+				tracker = PhotometryTracker(16, tracking_steps= 2, size_mul= 0.75, mesh= mesh)
+				tracker.setup_model(stars)
+				for frame in self.frames[1:]:
+					with contextlib.redirect_stdout(io.StringIO()):
+						solution = tracker.track(FileInfo.new(frame.path).get_data())
+					self.assertLess(self._error(solution, frame), 0.1)
+
+	def test_coarse_alignment(self):
+		for level in (0, 1, 2):
+			with self.subTest(level= level):
+				tracker = GlobalAlignmentTracker('local_maxima', pyramid_level= level, fwhm= 4 / 2 ** level, min_dst= 8 / 2 ** level)
+				tracker.setup_model(self.stars)
+				for frame in self.frames[1:]:
+					with contextlib.redirect_stdout(io.StringIO()):
+						solution = tracker.track(FileInfo.new(frame.path).get_data())
+					self.assertLess(self._error(solution, frame), 0.5)
+
+	def test_phase_correlation(self):
+		reference = FileInfo.new(self.frames[0].path).get_data()
+		for name, kwargs in (('rendered', {}), ('reference', {'reference' : reference})):
+			with self.subTest(name):
+				tracker = PhaseCorrelationTracker()
+				tracker.setup_model(self.stars, **kwargs)
+				for frame in self.frames[1:]:
+					solution = tracker.track(FileInfo.new(frame.path).get_data())
+					self.assertLess(self._error(solution, frame), 0.2)
+					self.assertGreater(tracker.peak, 0.05)
+
+	def test_phase_correlation_rotation(self):
+		spec = FieldSpec(shape= (512, 512), n_stars= 60, fwhm= 4.0, flux_range= (2e4, 2e5))
+		frames = generate_sequence(os.path.join(self._tmp.name, 'rotated'), 3, spec, drift= (2.0, 1.0), rotation= 1.0)
+		tracker = PhaseCorrelationTracker(estimate_rotation= True)
+		tracker.setup_model(StarList(), reference= FileInfo.new(frames[0].path).get_data())
+		for frame in frames[1:]:
+			solution = tracker.track(FileInfo.new(frame.path).get_data())
+			self.assertAlmostEqual(solution.rotation, frame.rotation, delta= 0.1)
+			predicted = solution.transform_array(frames[0].positions)
+			self.assertLess(np.sqrt(((predicted - frame.positions) ** 2).sum(axis= 1)).max(), 0.5)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+# type: ignore
+import math
+import unittest
+import numpy as np
+from startrak.native import Position, PositionArray, TrackingSolution
+from startrak.native.matrices import Matrix2x2
+from startrak.native.utils import transformutils
+
+class TransformTests(unittest.TestCase):
+	def setUp(self):
+		rng = np.random.default_rng(3)
+		self.points = rng.uniform(0, 1000, (50, 2))
+		self.steps = [TrackingSolution.new('test', Position(*rng.normal(0, 5, 2)), rng.normal(0, 0.02), 0) for _ in range(12)]
+
+	def _sequential(self, points):
+		out, current = [], [Position(*p) for p in points]
+		for step in self.steps:
+			current = [step.transform(p) for p in current]
+			out.append([tuple(p) for p in current])
+		return np.array(out)
+
+	def test_matrix_product(self):
+		matrix = Matrix2x2(1, 2, 3, 4)
+		self.assertEqual(tuple(matrix * Position(1, 1)), (3, 7))
+		self.assertEqual(tuple(Matrix2x2.identity() * Position(5, -2)), (5, -2))
+
+	def test_compute_rotation(self):
+		angle = 0.1
+		rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+		new = self.points @ rotation.T + (5, -3)
+		solution = TrackingSolution.compute('test', PositionArray( *self.points.tolist()), PositionArray( *new.tolist()), rejection_iter= 0)
+		self.assertAlmostEqual(solution.rotation, math.degrees(angle))
+		self.assertAlmostEqual(solution.translation.x, 5)
+		self.assertAlmostEqual(solution.translation.y, -3)
+		self.assertTrue(np.allclose(solution.transform_array(self.points), new))
+
+		restored = TrackingSolution.__import__(TrackingSolution.new('test', Position(1, 2), -angle, 0).__export__())
+		self.assertAlmostEqual(restored.rotation, -math.degrees(angle))
+
+	def test_transform_array(self):
+		solution = self.steps[0]
+		expected = np.array([tuple(solution.transform(Position(*p))) for p in self.points])
+		self.assertTrue(np.allclose(solution.transform_array(self.points), expected))
+		self.assertTrue(np.allclose(solution.transform_array(PositionArray( *self.points.tolist())), expected))
+
+	def test_sequences(self):
+		matrices = TrackingSolution.stack(self.steps)
+		self.assertEqual(matrices.shape, (12, 3, 3))
+		self.assertEqual(tuple(TrackingSolution.from_matrix('test', matrices[3])), tuple(self.steps[3]))
+
+		chained = transformutils.accumulate(matrices)
+		projected = transformutils.project(chained, self.points)
+		self.assertEqual(projected.shape, (12, 50, 2))
+		self.assertTrue(np.allclose(projected, self._sequential(self.points)))
+		self.assertTrue(np.allclose(chained[2], transformutils.compose(transformutils.compose(matrices[0], matrices[1]), matrices[2])))
+
+		inverse = transformutils.invert(chained)
+		self.assertTrue(np.allclose(inverse @ chained, np.eye(3)))
+		projected[:, 0] = np.nan
+		relative = transformutils.relative_positions(chained, projected)
+		self.assertTrue(np.isnan(relative[:, 0]).all())
+		self.assertTrue(np.allclose(relative[:, 1:], self.points[None, 1:]))
+
+if __name__ == '__main__':
+	unittest.main()